@@ -1,4 +1,5 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel, ValidationError
 from typing import List, Optional, Dict
 
@@ -14,7 +15,6 @@ from genai_logic import (
     generate_modules,
     generate_submodules,
     generate_activities,
-    get_stage_suggestions,
     redo_stage,
     Stage
 )
@@ -24,6 +24,8 @@ from course_content_generator import (
     generate_quiz,
     generate_assignment,
     generate_mindmap,
+    stream_reading_material,
+    stream_lecture_script,
     ReadingInput,
     LectureInput,
     QuizInput,
@@ -41,21 +43,33 @@ from course_content_generator import (
 #     ValidateContentInput,
 #     ValidateContentOut
 # )
+from course_pipeline import PipelineRequest, CoursePipelineOut, run_course_pipeline
+from llm_cache import llm_response_cache
+from llm_throttle import LLMRateLimitError
+from state_store import create_state_store
+from job_queue import job_queue, JobStatus, TERMINAL_STATUSES, JOB_POLL_SECONDS
+from suggestion_store import stage_suggestions, fetch_suggestions
+from tracing import span
+from stage_profiles import stage_profile_overrides, profile_table
 import json
+import asyncio
 import logging
 from typing import Optional, Dict, Any
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 
-router = APIRouter()
+# X-LLM-Profile can override per-stage model/thinking settings for one request (see stage_profiles.py)
+router = APIRouter(dependencies=[Depends(stage_profile_overrides)])
 
 # Configure logging
 logger = logging.getLogger("course_api")
 logging.basicConfig(level=logging.INFO)
 
-# In-memory course state for tracking previous stages
-course_state = {}
+# Course state for tracking previous stages (memory LRU or SQLite, see COURSE_STATE_BACKEND)
+course_state = create_state_store()
 
 class ActivityRequest(BaseModel):
+    course_id: Optional[str] = None
+    module_id: Optional[str] = None
     submodule_id :str
     submodule_name :str
     submodule_description: str
@@ -75,13 +89,29 @@ class ValidateRequest(BaseModel):
 def as_json(obj: BaseModel | dict) -> str:
     return json.dumps(obj.model_dump() if isinstance(obj, BaseModel) else obj, indent=2)
 
+def sse_event(event: str, data: Any) -> str:
+    payload = data.model_dump_json() if isinstance(data, BaseModel) else json.dumps(data)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+async def sse_stream(events):
+    # Flush a comment straight away so clients see the stream open before
+    # source summarization finishes.
+    yield ": stream opened\n\n"
+    try:
+        async for event, data in events:
+            yield sse_event(event, {"text": data} if event == "token" else data)
+    except Exception as e:
+        logger.exception("Streaming generation failed.")
+        yield sse_event("error", {"detail": str(e)})
+
 def parse_result(result_str: str | None, model: type[BaseModel]) -> BaseModel:
     if not result_str:
         logger.error("LLM returned no result.")
         raise HTTPException(status_code=500, detail="No result returned from LLM")
     try:
-        raw_data = json.loads(result_str)
-        validated = model.model_validate(raw_data)
+        with span("validate"):
+            raw_data = json.loads(result_str)
+            validated = model.model_validate(raw_data)
         return validated
     except json.JSONDecodeError as e:
         logger.exception("Failed to parse LLM result as JSON.")
@@ -91,7 +121,7 @@ def parse_result(result_str: str | None, model: type[BaseModel]) -> BaseModel:
         raise HTTPException(status_code=500, detail=f"Schema validation failed: {ve.errors()}")
 
 @router.post("/generate/outline")
-def generate_outline(course: CourseInit):
+async def generate_outline(course: CourseInit, inline_suggestions: bool = False):
     logger.info("Generating course outline...")
 
     # Step 2: Dump course input (with nested fields) for storage
@@ -109,7 +139,7 @@ def generate_outline(course: CourseInit):
     })
 
     # Step 3: Generate the outline from the LLM
-    result_data = generate_course_outline(course)
+    result_data = await generate_course_outline(course)
 
     if result_data is None or not isinstance(result_data, dict):
         return {"error": "Failed to generate outline. Please try again."}
@@ -121,51 +151,52 @@ def generate_outline(course: CourseInit):
         logger.exception("Failed to parse LLM response into CourseOutline")
         return {"error": "LLM response could not be parsed."}
 
-    # Step 6: Get suggestions for next stage
-    suggestions = get_stage_suggestions(Stage.outline, as_json(result))
+    # Step 6: Queue suggestions for next stage (fetched via /suggestions/{id})
+    suggestions = await stage_suggestions(Stage.outline, as_json(result), inline=inline_suggestions)
 
     # Final Response
     return {
         "result": result,
-        "suggestions": suggestions
+        **suggestions
     }
 
 
 @router.post("/generate/modules")
-def generate_module(course_outline: CourseOutline):
+async def generate_module(course_outline: CourseOutline, inline_suggestions: bool = False):
     logger.info("Generating modules...")
-    result_str = generate_modules(course_outline)
+    result_str = await generate_modules(course_outline)
     if isinstance(result_str, dict):
         result_str = json.dumps(result_str)
     result = parse_result(result_str, ModuleSet)
-    course_entry = course_state.setdefault(course_outline.course_id, {})
-    course_entry["modules"] = result    
-    suggestions = get_stage_suggestions(Stage.module, as_json(result))
-    return {"result": result, "suggestions": suggestions}
+    await course_state.aput_modules(course_outline.course_id, result)
+    suggestions = await stage_suggestions(Stage.module, as_json(result), inline=inline_suggestions)
+    return {"result": result, **suggestions}
 
 @router.post("/generate/submodules")
-def generate_submodule(module: Module):
+async def generate_submodule(module: Module, course_id: Optional[str] = None, inline_suggestions: bool = False):
     logger.info("Generating submodules...")
-    result_str = generate_submodules(module)
+    result_str = await generate_submodules(module)
     if not result_str:
         raise HTTPException(status_code=400, detail="Failed to generate submodules")
 
     # No need to parse again if `call_llm` already validated:
     result = result_str
-    course_state[module.module_id] = course_state.get(module.module_id, {})
-    course_state[module.module_id]["submodules"] = result
-    suggestions = get_stage_suggestions(Stage.submodule, as_json(result))
-    return {"result": result, "suggestions": suggestions}
+    try:
+        await course_state.aput_submodules(module.module_id, SubmoduleSet.model_validate(result), course_id=course_id or "")
+    except ValidationError:
+        logger.warning("Submodules did not match the schema; not stored in course state.")
+    suggestions = await stage_suggestions(Stage.submodule, as_json(result), inline=inline_suggestions)
+    return {"result": result, **suggestions}
 
 @router.post("/generate/activities")
-def generate_activity(payload: ActivityRequest):
+async def generate_activity(payload: ActivityRequest, inline_suggestions: bool = False):
     logger.info("Generating activities...")
     submodule = Submodule(
         submodule_id=payload.submodule_id,
         submodule_title=payload.submodule_name,
         submodule_description=payload.submodule_description
     )
-    result_str = generate_activities(
+    result_str = await generate_activities(
         submodule=submodule,
         activity_types=",".join(payload.activity_types),
         user_instructions=payload.user_instructions
@@ -173,17 +204,44 @@ def generate_activity(payload: ActivityRequest):
     if isinstance(result_str, dict):
         result_str = json.dumps(result_str)
     result = parse_result(result_str, ActivitySet)
-    course_state[payload.submodule_id] = course_state.get(payload.submodule_id, {})
-    course_state[payload.submodule_id]["activities"] = result
-    suggestions = get_stage_suggestions(Stage.activity, as_json(result))
-    return {"result": result, "suggestions": suggestions}
+    await course_state.aput_activities(
+        payload.submodule_id, result, course_id=payload.course_id or "", module_id=payload.module_id or ""
+    )
+    suggestions = await stage_suggestions(Stage.activity, as_json(result), inline=inline_suggestions)
+    return {"result": result, **suggestions}
+
+
 
+@router.post("/generate/course", response_model=CoursePipelineOut)
+async def generate_course(request: PipelineRequest):
+    logger.info("Generating full course...")
+    result = await run_course_pipeline(request)
+    if result.outline is None:
+        raise HTTPException(status_code=500, detail=f"Failed to generate outline: {result.errors}")
+
+    await asyncio.to_thread(_store_course_state, result)
+    return result
+
+def _store_course_state(result: CoursePipelineOut):
+    # Runs off the event loop: one thread hop for the whole course.
+    course_id = result.outline.course_id
+    course_state.put_modules(course_id, ModuleSet(course_id=course_id, modules=[m.module for m in result.modules]))
+    for m in result.modules:
+        module_id = m.module.module_id
+        course_state.put_submodules(
+            module_id, SubmoduleSet(module_id=module_id, submodules=[s.submodule for s in m.submodules]), course_id=course_id
+        )
+        for s in m.submodules:
+            course_state.put_activities(
+                s.submodule.submodule_id, ActivitySet(activities=[a.activity for a in s.activities]),
+                course_id=course_id, module_id=module_id
+            )
 
 
 @router.post("/generate-reading-material", response_model=ReadingMaterialOut)
-def api_generate_reading(input: ReadingInput):
+async def api_generate_reading(input: ReadingInput):
     try:
-        result, _ = generate_reading_material(
+        result, _ = await generate_reading_material(
             course_outline=input.course_outline,
             module_name=input.module_name,
             submodule_name=input.submodule_name,
@@ -194,18 +252,21 @@ def api_generate_reading(input: ReadingInput):
             previous_material_summary=input.previous_material_summary,
             notes_path=input.notes_path,
             pdf_path=input.pdf_path,
-            url=input.url
+            url=input.url,
+            pdf_pages=input.pdf_pages
         )
         return result
+    except LLMRateLimitError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/generate-lecture-script", response_model=LectureScriptOut)
-def api_lecture(input: LectureInput):
+async def api_lecture(input: LectureInput):
     try:
         # generate_lecture_script now returns a LectureScriptOut directly
-        script, summaries, summary_text = generate_lecture_script(
+        script, summaries, summary_text = await generate_lecture_script(
             course_outline=input.course_outline,
             module_name=input.module_name,
             submodule_name=input.submodule_name,
@@ -217,7 +278,8 @@ def api_lecture(input: LectureInput):
             notes_path=input.notes_path,
             pdf_path=input.pdf_path,
             text_examples=input.text_examples,
-            duration_minutes=input.duration_minutes if input.duration_minutes is not None else 0
+            duration_minutes=input.duration_minutes if input.duration_minutes is not None else 0,
+            pdf_pages=input.pdf_pages
         )
         # If script is a dict, extract the main script text (assuming key 'lecture_script' or similar)
         script_text = script.get("lecture_script") if isinstance(script, dict) else script
@@ -228,14 +290,55 @@ def api_lecture(input: LectureInput):
             source_summaries=summaries if isinstance(summaries, list) else None,
             lecture_script_summary=summary_text
         )
+    except LLMRateLimitError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/generate-reading-material/stream")
+async def api_stream_reading(input: ReadingInput):
+    events = stream_reading_material(
+        course_outline=input.course_outline,
+        module_name=input.module_name,
+        submodule_name=input.submodule_name,
+        activity_name=input.activity_name,
+        activity_description=input.activity_description,
+        activity_objective=input.activity_objective,
+        user_prompt=input.user_prompt,
+        previous_material_summary=input.previous_material_summary,
+        notes_path=input.notes_path,
+        pdf_path=input.pdf_path,
+        url=input.url,
+        pdf_pages=input.pdf_pages
+    )
+    return StreamingResponse(sse_stream(events), media_type="text/event-stream")
+
+
+@router.post("/generate-lecture-script/stream")
+async def api_stream_lecture(input: LectureInput):
+    events = stream_lecture_script(
+        course_outline=input.course_outline,
+        module_name=input.module_name,
+        submodule_name=input.submodule_name,
+        activity_name=input.activity_name,
+        activity_description=input.activity_description,
+        activity_objective=input.activity_objective,
+        user_prompt=input.user_prompt,
+        prev_activities_summary=input.prev_activities_summary,
+        notes_path=input.notes_path,
+        pdf_path=input.pdf_path,
+        text_examples=input.text_examples,
+        duration_minutes=input.duration_minutes if input.duration_minutes is not None else 0,
+        pdf_pages=input.pdf_pages
+    )
+    return StreamingResponse(sse_stream(events), media_type="text/event-stream")
+
+
 @router.post("/generate-quiz", response_model=List[QuizOut])
-def api_generate_quiz(input: QuizInput):
+async def api_generate_quiz(input: QuizInput):
     try:
-        quiz_list = generate_quiz(
+        quiz_list = await generate_quiz(
             module_name=input.module_name,
             submodule_name=input.submodule_name,
             activity_name=input.activity_name,
@@ -252,16 +355,18 @@ def api_generate_quiz(input: QuizInput):
             quiz_list = quiz_list["questions"]
 
         return quiz_list
+    except LLMRateLimitError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/redo")
-def redo_any_stage(request: RedoRequest):
+async def redo_any_stage(request: RedoRequest, inline_suggestions: bool = False):
     logger.info(f"Redoing stage: {request.stage}")
     found_prev = request.prev_content
 
     # Step 1: Get raw response string or dict from redo_stage
-    result_str = redo_stage(request.stage, prev_content=found_prev, user_message=request.user_message)
+    result_str = await redo_stage(request.stage, prev_content=found_prev, user_message=request.user_message)
 
     # Step 2: If already a dict, convert to JSON string
     if isinstance(result_str, dict):
@@ -282,17 +387,108 @@ def redo_any_stage(request: RedoRequest):
     if schema is None:
         raise HTTPException(status_code=400, detail=f"Unsupported stage: {request.stage}")
     result = parse_result(result_str, schema)
-    suggestions = get_stage_suggestions(request.stage, as_json(result))
+    suggestions = await stage_suggestions(request.stage, as_json(result), inline=inline_suggestions)
 
     return {
         "result": result,
-        "suggestions": suggestions
+        **suggestions
     }
 
+############################ BACKGROUND JOBS ########################################################
+# Any generation stage can be submitted as a job instead of run inside the
+# request; workers (in-process via main.py or standalone via worker.py) drain
+# the queue and clients poll or subscribe for the result.
+
+def _route_job(route):
+    async def handler(payload, progress):
+        result = jsonable_encoder(await route(payload))
+        # Routes report some failures as {"error": ...} with a 200; a job fails.
+        if isinstance(result, dict) and "error" in result:
+            raise ValueError(result["error"])
+        return result
+    return handler
+
+async def _course_job(payload: PipelineRequest, progress):
+    result = await run_course_pipeline(payload, progress=progress)
+    return jsonable_encoder(result)
+
+JOB_HANDLERS = {
+    "outline": (CourseInit, _route_job(generate_outline)),
+    "modules": (CourseOutline, _route_job(generate_module)),
+    "submodules": (Module, _route_job(generate_submodule)),
+    "activities": (ActivityRequest, _route_job(generate_activity)),
+    "reading": (ReadingInput, _route_job(api_generate_reading)),
+    "lecture": (LectureInput, _route_job(api_lecture)),
+    "quiz": (QuizInput, _route_job(api_generate_quiz)),
+    "redo": (RedoRequest, _route_job(redo_any_stage)),
+    "course": (PipelineRequest, _course_job),
+}
+
+@router.post("/jobs/{kind}", status_code=202)
+async def submit_job(kind: str, payload: Dict[str, Any], request: Request):
+    if kind not in JOB_HANDLERS:
+        raise HTTPException(status_code=404, detail=f"Unknown job kind: {kind}")
+    model, _ = JOB_HANDLERS[kind]
+    try:
+        validated = model.model_validate(payload)
+    except ValidationError as ve:
+        raise HTTPException(status_code=422, detail=ve.errors())
+    job_id = await job_queue.asubmit(kind, validated.model_dump(mode="json"))
+    pool = getattr(request.app.state, "job_pool", None)
+    if pool is not None:
+        pool.notify()
+    return {"job_id": job_id, "status": "queued"}
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str):
+    job = await job_queue.aget(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job id")
+    return job
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    if await job_queue.aget(job_id) is None:
+        raise HTTPException(status_code=404, detail="Unknown job id")
+
+    async def events():
+        last = None
+        while True:
+            job = await job_queue.aget(job_id)
+            snapshot = (job.status, job.progress, job.progress_message)
+            if snapshot != last:
+                last = snapshot
+                yield sse_event("status", job)
+            if job.status in TERMINAL_STATUSES:
+                return
+            await asyncio.sleep(JOB_POLL_SECONDS)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@router.get("/suggestions/{suggestions_id}")
+async def get_suggestions(suggestions_id: str, wait: float = 0.0):
+    status, suggestions = await fetch_suggestions(suggestions_id, wait=min(max(wait, 0.0), 60.0))
+    if status == "unknown":
+        raise HTTPException(status_code=404, detail="Unknown suggestions id")
+    return {"suggestions_id": suggestions_id, "status": status, "suggestions": suggestions}
+
+@router.get("/state/{course_id}")
+async def get_course_state(course_id: str):
+    return await course_state.aget_course(course_id)
+
+@router.get("/cache/stats")
+async def cache_stats():
+    return llm_response_cache.stats()
+
+@router.get("/profiles")
+async def llm_profiles():
+    # Effective per-stage profiles, including any X-LLM-Profile override on this request
+    return profile_table()
+
 # @router.post("/validate-content", response_model=ValidateContentOut)
-# def api_validate_content(input: ValidateContentInput):
+# async def api_validate_content(input: ValidateContentInput):
 #     try:
-#         detailed_report = validate_content_with_keywords(
+#         detailed_report = await validate_content_with_keywords(
 #             content=input.content,
 #             activity_name=input.activity_name,
 #             activity_type=input.activity_type
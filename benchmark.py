@@ -0,0 +1,490 @@
+# benchmark.py
+# Offline load test: starts fake_gemini.py and the API (uvicorn main:app)
+# as subprocesses, drives each router at a fixed concurrency and reports
+# latency percentiles, throughput and prompt tokens per LLM stage.
+#
+#   python benchmark.py --requests 40 --concurrency 8 --save bench.json
+#   python benchmark.py --requests 40 --concurrency 8 --baseline bench.json
+#
+# --target http://host:port benchmarks an app that is already running
+# (start it with GEMINI_BASE_URL pointing at a fake_gemini.py server).
+
+import os
+import re
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import httpx
+from pydantic import BaseModel
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+TERMINAL_JOB_STATUSES = ("succeeded", "failed")
+STARTUP_TIMEOUT_SECONDS = 60.0
+
+_TOKENS_LINE = re.compile(r'^corgen_llm_tokens_total\{(?P<labels>[^}]*)\} (?P<value>\S+)$')
+_CALLS_LINE = re.compile(r'^corgen_llm_calls_total\{(?P<labels>[^}]*)\} (?P<value>\S+)$')
+_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+# ----------------------------- Payloads -----------------------------
+# Every request gets distinct inputs (the index is in the title/prompt) so
+# the LLM cache doesn't turn the run into a cache benchmark; pass
+# --repeat-inputs to measure the warm-cache path instead.
+
+NOTES_TEXT = "\n".join(
+    f"Section {i}. Gradient descent updates parameters against the gradient of the loss; "
+    f"learning rate, batch size and regularization control how training converges."
+    for i in range(40)
+)
+
+def course_init(i: int) -> Dict[str, Any]:
+    return {
+        "title": f"Introduction to Machine Learning {i}",
+        "prerequisites": ["Python", "Linear algebra"],
+        "description": "Supervised and unsupervised learning with practical projects.",
+        "learning_objectives": ["Train and evaluate models", "Choose suitable algorithms"],
+        "target_audience": {"audienceType": "undergraduate", "english_level": "fluent", "maths_level": "intermediate"},
+        "duration": "12 weeks",
+        "credits": 4,
+    }
+
+def course_outline(i: int) -> Dict[str, Any]:
+    return {
+        "course_id": f"bench_course_{i}",
+        "title": f"Introduction to Machine Learning {i}",
+        "prerequisites": ["Python"],
+        "description": "Supervised and unsupervised learning.",
+        "learning_outcomes": ["Students will be able to train models."],
+        "duration": "12 weeks",
+        "credits": 4,
+    }
+
+def module(i: int) -> Dict[str, Any]:
+    return {
+        "module_id": f"bench_module_{i}",
+        "module_title": f"Linear Models {i}",
+        "module_description": "Regression, classification and regularization.",
+        "module_hours": "8",
+    }
+
+def content_input(i: int, notes_path: str) -> Dict[str, Any]:
+    return {
+        "course_outline": course_outline(i),
+        "module_name": "Linear Models",
+        "submodule_name": "Gradient Descent",
+        "activity_name": "Optimizing a loss",
+        "activity_description": "How gradient descent minimizes a loss function.",
+        "activity_objective": "Explain and apply gradient descent.",
+        "user_prompt": f"Keep it practical (variant {i}).",
+        "notes_path": notes_path,
+    }
+
+def reading_input(i: int, notes_path: str) -> Dict[str, Any]:
+    return {**content_input(i, notes_path), "previous_material_summary": "Linear regression basics."}
+
+def lecture_input(i: int, notes_path: str) -> Dict[str, Any]:
+    return {**content_input(i, notes_path), "text_examples": ["Rolling a ball down a hill."], "duration_minutes": 10}
+
+def quiz_input(i: int) -> Dict[str, Any]:
+    return {
+        "module_name": "Linear Models",
+        "submodule_name": "Gradient Descent",
+        "activity_name": "Check your understanding",
+        "activity_description": "Short quiz on gradient descent.",
+        "activity_objective": "Recall the update rule.",
+        "material_summary": f"Gradient descent moves parameters against the gradient (variant {i}).",
+        "number_of_questions": 5,
+        "quiz_type": "MCQ",
+        "total_score": 10,
+        "user_prompt": "Mix easy and hard questions.",
+    }
+
+# ----------------------------- Scenarios -----------------------------
+# A scenario sends one logical request and returns the time to its first
+# streamed token, if it streams. Non-2xx responses raise.
+
+ScenarioFn = Callable[[httpx.AsyncClient, int, "BenchContext"], Awaitable[Optional[float]]]
+
+class BenchContext:
+    def __init__(self, notes_path: str, repeat_inputs: bool = False):
+        self.notes_path = notes_path
+        self.repeat_inputs = repeat_inputs
+
+    def index(self, i: int) -> int:
+        return 0 if self.repeat_inputs else i
+
+async def _post(client: httpx.AsyncClient, path: str, payload: Any) -> Dict[str, Any]:
+    response = await client.post(path, json=payload)
+    response.raise_for_status()
+    body = response.json()
+    if isinstance(body, dict) and "error" in body:
+        raise RuntimeError(body["error"])
+    return body
+
+async def _stream(client: httpx.AsyncClient, path: str, payload: Any) -> Optional[float]:
+    started = time.perf_counter()
+    first_token = None
+    async with client.stream("POST", path, json=payload) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line == "event: token" and first_token is None:
+                first_token = time.perf_counter() - started
+            elif line == "event: error":
+                raise RuntimeError(f"{path} streamed an error event")
+    return first_token
+
+async def run_outline(client, i, ctx):
+    await _post(client, "/course/generate/outline", course_init(ctx.index(i)))
+
+async def run_modules(client, i, ctx):
+    await _post(client, "/course/generate/modules", course_outline(ctx.index(i)))
+
+async def run_submodules(client, i, ctx):
+    await _post(client, "/course/generate/submodules", module(ctx.index(i)))
+
+async def run_activities(client, i, ctx):
+    n = ctx.index(i)
+    await _post(client, "/course/generate/activities", {
+        "submodule_id": f"bench_sub_{n}",
+        "submodule_name": f"Gradient Descent {n}",
+        "submodule_description": "Optimizing a loss step by step.",
+        "activity_types": ["Lecture", "Reading Material", "Quiz"],
+    })
+
+async def run_reading(client, i, ctx):
+    await _post(client, "/course/generate-reading-material", reading_input(ctx.index(i), ctx.notes_path))
+
+async def run_lecture(client, i, ctx):
+    await _post(client, "/course/generate-lecture-script", lecture_input(ctx.index(i), ctx.notes_path))
+
+async def run_reading_stream(client, i, ctx):
+    return await _stream(client, "/course/generate-reading-material/stream", reading_input(ctx.index(i), ctx.notes_path))
+
+async def run_lecture_stream(client, i, ctx):
+    return await _stream(client, "/course/generate-lecture-script/stream", lecture_input(ctx.index(i), ctx.notes_path))
+
+async def run_quiz(client, i, ctx):
+    await _post(client, "/course/generate-quiz", quiz_input(ctx.index(i)))
+
+async def run_redo(client, i, ctx):
+    await _post(client, "/course/redo", {
+        "stage": "module",
+        "prev_content": {"course_id": f"bench_course_{ctx.index(i)}", "modules": [module(ctx.index(i))]},
+        "user_message": "Add a module on evaluation metrics.",
+    })
+
+async def run_suggestions(client, i, ctx):
+    # Outline first, then wait for the suggestions it queued in the background.
+    body = await _post(client, "/course/generate/outline", course_init(ctx.index(i)))
+    response = await client.get(f"/course/suggestions/{body['suggestions_id']}", params={"wait": 60})
+    response.raise_for_status()
+
+async def run_job(client, i, ctx):
+    body = await _post(client, "/course/jobs/quiz", quiz_input(ctx.index(i)))
+    while True:
+        response = await client.get(f"/course/jobs/{body['job_id']}")
+        response.raise_for_status()
+        status = response.json()["status"]
+        if status in TERMINAL_JOB_STATUSES:
+            if status == "failed":
+                raise RuntimeError(response.json().get("error") or "job failed")
+            return None
+        await asyncio.sleep(0.05)
+
+async def run_course(client, i, ctx):
+    await _post(client, "/course/generate/course", {
+        "course": course_init(ctx.index(i)),
+        "activity_types": ["Lecture", "Reading Material", "Quiz"],
+        "quiz_questions": 3,
+    })
+
+SCENARIOS: Dict[str, ScenarioFn] = {
+    "outline": run_outline,
+    "modules": run_modules,
+    "submodules": run_submodules,
+    "activities": run_activities,
+    "reading": run_reading,
+    "lecture": run_lecture,
+    "reading_stream": run_reading_stream,
+    "lecture_stream": run_lecture_stream,
+    "quiz": run_quiz,
+    "redo": run_redo,
+    "suggestions": run_suggestions,
+    "job": run_job,
+    "course": run_course,
+}
+
+# ----------------------------- Results -----------------------------
+
+class EndpointResult(BaseModel):
+    name: str
+    requests: int
+    errors: int
+    seconds: float
+    rps: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    first_token_p50_ms: Optional[float] = None
+    error_samples: List[str] = []
+
+class BenchmarkReport(BaseModel):
+    concurrency: int
+    requests_per_endpoint: int
+    fake_latency_ms: float
+    endpoints: List[EndpointResult]
+    prompt_tokens_by_stage: Dict[str, float]
+    llm_calls_by_stage: Dict[str, float]
+
+def percentile(values: List[float], pct: float) -> float:
+    # Nearest-rank percentile; 0.0 for an empty sample.
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), round(pct / 100 * len(ordered) + 0.5)))
+    return ordered[rank - 1]
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    name: str,
+    scenario: ScenarioFn,
+    ctx: BenchContext,
+    requests: int,
+    concurrency: int,
+    first_index: int = 0,
+) -> EndpointResult:
+    latencies: List[float] = []
+    first_tokens: List[float] = []
+    errors: List[str] = []
+    indices = iter(range(first_index, first_index + requests))
+
+    async def worker():
+        for i in indices:
+            started = time.perf_counter()
+            try:
+                first_token = await scenario(client, i, ctx)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {str(e)[:200]}")
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+            if first_token is not None:
+                first_tokens.append(first_token * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, requests)))))
+    seconds = time.perf_counter() - started
+    return EndpointResult(
+        name=name,
+        requests=requests,
+        errors=len(errors),
+        seconds=round(seconds, 3),
+        rps=round(len(latencies) / seconds, 2) if seconds else 0.0,
+        p50_ms=round(percentile(latencies, 50), 1),
+        p95_ms=round(percentile(latencies, 95), 1),
+        p99_ms=round(percentile(latencies, 99), 1),
+        first_token_p50_ms=round(percentile(first_tokens, 50), 1) if first_tokens else None,
+        error_samples=sorted(set(errors))[:3],
+    )
+
+def _sum_by_stage(metrics_text: str, pattern: re.Pattern, kind: Optional[str] = None) -> Dict[str, float]:
+    totals: Dict[str, float] = {}
+    for line in metrics_text.splitlines():
+        match = pattern.match(line)
+        if not match:
+            continue
+        labels = dict(_LABEL.findall(match.group("labels")))
+        if kind is not None and labels.get("kind") != kind:
+            continue
+        stage = labels.get("stage", "other")
+        totals[stage] = totals.get(stage, 0.0) + float(match.group("value"))
+    return totals
+
+def _delta(after: Dict[str, float], before: Dict[str, float]) -> Dict[str, float]:
+    return {k: v - before.get(k, 0.0) for k, v in sorted(after.items()) if v - before.get(k, 0.0) > 0}
+
+async def scrape_stage_totals(client: httpx.AsyncClient) -> Tuple[Dict[str, float], Dict[str, float]]:
+    response = await client.get("/metrics")
+    response.raise_for_status()
+    return _sum_by_stage(response.text, _TOKENS_LINE, kind="prompt"), _sum_by_stage(response.text, _CALLS_LINE)
+
+# ----------------------------- Processes -----------------------------
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _wait_ready(url: str, process: subprocess.Popen):
+    deadline = time.monotonic() + STARTUP_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{' '.join(process.args)} exited with {process.returncode}")
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {STARTUP_TIMEOUT_SECONDS}s")
+
+def start_fake_gemini(args: argparse.Namespace) -> Tuple[subprocess.Popen, str]:
+    port = _free_port()
+    command = [
+        sys.executable, os.path.join(HERE, "fake_gemini.py"), "--port", str(port),
+        "--latency-ms", str(args.latency_ms), "--latency-sigma", str(args.latency_sigma),
+        "--token-ms", str(args.token_ms), "--error-rate", str(args.error_rate),
+        "--rate-limit-rate", str(args.rate_limit_rate), "--thinking-tokens", str(args.thinking_tokens),
+    ]
+    if args.seed is not None:
+        command += ["--seed", str(args.seed)]
+    process = subprocess.Popen(command, cwd=HERE)
+    url = f"http://127.0.0.1:{port}"
+    _wait_ready(f"{url}/stats", process)
+    return process, url
+
+def start_app(gemini_url: str, workdir: str, args: argparse.Namespace) -> Tuple[subprocess.Popen, str]:
+    # The app gets a throwaway working set: in-memory LLM cache, a temp job
+    # database and the local search backend, so runs don't share state.
+    port = _free_port()
+    env = {
+        **os.environ,
+        "GEMINI_BASE_URL": gemini_url,
+        "GEMINI_API_KEY": os.getenv("GEMINI_API_KEY") or "benchmark",
+        "LLM_CACHE_PATH": "",
+        "JOB_DB_PATH": os.path.join(workdir, "jobs.sqlite3"),
+        "JOB_POLL_SECONDS": "0.05",
+        "SEARCH_BACKEND": "local",
+        "LLM_BACKOFF_BASE_SECONDS": os.getenv("LLM_BACKOFF_BASE_SECONDS", "0.2"),
+    }
+    command = [
+        sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+        "--log-level", "warning", "--no-access-log",
+    ]
+    output = subprocess.DEVNULL if args.quiet else None
+    process = subprocess.Popen(command, cwd=HERE, env=env, stdout=output, stderr=output)
+    url = f"http://127.0.0.1:{port}"
+    _wait_ready(f"{url}/", process)
+    return process, url
+
+def stop(process: Optional[subprocess.Popen]):
+    if process is None or process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+# ----------------------------- Reporting -----------------------------
+
+def print_report(report: BenchmarkReport, baseline: Optional[BenchmarkReport] = None):
+    previous = {e.name: e for e in baseline.endpoints} if baseline else {}
+
+    def change(now: float, before: Optional[float]) -> str:
+        if not before:
+            return ""
+        return f" ({(now - before) / before * 100:+.0f}%)"
+
+    print(f"\nconcurrency={report.concurrency} requests/endpoint={report.requests_per_endpoint} fake latency={report.fake_latency_ms}ms")
+    print(f"{'endpoint':<16}{'ok':>5}{'err':>5}{'p50 ms':>18}{'p95 ms':>18}{'p99 ms':>18}{'req/s':>16}{'ttft p50':>10}")
+    for e in report.endpoints:
+        old = previous.get(e.name)
+        print(
+            f"{e.name:<16}{e.requests - e.errors:>5}{e.errors:>5}"
+            f"{f'{e.p50_ms:.0f}' + change(e.p50_ms, old and old.p50_ms):>18}"
+            f"{f'{e.p95_ms:.0f}' + change(e.p95_ms, old and old.p95_ms):>18}"
+            f"{f'{e.p99_ms:.0f}' + change(e.p99_ms, old and old.p99_ms):>18}"
+            f"{f'{e.rps:.1f}' + change(e.rps, old and old.rps):>16}"
+            f"{e.first_token_p50_ms if e.first_token_p50_ms is not None else '-':>10}"
+        )
+        for sample in e.error_samples:
+            print(f"{'':<16}  ! {sample}")
+
+    old_tokens = baseline.prompt_tokens_by_stage if baseline else {}
+    print(f"\n{'stage':<16}{'llm calls':>10}{'prompt tokens':>24}")
+    for stage, tokens in report.prompt_tokens_by_stage.items():
+        calls = report.llm_calls_by_stage.get(stage, 0)
+        print(f"{stage:<16}{calls:>10.0f}{f'{tokens:.0f}' + change(tokens, old_tokens.get(stage)):>24}")
+
+# ----------------------------- Main -----------------------------
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline benchmark against a fake Gemini server.")
+    parser.add_argument("--endpoints", default=",".join(SCENARIOS), help=f"comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--requests", type=int, default=20, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--target", default="", help="URL of an already running app (skips starting one)")
+    parser.add_argument("--repeat-inputs", action="store_true", help="send identical inputs so caches warm up")
+    parser.add_argument("--latency-ms", type=float, default=400.0, help="fake Gemini median time to first token")
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--token-ms", type=float, default=2.0, help="fake Gemini latency per output token")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of LLM calls answered with 503")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of LLM calls answered with 429")
+    parser.add_argument("--thinking-tokens", type=int, default=512, help="fake Gemini thinking tokens per call when the budget allows")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--save", default="", help="write the report as JSON")
+    parser.add_argument("--baseline", default="", help="JSON report to compare against")
+    parser.add_argument("--quiet", action="store_true", help="hide the app's output")
+    return parser.parse_args(argv)
+
+async def run_benchmark(url: str, args: argparse.Namespace, ctx: BenchContext) -> BenchmarkReport:
+    names = [n.strip() for n in args.endpoints.split(",") if n.strip()]
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"Unknown endpoints: {', '.join(unknown)}")
+
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(base_url=url, timeout=httpx.Timeout(600.0), limits=limits) as client:
+        tokens_before, calls_before = await scrape_stage_totals(client)
+        endpoints = []
+        for name in names:
+            # Index ranges don't overlap between scenarios, so e.g. "suggestions"
+            # doesn't reuse the outlines cached by "outline".
+            result = await run_scenario(
+                client, name, SCENARIOS[name], ctx, args.requests, args.concurrency, first_index=len(endpoints) * args.requests
+            )
+            print(f"{name}: p50 {result.p50_ms:.0f}ms, p95 {result.p95_ms:.0f}ms, {result.rps:.1f} req/s, {result.errors} errors")
+            endpoints.append(result)
+        tokens_after, calls_after = await scrape_stage_totals(client)
+
+    return BenchmarkReport(
+        concurrency=args.concurrency,
+        requests_per_endpoint=args.requests,
+        fake_latency_ms=args.latency_ms,
+        endpoints=endpoints,
+        prompt_tokens_by_stage=_delta(tokens_after, tokens_before),
+        llm_calls_by_stage=_delta(calls_after, calls_before),
+    )
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = BenchmarkReport.model_validate_json(f.read())
+
+    fake = app = None
+    with tempfile.TemporaryDirectory(prefix="corgen-bench-") as workdir:
+        notes_path = os.path.join(workdir, "notes.txt")
+        with open(notes_path, "w", encoding="utf-8") as f:
+            f.write(NOTES_TEXT)
+        try:
+            url = args.target.rstrip("/")
+            if not url:
+                fake, gemini_url = start_fake_gemini(args)
+                app, url = start_app(gemini_url, workdir, args)
+            report = asyncio.run(run_benchmark(url, args, BenchContext(notes_path, args.repeat_inputs)))
+        finally:
+            stop(app)
+            stop(fake)
+
+    print_report(report, baseline)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            f.write(report.model_dump_json(indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# cassette.py
+
+import os
+import json
+import time
+import asyncio
+import threading
+from typing import Any, Dict, List, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ----------------------------- Constants -----------------------------
+# record: every provider call (LLM and web search) is appended to the
+# cassette with its response and timing. replay: calls are answered from the
+# cassette by request fingerprint and never reach the provider.
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "off")  # off | record | replay
+CASSETTE_PATH = os.getenv("CASSETTE_PATH", ".cache/cassette.jsonl")
+# Replayed latency = recorded latency * scale; 0 answers instantly.
+CASSETTE_TIME_SCALE = float(os.getenv("CASSETTE_TIME_SCALE", "1.0"))
+# What a replay does with a request that was never recorded: error | live
+CASSETTE_ON_MISS = os.getenv("CASSETTE_ON_MISS", "error")
+
+class CassetteMissError(Exception):
+    def __init__(self, kind: str, key: str):
+        super().__init__(f"No recorded {kind} response for fingerprint {key[:16]}")
+        self.kind = kind
+        self.key = key
+
+# ----------------------------- Cassette -----------------------------
+# One JSON object per line, appended as calls complete, so a crashed
+# recording keeps everything captured up to that point:
+#   {"kind": "llm", "key": ..., "stage": ..., "model": ..., "ms": 812.4, "text": ..., "usage": {...}}
+#   {"kind": "stream", ..., "chunks": [[ms_since_start, text], ...], "usage": {...}}
+#   {"kind": "search", "key": ..., "query": ..., "ms": 230.1, "snippets": [...]}
+# A fingerprint recorded several times replays its responses in order,
+# wrapping around when a replay makes more calls than the recording did.
+
+class Cassette:
+    def __init__(self, mode: str = CASSETTE_MODE, path: str = CASSETTE_PATH, time_scale: float = CASSETTE_TIME_SCALE, on_miss: str = CASSETTE_ON_MISS):
+        if mode not in ("off", "record", "replay"):
+            raise ValueError(f"Unknown CASSETTE_MODE '{mode}' (expected 'off', 'record' or 'replay')")
+        self.mode = mode
+        self.path = path
+        self.time_scale = time_scale
+        self.on_miss = on_miss
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+        self._entries: Optional[Dict[str, List[Dict[str, Any]]]] = None
+        self._cursors: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def record(self, kind: str, key: str, elapsed_seconds: float, **fields):
+        entry = {"kind": kind, "key": key, "ms": round(elapsed_seconds * 1000, 1), **fields}
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+            self.recorded += 1
+
+    def _load(self) -> Dict[str, List[Dict[str, Any]]]:
+        entries: Dict[str, List[Dict[str, Any]]] = {}
+        if not os.path.exists(self.path):
+            print(f"Cassette {self.path} not found; every replayed call will miss.")
+            return entries
+        with open(self.path, "r", encoding="utf-8") as f:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A recording interrupted mid-write leaves a partial last line.
+                    print(f"Skipping unreadable cassette line {number} in {self.path}")
+                    continue
+                entries.setdefault(f"{entry['kind']}:{entry['key']}", []).append(entry)
+        return entries
+
+    def lookup(self, kind: str, key: str) -> Optional[Dict[str, Any]]:
+        # Returns the next recorded entry for this fingerprint. On a miss it
+        # raises, or returns None when CASSETTE_ON_MISS=live so the caller
+        # goes to the provider.
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._load()
+            recorded = self._entries.get(f"{kind}:{key}")
+            if not recorded:
+                self.misses += 1
+                if self.on_miss == "live":
+                    return None
+                raise CassetteMissError(kind, key)
+            cursor = self._cursors.get(f"{kind}:{key}", 0)
+            self._cursors[f"{kind}:{key}"] = cursor + 1
+            self.replayed += 1
+            return recorded[cursor % len(recorded)]
+
+    def delay(self, milliseconds: float) -> float:
+        return max(milliseconds, 0.0) * self.time_scale / 1000
+
+    def wait(self, entry: Dict[str, Any]):
+        time.sleep(self.delay(entry.get("ms", 0.0)))
+
+    async def await_entry(self, entry: Dict[str, Any]):
+        await asyncio.sleep(self.delay(entry.get("ms", 0.0)))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "path": self.path,
+            "recorded": self.recorded,
+            "replayed": self.replayed,
+            "misses": self.misses,
+        }
+
+cassette = Cassette()
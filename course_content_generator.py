@@ -3,21 +3,30 @@
 import os
 import re
 import json
-import requests
+import asyncio
+import logging
 from typing import List, Dict, Union, Optional, Type
 from dotenv import load_dotenv
-from bs4 import BeautifulSoup
 from pydantic import BaseModel
-import PyPDF2
-from google import genai
 from google.genai.types import GenerateContentConfig, Content, Part
+from llm_throttle import LLMRateLimitError
+from llm_gateway import generate_content, agenerate_content, astream_content
+from source_cache import cached_file_text, acached_file_text, acached_url_text, cached_summary
+from token_budget import Section, pack_sections, stage_budget, fit_to_budget
+from summarizer import map_reduce_summarize
+from pdf_extraction import extract_pdf_text, aextract_pdf_text
+from html_extraction import page_to_text
+from registry import get_llm_client
+from tracing import span
 # Load environment
 load_dotenv()
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-client = genai.Client(api_key=GEMINI_API_KEY)
+
+logger = logging.getLogger("course_content_generator")
 
 # ----------------------------- Constants -----------------------------
-MAX_CHARS_PER_CONTEXT = 12000
+SOURCE_TIMEOUT_SECONDS = float(os.getenv("SOURCE_TIMEOUT_SECONDS", "90"))
+# Placeholder reading material returned when the LLM gives nothing back.
+NOTHING_GENERATED = "Nothing was generated. Please try again."
 
 # ----------------------------- Utility Functions -----------------------------
 
@@ -28,11 +37,15 @@ def read_file(path: str, mode: str = "r", encoding: Optional[str] = "utf-8") ->
     except Exception as e:
         raise ValueError(f"Failed to read file: {e}")
 
-def extract_text_from_pdf(pdf_path: str) -> str:
+def extract_text_from_pdf(pdf_path: str, pages: Optional[str] = None) -> str:
+    try:
+        return extract_pdf_text(pdf_path, pages)
+    except Exception as e:
+        raise ValueError(f"Failed to extract text from PDF: {e}")
+
+async def aextract_text_from_pdf(pdf_path: str, pages: Optional[str] = None) -> str:
     try:
-        with open(pdf_path, "rb") as f:
-            reader = PyPDF2.PdfReader(f)
-            return "".join(page.extract_text() or "" for page in reader.pages).strip()
+        return await aextract_pdf_text(pdf_path, pages)
     except Exception as e:
         raise ValueError(f"Failed to extract text from PDF: {e}")
 
@@ -43,15 +56,14 @@ def extract_text_from_txt(txt_path: str) -> str:
     except Exception as e:
         raise ValueError(f"Failed to read text file: {e}")
 
-def scrape_text_from_url(url: str) -> str:
+async def scrape_text_from_url(url: str) -> str:
     try:
-        response = requests.get(url, timeout=10)
-        soup = BeautifulSoup(response.content, "html.parser")
-        for tag in soup(["script", "style"]):
-            tag.extract()
-        return soup.get_text(separator="\n").strip()
+        text = await acached_url_text(url, lambda body, content_type: clean_text(page_to_text(body, content_type)))
     except Exception as e:
         raise ValueError(f"Failed to scrape URL '{url}': {e}")
+    if not text:
+        print(f"No text extracted from URL '{url}'; the source will be skipped.")
+    return text
 
 def clean_text(text: str) -> str:
     text = re.sub(r'\s+', ' ', text)
@@ -59,54 +71,124 @@ def clean_text(text: str) -> str:
     text = re.sub(r'<[^>]+>', '', text)
     return text.strip()
 
-def truncate_text(text: str, max_chars: int = MAX_CHARS_PER_CONTEXT) -> str:
-    return text[:max_chars] if len(text) > max_chars else text
-
 # ----------------------------- LLM Interaction -----------------------------
 
-def call_gemini(prompt: str) -> str:
-    response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=prompt,
-    )
+def _strip_fences(response) -> str:
     raw = response.text.strip() if response.text else ""
     return re.sub(r'^```(?:json)?|```$', '', raw.strip())
 
-def call_llm(prompt: Content, system_prompt: str, response_schema: Type[BaseModel], debug: bool = False, temp: float = 0.2) -> Optional[dict]:
+def _parse_json_response(response) -> Optional[dict]:
+    logger.debug("LLM raw response: %s", response.text)
+    parsed_response = None
+    if response.text is not None:
+        parsed_response = json.loads(response.text)
+    return parsed_response
+
+def _json_config(system_prompt: str, response_schema: Type[BaseModel], temp: float) -> GenerateContentConfig:
+    return GenerateContentConfig(
+        system_instruction=system_prompt,
+        response_mime_type="application/json",
+        response_schema=response_schema,
+        temperature=temp
+    )
+
+def call_gemini(prompt: str, stage: Optional[str] = None) -> str:
+    response = generate_content(get_llm_client(), contents=prompt, stage=stage)
+    return _strip_fences(response)
+
+def call_llm(prompt: Content, system_prompt: str, response_schema: Type[BaseModel], debug: bool = False, temp: float = 0.2, stage: Optional[str] = None) -> Optional[dict]:
     try:
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt,
-            config=GenerateContentConfig(
-                system_instruction=system_prompt,
-                response_mime_type="application/json",
-                response_schema=response_schema,
-                temperature=temp
-            )
-        )
-        if debug or True:  # force debug always for now
-            print(f"\n=== LLM RAW RESPONSE ===\n{response.text}\n=== END ===\n")
-
-        parsed_response = None
-        if response.text is not None:
-            parsed_response = json.loads(response.text)
-        return parsed_response
+        response = generate_content(get_llm_client(), contents=prompt, config=_json_config(system_prompt, response_schema, temp), stage=stage)
+        return _parse_json_response(response)
 
+    except LLMRateLimitError:
+        raise
     except Exception as e:
-        print(f"LLM call failed: {e}")
+        logger.warning(f"LLM call failed: {e}")
+        return None
+
+async def acall_gemini(prompt: str, stage: Optional[str] = None) -> str:
+    response = await agenerate_content(get_llm_client(), contents=prompt, stage=stage)
+    return _strip_fences(response)
+
+async def astream_gemini(prompt: str, temp: Optional[float] = None, stage: Optional[str] = None):
+    config = GenerateContentConfig(temperature=temp) if temp is not None else None
+    async for chunk in astream_content(get_llm_client(), contents=prompt, config=config, stage=stage):
+        yield chunk
+
+async def acall_llm(prompt: Content, system_prompt: str, response_schema: Type[BaseModel], debug: bool = False, temp: float = 0.2, stage: Optional[str] = None) -> Optional[dict]:
+    try:
+        response = await agenerate_content(get_llm_client(), contents=prompt, config=_json_config(system_prompt, response_schema, temp), stage=stage)
+        with span("parse"):
+            return _parse_json_response(response)
+
+    except LLMRateLimitError:
+        raise
+    except Exception as e:
+        logger.warning(f"LLM call failed: {e}")
         return None
 
 # ----------------------------- Prompt Helpers -----------------------------
 
-def summarize_text_with_gemini(text: str, label: str) -> str:
-    if not text.strip():
-        return ""
-    prompt = f"""
+def _summary_prompt(text: str, label: str) -> str:
+    return f"""
 You are a concise summarizer.
 Summarize the following {label} in simple bullet points. Avoid examples or repetition.
-{text[:MAX_CHARS_PER_CONTEXT]}
+{fit_to_budget(text, "summarize")}
 """
-    return call_gemini(prompt)
+
+def summarize_text_with_gemini(text: str, label: str) -> str:
+    if not text.strip():
+        return ""
+    return call_gemini(_summary_prompt(text, label), stage="summarize")
+
+async def _summarize_once(text: str, label: str) -> str:
+    return await acall_gemini(_summary_prompt(text, label), stage="summarize")
+
+async def asummarize_text_with_gemini(text: str, label: str) -> str:
+    # Long sources are chunked, summarized in parallel and reduced instead of
+    # being cut off at the summarize budget.
+    if not text.strip():
+        return ""
+    return await map_reduce_summarize(text, label, _summarize_once)
+
+# ----------------------------- Source Loading -----------------------------
+# Extracted text and summaries are cached by content hash (or URL + validators),
+# so every activity that points at the same source reuses one parse and summary.
+
+SOURCE_LABELS = {
+    "notes": "lecture notes",
+    "pdf": "PDF reference",
+    "url": "web article",
+    "examples": "example explanations",
+}
+
+async def load_source_text(kind: str, location: str, pages: Optional[str] = None) -> str:
+    with span(f"load.{kind}"):
+        if kind == "url":
+            return await scrape_text_from_url(location)
+        if kind == "pdf":
+            # PDFs are parsed page by page in the process pool; the range is part of the cache key.
+            return await acached_file_text(location, f"pdf[{pages or ''}]", lambda p: aextract_text_from_pdf(p, pages))
+        return await asyncio.to_thread(cached_file_text, location, kind, lambda p: clean_text(read_file(p)))
+
+async def summarize_source(text: str, kind: str) -> str:
+    if not text.strip():
+        return ""
+    with span(f"summarize.{kind}"):
+        return await cached_summary(text, SOURCE_LABELS[kind], asummarize_text_with_gemini)
+
+async def prepare_source(kind: str, location: Optional[str] = None, text: str = "", pages: Optional[str] = None) -> str:
+    # Load + summarize one source under its own deadline; a slow source is
+    # dropped from the context rather than holding up the whole generation.
+    try:
+        async with asyncio.timeout(SOURCE_TIMEOUT_SECONDS):
+            if location:
+                text = await load_source_text(kind, location, pages)
+            return await summarize_source(text, kind)
+    except TimeoutError:
+        print(f"Source '{kind}' timed out after {SOURCE_TIMEOUT_SECONDS}s; continuing without it.")
+        return ""
 
 def course_outline_to_text(outline: Union[dict, List[dict]]) -> str:
     if isinstance(outline, dict):
@@ -131,6 +213,7 @@ class ReadingInput(BaseModel):
     previous_material_summary: str
     notes_path: Optional[str] = None
     pdf_path: Optional[str] = None
+    pdf_pages: Optional[str] = None  # e.g. "3-10", 1-based inclusive
     url: Optional[str] = None
 
 class LectureInput(BaseModel):
@@ -144,6 +227,7 @@ class LectureInput(BaseModel):
     prev_activities_summary: Union[str, None] = None
     notes_path: Union[str, None] = None
     pdf_path: Union[str, None] = None
+    pdf_pages: Union[str, None] = None  # e.g. "3-10", 1-based inclusive
     text_examples: Union[List[str], None] = None
     duration_minutes: Union[int, None] = 10
 
@@ -193,7 +277,50 @@ class LectureScriptOut(BaseModel):
     lecture_script_summary: Optional[str] = None
 # ----------------------------- Content Generators -----------------------------
 
-def generate_reading_material(
+READING_JSON_OUTPUT = """
+### Output Format:
+Return a JSON object with the following fields:
+- reading_material: Markdown passage with clear structure, explanations, examples, code, math, applications, suggested visuals, and ending summary.
+- source_summaries: A list of summaries for notes, PDF, and URL (omit if not available).
+"""
+
+READING_MARKDOWN_OUTPUT = """
+### Output Format:
+Return ONLY the reading material as a Markdown passage with clear structure, explanations, examples, code, math, applications, suggested visuals, and ending summary.
+Do not wrap it in JSON or code fences.
+"""
+
+LECTURE_JSON_OUTPUT = """
+### Output:
+Return a JSON object with the following fields:
+- lecture_script: The full lecture script in markdown format, with proper headings, speaker notes, and segments.
+- source_summaries: A list of summaries for notes, PDF, and examples (omit if not available).
+- lecture_script_summary: A concise summary of the lecture script (see below).
+
+
+Return in bullet points, grouped under "Key Concepts", "Learning Goals", and "Examples or Analogies".
+"""
+
+LECTURE_MARKDOWN_OUTPUT = """
+### Output:
+Return ONLY the full lecture script in markdown format, with proper headings, speaker notes, and segments.
+Do not wrap it in JSON or code fences.
+"""
+
+async def _reading_sources(notes_path=None, pdf_path=None, url=None, pdf_pages=None):
+    summarized_notes, summarized_pdf, summarized_url = await asyncio.gather(
+        prepare_source("notes", notes_path),
+        prepare_source("pdf", pdf_path, pages=pdf_pages),
+        prepare_source("url", url)
+    )
+
+    return {
+        "notesSummary": summarized_notes,
+        "pdfSummary": summarized_pdf,
+        "urlSummary": summarized_url
+    }
+
+def _reading_prompt(
     course_outline,
     module_name,
     submodule_name,
@@ -202,27 +329,28 @@ def generate_reading_material(
     activity_objective,
     user_prompt,
     previous_material_summary,
-    notes_path=None,
-    pdf_path=None,
-    url=None
+    source_summaries,
+    output_format=READING_JSON_OUTPUT
 ):
-    notes_text = clean_text(read_file(notes_path)) if notes_path else ""
-    pdf_text = clean_text(extract_text_from_pdf(pdf_path)) if pdf_path else ""
-    url_text = clean_text(scrape_text_from_url(url)) if url else ""
-
-    summarized_notes = summarize_text_with_gemini(notes_text, label="lecture notes") if notes_text else ""
-    summarized_pdf = summarize_text_with_gemini(pdf_text, label="PDF reading") if pdf_text else ""
-    summarized_url = summarize_text_with_gemini(url_text, label="web article") if url_text else ""
+    # Variable-length inputs share one token budget; the user's prompt and
+    # the outline win over source summaries, which win over older material.
+    with span("pack_context"):
+        packed = pack_sections([
+            Section(name="user_prompt", text=user_prompt or "", priority=0),
+            Section(name="outline", text=course_outline_to_text(course_outline), priority=1),
+            Section(name="notes", text=source_summaries["notesSummary"], priority=2),
+            Section(name="pdf", text=source_summaries["pdfSummary"], priority=2),
+            Section(name="url", text=source_summaries["urlSummary"], priority=2),
+            Section(name="previous", text=previous_material_summary or "", priority=3),
+        ], stage_budget("reading"))
 
-    combined_context = "\n\n".join(filter(None, [
-        f"--- Summary from Notes ---\n{summarized_notes}",
-        f"--- Summary from PDF ---\n{summarized_pdf}",
-        f"--- Summary from URL ---\n{summarized_url}"
-    ])).strip()
-
-    combined_context = truncate_text(combined_context)
+    combined_context = "\n\n".join([
+        f"--- Summary from Notes ---\n{packed['notes']}" if packed["notes"] else "",
+        f"--- Summary from PDF ---\n{packed['pdf']}" if packed["pdf"] else "",
+        f"--- Summary from URL ---\n{packed['url']}" if packed["url"] else ""
+    ]).strip()
 
-    prompt = f"""
+    return f"""
 You are an expert Math/Data Analyst/Machine Learning/Deep Learning/Generative AI educator.
 
 Create **reading material** for a submodule. Ensure:
@@ -233,15 +361,15 @@ Create **reading material** for a submodule. Ensure:
 
 ### Input:
 Course Outline:
-{course_outline_to_text(course_outline)}
+{packed['outline']}
 
 Module: {module_name}
 Submodule: {submodule_name}
-User Prompt: {user_prompt}
+User Prompt: {packed['user_prompt']}
 Activity Name: {activity_name}
 Activity Description: {activity_description}
 Activity Objective: {activity_objective}
-Previous Summary: {previous_material_summary}
+Previous Summary: {packed['previous']}
 Context:
 {combined_context or 'No additional context provided.'}
 
@@ -252,13 +380,35 @@ Context:
 - Suggest visuals (diagrams, charts) to enhance understanding
 - Ensure the material is strictly relevant to specified activity (based on name, description, and objective)
 - Avoid unnecessary repetition of previous material
+{output_format}"""
 
-### Output Format:
-Return a JSON object with the following fields:
-- reading_material: Markdown passage with clear structure, explanations, examples, code, math, applications, suggested visuals, and ending summary.
-- source_summaries: A list of summaries for notes, PDF, and URL (omit if not available).
+def _reading_summary_prompt(reading_material: str) -> str:
+    return f"""
+Summarize the following reading material in concise bullet points:
+{reading_material}
 """
 
+async def generate_reading_material(
+    course_outline,
+    module_name,
+    submodule_name,
+    activity_name,
+    activity_description,
+    activity_objective,
+    user_prompt,
+    previous_material_summary,
+    notes_path=None,
+    pdf_path=None,
+    url=None,
+    pdf_pages=None
+):
+    source_summaries = await _reading_sources(notes_path, pdf_path, url, pdf_pages)
+
+    prompt = _reading_prompt(
+        course_outline, module_name, submodule_name, activity_name, activity_description,
+        activity_objective, user_prompt, previous_material_summary, source_summaries
+    )
+
     user_content = Content(
         role="user",
         parts=[
@@ -266,39 +416,27 @@ Return a JSON object with the following fields:
         ]
     )
 
-    response = call_llm(user_content, prompt, ReadingMaterialOut)
+    response = await acall_llm(user_content, prompt, ReadingMaterialOut, stage="reading")
     if response is None:
         return ReadingMaterialOut(
-            reading_material="Nothing was generated. Please try again.",
+            reading_material=NOTHING_GENERATED,
             reading_material_summary="",
             source_summaries=None
-        ), {
-            "notesSummary": summarized_notes,
-            "pdfSummary": summarized_pdf,
-            "urlSummary": summarized_url
-        }
+        ), source_summaries
 
     # Fallback summarization (auto-summarize if missing)
     material_summary = response.get("reading_material_summary")
     if not material_summary:
-        summary_prompt = f"""
-Summarize the following reading material in concise bullet points:
-{response['reading_material']}
-"""
-        material_summary = call_gemini(summary_prompt) or ""
+        material_summary = await acall_gemini(_reading_summary_prompt(response['reading_material']), stage="summarize") or ""
 
     return ReadingMaterialOut(
         reading_material=response["reading_material"],
         reading_material_summary=material_summary,
         source_summaries=response.get("source_summaries")
-    ), {
-        "notesSummary": summarized_notes,
-        "pdfSummary": summarized_pdf,
-        "urlSummary": summarized_url
-    }
+    ), source_summaries
 
 
-def generate_lecture_script(
+async def stream_reading_material(
     course_outline,
     module_name,
     submodule_name,
@@ -306,30 +444,83 @@ def generate_lecture_script(
     activity_description,
     activity_objective,
     user_prompt,
-    prev_activities_summary=None,
+    previous_material_summary,
     notes_path=None,
     pdf_path=None,
-    text_examples: Optional[List[str]] = None,
-    duration_minutes: int = 10
+    url=None,
+    pdf_pages=None
 ):
-    notes_text = clean_text(extract_text_from_txt(notes_path)) if notes_path else ""
-    pdf_text = clean_text(extract_text_from_pdf(pdf_path)) if pdf_path else ""
+    # Yields ("token", markdown_chunk) as the model writes, then one
+    # ("result", ReadingMaterialOut) once the summary is done.
+    source_summaries = await _reading_sources(notes_path, pdf_path, url, pdf_pages)
+
+    prompt = _reading_prompt(
+        course_outline, module_name, submodule_name, activity_name, activity_description,
+        activity_objective, user_prompt, previous_material_summary, source_summaries,
+        output_format=READING_MARKDOWN_OUTPUT
+    )
+
+    chunks = []
+    async for chunk in astream_gemini(prompt, stage="reading"):
+        chunks.append(chunk)
+        yield "token", chunk
+
+    reading_material = "".join(chunks).strip()
+    material_summary = await acall_gemini(_reading_summary_prompt(reading_material), stage="summarize") or ""
+
+    yield "result", ReadingMaterialOut(
+        reading_material=reading_material,
+        reading_material_summary=material_summary,
+        source_summaries=[summary for summary in source_summaries.values() if summary] or None
+    )
+
+
+async def _lecture_sources(notes_path=None, pdf_path=None, text_examples=None, pdf_pages=None):
     examples_text = "\n".join(text_examples or [])
 
-    summarized_notes = summarize_text_with_gemini(notes_text, label="lecture notes") if notes_text else ""
-    summarized_pdf = summarize_text_with_gemini(pdf_text, label="PDF reference") if pdf_text else ""
-    summarized_examples = summarize_text_with_gemini(examples_text, label="example explanations") if examples_text else ""
+    summarized_notes, summarized_pdf, summarized_examples = await asyncio.gather(
+        prepare_source("notes", notes_path),
+        prepare_source("pdf", pdf_path, pages=pdf_pages),
+        prepare_source("examples", text=examples_text)
+    )
+
+    return {
+        "notesSummary": summarized_notes,
+        "pdfSummary": summarized_pdf,
+        "examplesSummary": summarized_examples
+    }
+
+def _lecture_prompt(
+    course_outline,
+    module_name,
+    submodule_name,
+    activity_name,
+    activity_description,
+    activity_objective,
+    user_prompt,
+    duration_minutes,
+    prev_activities_summary,
+    source_summaries,
+    output_format=LECTURE_JSON_OUTPUT
+):
+    with span("pack_context"):
+        packed = pack_sections([
+            Section(name="user_prompt", text=user_prompt or "", priority=0),
+            Section(name="outline", text=course_outline_to_text(course_outline), priority=1),
+            Section(name="notes", text=source_summaries["notesSummary"], priority=2),
+            Section(name="pdf", text=source_summaries["pdfSummary"], priority=2),
+            Section(name="examples", text=source_summaries["examplesSummary"], priority=2),
+            Section(name="previous", text=prev_activities_summary or "", priority=3),
+        ], stage_budget("lecture"))
 
     combined_context = "\n\n".join([
-        f"--- Notes Summary ---\n{summarized_notes}" if summarized_notes else "",
-        f"--- PDF Summary ---\n{summarized_pdf}" if summarized_pdf else "",
-        f"--- Example Summary ---\n{summarized_examples}" if summarized_examples else "",
-        f"--- Previous Activities Summary ---\n{prev_activities_summary}" if prev_activities_summary else ""
+        f"--- Notes Summary ---\n{packed['notes']}" if packed["notes"] else "",
+        f"--- PDF Summary ---\n{packed['pdf']}" if packed["pdf"] else "",
+        f"--- Example Summary ---\n{packed['examples']}" if packed["examples"] else "",
+        f"--- Previous Activities Summary ---\n{packed['previous']}" if packed["previous"] else ""
     ]).strip()
 
-    combined_context = truncate_text(combined_context)
-
-    prompt = f"""
+    return f"""
 You are a skilled educator and video content designer.
 
 Create a **lecture script** for the following submodule of an AI course.
@@ -344,14 +535,14 @@ Create a **lecture script** for the following submodule of an AI course.
 ### Input:
 
 Course Outline:
-{course_outline_to_text(course_outline)}
+{packed['outline']}
 
 Module: {module_name}
 Submodule: {submodule_name}
 Activity Name: {activity_name}
 Activity Description: {activity_description}
 Activity Objective: {activity_objective}
-User Prompt: {user_prompt}
+User Prompt: {packed['user_prompt']}
 Duration: {duration_minutes} minutes
 
 ### Context:
@@ -361,17 +552,42 @@ Duration: {duration_minutes} minutes
 - Suggest visuals (diagrams, charts) to enhance understanding
 - Ensure the script is strictly relevant to specified activity (based on name, description, and objective)
 - Avoid unnecessary repetition of previous script material
+{output_format}"""
 
-### Output:
-Return a JSON object with the following fields:
-- lecture_script: The full lecture script in markdown format, with proper headings, speaker notes, and segments.
-- source_summaries: A list of summaries for notes, PDF, and examples (omit if not available).
-- lecture_script_summary: A concise summary of the lecture script (see below).
+def _lecture_summary_prompt(lecture_script: str) -> str:
+    return f"""
+Summarize the following lecture script in bullet points grouped by:
 
+- Key Concepts
+- Learning Goals
+- Examples or Analogies
 
-Return in bullet points, grouped under "Key Concepts", "Learning Goals", and "Examples or Analogies".
+Lecture Script:
+{lecture_script}
 """
 
+async def generate_lecture_script(
+    course_outline,
+    module_name,
+    submodule_name,
+    activity_name,
+    activity_description,
+    activity_objective,
+    user_prompt,
+    prev_activities_summary=None,
+    notes_path=None,
+    pdf_path=None,
+    text_examples: Optional[List[str]] = None,
+    duration_minutes: int = 10,
+    pdf_pages: Optional[str] = None
+):
+    source_summaries = await _lecture_sources(notes_path, pdf_path, text_examples, pdf_pages)
+
+    prompt = _lecture_prompt(
+        course_outline, module_name, submodule_name, activity_name, activity_description,
+        activity_objective, user_prompt, duration_minutes, prev_activities_summary, source_summaries
+    )
+
     user_content = Content(
         role="user",
         parts=[
@@ -379,41 +595,63 @@ Return in bullet points, grouped under "Key Concepts", "Learning Goals", and "Ex
         ]
     )
 
-    response = call_llm(user_content, prompt, LectureScriptOut, temp=0.4)
+    response = await acall_llm(user_content, prompt, LectureScriptOut, temp=0.4, stage="lecture")
     if response is None:
-        return {"error": "Nothing was generated. Please try again."}, {
-            "notesSummary": summarized_notes,
-            "pdfSummary": summarized_pdf,
-            "examplesSummary": summarized_examples
-        }, None
+        return {"error": "Nothing was generated. Please try again."}, source_summaries, None
 
     lecture_script = response["lecture_script"]
 
     # ✅ Auto-generate summary if not provided by LLM
-    summary_prompt = f"""
-Summarize the following lecture script in bullet points grouped by:
-
-- Key Concepts
-- Learning Goals
-- Examples or Analogies
-
-Lecture Script:
-{lecture_script}
-"""
-    lecture_script_summary = call_gemini(summary_prompt) or ""
+    lecture_script_summary = await acall_gemini(_lecture_summary_prompt(lecture_script), stage="summarize") or ""
 
     return (
         lecture_script,
-        {
-            "notesSummary": summarized_notes,
-            "pdfSummary": summarized_pdf,
-            "examplesSummary": summarized_examples
-        },
+        source_summaries,
         lecture_script_summary
     )
 
 
-def generate_quiz(module_name: str,
+async def stream_lecture_script(
+    course_outline,
+    module_name,
+    submodule_name,
+    activity_name,
+    activity_description,
+    activity_objective,
+    user_prompt,
+    prev_activities_summary=None,
+    notes_path=None,
+    pdf_path=None,
+    text_examples: Optional[List[str]] = None,
+    duration_minutes: int = 10,
+    pdf_pages: Optional[str] = None
+):
+    # Yields ("token", markdown_chunk) as the model writes, then one
+    # ("result", LectureScriptOut) once the summary is done.
+    source_summaries = await _lecture_sources(notes_path, pdf_path, text_examples, pdf_pages)
+
+    prompt = _lecture_prompt(
+        course_outline, module_name, submodule_name, activity_name, activity_description,
+        activity_objective, user_prompt, duration_minutes, prev_activities_summary, source_summaries,
+        output_format=LECTURE_MARKDOWN_OUTPUT
+    )
+
+    chunks = []
+    async for chunk in astream_gemini(prompt, temp=0.4, stage="lecture"):
+        chunks.append(chunk)
+        yield "token", chunk
+
+    lecture_script = "".join(chunks).strip()
+    lecture_script_summary = await acall_gemini(_lecture_summary_prompt(lecture_script), stage="summarize") or ""
+
+    yield "result", LectureScriptOut(
+        lecture_script=lecture_script,
+        source_summaries=[summary for summary in source_summaries.values() if summary] or None,
+        lecture_script_summary=lecture_script_summary
+    )
+
+
+async def generate_quiz(module_name: str,
                  submodule_name: str,
                  activity_name: str,
                  activity_description: str,
@@ -431,7 +669,7 @@ You are a quiz designer for an educational AI system.
 Generate a quiz for the **submodule** "{submodule_name}" under the module "{module_name}, having activity name {activity_name} which is all about {activity_description} to achieve the objective of {activity_objective}". Use the following content source:
 
 ### Material Summary:
-{material_summary}
+{fit_to_budget(material_summary, "quiz")}
 
 ### Guidelines:
 - Create exactly {number_of_questions} questions.
@@ -465,11 +703,11 @@ Return a **JSON array** where each item follows this schema:
             Part(text="Generate a quiz based on the following instructions:"),
         ]
     )
-    response = call_llm(user_content, prompt, QuizSet)
+    response = await acall_llm(user_content, prompt, QuizSet, stage="quiz")
     return response if response is not None else {"error": "Nothing was generated. Please try again."}
 
 
-def generate_assignment(module_name, submodule_name, user_prompt, all_submodule_summaries):
+async def generate_assignment(module_name, submodule_name, user_prompt, all_submodule_summaries):
     prompt = f"""
 You are a course designer. Create an **assignment** based on submodule summaries.
 It should integrate concepts and assess practical + theoretical understanding.
@@ -479,14 +717,14 @@ Module: {module_name}
 Submodule: {submodule_name}
 User Prompt: {user_prompt}
 Submodule Summaries:
-{submodules_to_bullets(all_submodule_summaries)}
+{fit_to_budget(submodules_to_bullets(all_submodule_summaries), "assignment")}
 
 ### Output:
 Markdown with Title, Description, Objectives, Deliverables, Evaluation Criteria
 """
-    return call_gemini(prompt)
+    return await acall_gemini(prompt, stage="assignment")
 
-def generate_mindmap(module_name, submodule_summaries):
+async def generate_mindmap(module_name, submodule_summaries):
     prompt = f"""
 You are a mind map generator.
 Create a **mind map** from submodule summaries in nested bullet point style.
@@ -494,9 +732,9 @@ Create a **mind map** from submodule summaries in nested bullet point style.
 ### Input:
 Module: {module_name}
 Summaries:
-{submodules_to_bullets(submodule_summaries)}
+{fit_to_budget(submodules_to_bullets(submodule_summaries), "mindmap")}
 
 ### Output:
 Markdown nested bullet point map
 """
-    return call_gemini(prompt)
\ No newline at end of file
+    return await acall_gemini(prompt, stage="mindmap")
\ No newline at end of file
@@ -0,0 +1,321 @@
+# course_pipeline.py
+
+import os
+import asyncio
+from typing import Any, Callable, Dict, List, Optional, Type
+from pydantic import BaseModel
+from genai_logic import (
+    CourseInit,
+    CourseOutline,
+    ModuleSet,
+    Module,
+    SubmoduleSet,
+    Submodule,
+    ActivitySet,
+    Activity,
+    generate_course_outline,
+    generate_modules,
+    generate_submodules,
+    generate_activities,
+)
+from course_content_generator import (
+    generate_reading_material,
+    generate_lecture_script,
+    generate_quiz,
+    NOTHING_GENERATED,
+    QuizSet,
+    ReadingMaterialOut,
+    LectureScriptOut,
+)
+
+# ----------------------------- Constants -----------------------------
+# Upper bound on LLM-backed steps in flight across *all* pipeline runs.
+PIPELINE_CONCURRENCY = int(os.getenv("PIPELINE_CONCURRENCY", "8"))
+# Shape assumed for parts of the course not generated yet, for the progress
+# estimate; replaced by observed averages as modules and submodules expand.
+ESTIMATED_MODULES = 4
+ESTIMATED_SUBMODULES_PER_MODULE = 4
+
+_limiter: Optional[asyncio.Semaphore] = None
+
+def _global_limiter() -> asyncio.Semaphore:
+    global _limiter
+    if _limiter is None:
+        _limiter = asyncio.Semaphore(PIPELINE_CONCURRENCY)
+    return _limiter
+
+# ----------------------------- Pydantic Models -----------------------------
+
+class PipelineRequest(BaseModel):
+    course: CourseInit
+    activity_types: List[str] = ["Lecture", "Reading Material", "Quiz"]
+    activity_instructions: Optional[str] = None
+    content_prompt: str = ""
+    lecture_minutes: int = 10
+    quiz_questions: int = 5
+    quiz_type: str = "MCQ"
+    quiz_total_score: int = 10
+
+class ActivityResult(BaseModel):
+    activity: Activity
+    content_type: Optional[str] = None
+    content: Optional[Any] = None
+
+class SubmoduleResult(BaseModel):
+    submodule: Submodule
+    activities: List[ActivityResult] = []
+
+class ModuleResult(BaseModel):
+    module: Module
+    submodules: List[SubmoduleResult] = []
+
+class PipelineError(BaseModel):
+    step: str
+    error: str
+
+class CoursePipelineOut(BaseModel):
+    outline: Optional[CourseOutline] = None
+    modules: List[ModuleResult] = []
+    errors: List[PipelineError] = []
+    steps_total: int = 0
+    steps_done: int = 0
+
+# ----------------------------- Helpers -----------------------------
+
+def _expect(data: Any, model: Type[BaseModel]) -> BaseModel:
+    if data is None or (isinstance(data, dict) and "error" in data):
+        raise ValueError((data or {}).get("error", "Nothing was generated."))
+    return model.model_validate(data)
+
+def content_kind(activity_type: str) -> Optional[str]:
+    lowered = activity_type.lower()
+    if "reading" in lowered:
+        return "reading"
+    if "lecture" in lowered:
+        return "lecture"
+    if "quiz" in lowered:
+        return "quiz"
+    return None
+
+# ----------------------------- Pipeline -----------------------------
+# The course is a DAG: outline -> modules -> submodules (per module) ->
+# activities (per submodule) -> reading/lecture -> quiz. Each node starts as
+# soon as its own inputs exist; siblings run in parallel and only the LLM
+# work itself is counted against the global limit, so waiting on a
+# dependency never holds a slot.
+#
+# Steps are only discovered as their parents finish, so done/started would
+# hit 1.0 long before the end. Progress is instead reported against an
+# estimate of the whole course, and never goes backwards.
+
+class CoursePipeline:
+    def __init__(self, request: PipelineRequest, progress: Optional[Callable[[float, str], None]] = None):
+        self.request = request
+        self.progress = progress
+        self.limiter = _global_limiter()
+        self.errors: List[PipelineError] = []
+        self.steps_total = 0
+        self.steps_done = 0
+        # What the course has turned out to contain so far.
+        self.modules_known: Optional[int] = None
+        self.modules_expanded = 0
+        self.submodules_found = 0
+        self.submodules_expanded = 0
+        self.content_found = 0
+        self._reported = 0.0
+
+    def estimated_steps(self) -> float:
+        modules = ESTIMATED_MODULES if self.modules_known is None else self.modules_known
+        per_module = (
+            self.submodules_found / self.modules_expanded
+            if self.modules_expanded else ESTIMATED_SUBMODULES_PER_MODULE
+        )
+        per_submodule = (
+            self.content_found / self.submodules_expanded
+            if self.submodules_expanded
+            else sum(content_kind(t) is not None for t in self.request.activity_types)
+        )
+        # outline + modules, one step per module and submodule, plus content;
+        # parts not generated yet are filled in from the averages.
+        submodule_steps = 1 + per_submodule
+        module_steps = 1 + per_module * submodule_steps
+        return (
+            2
+            + self.modules_expanded + max(modules - self.modules_expanded, 0) * module_steps
+            + self.submodules_expanded + max(self.submodules_found - self.submodules_expanded, 0) * submodule_steps
+            + self.content_found
+        )
+
+    def _report(self, name: str):
+        total = max(self.estimated_steps(), self.steps_total)
+        # Held below 1.0: the job itself reports completion.
+        self._reported = max(self._reported, min(self.steps_done / total, 0.99))
+        self.progress(self._reported, f"{name} ({self.steps_done} of ~{round(total)} steps)")
+
+    async def _step(self, name: str, fn, *args):
+        self.steps_total += 1
+        try:
+            async with self.limiter:
+                return await fn(*args)
+        except Exception as e:
+            self.errors.append(PipelineError(step=name, error=str(e)))
+            return None
+        finally:
+            self.steps_done += 1
+            if self.progress is not None:
+                self._report(name)
+
+    async def run(self) -> CoursePipelineOut:
+        outline = await self._step("outline", self._outline)
+        modules = []
+        if outline is not None:
+            module_set = await self._step("modules", self._modules, outline)
+            if module_set is not None:
+                modules = await asyncio.gather(*(self._run_module(outline, m) for m in module_set.modules))
+
+        return CoursePipelineOut(
+            outline=outline,
+            modules=list(modules),
+            errors=self.errors,
+            steps_total=self.steps_total,
+            steps_done=self.steps_done
+        )
+
+    async def _run_module(self, outline: CourseOutline, module: Module) -> ModuleResult:
+        submodule_set = await self._step(f"submodules:{module.module_id}", self._submodules, module)
+        submodules = []
+        if submodule_set is not None:
+            submodules = await asyncio.gather(
+                *(self._run_submodule(outline, module, s) for s in submodule_set.submodules)
+            )
+        return ModuleResult(module=module, submodules=list(submodules))
+
+    async def _run_submodule(self, outline: CourseOutline, module: Module, submodule: Submodule) -> SubmoduleResult:
+        activity_set = await self._step(f"activities:{submodule.submodule_id}", self._activities, submodule)
+        if activity_set is None:
+            return SubmoduleResult(submodule=submodule)
+
+        material_tasks: List[asyncio.Task] = []
+        tasks: List[Optional[asyncio.Task]] = []
+        for activity in activity_set.activities:
+            kind = content_kind(activity.activity_type)
+            name = f"{kind}:{submodule.submodule_id}:{activity.activity_name}"
+            if kind == "reading":
+                task = asyncio.create_task(self._step(name, self._reading, outline, module, submodule, activity))
+                material_tasks.append(task)
+            elif kind == "lecture":
+                task = asyncio.create_task(self._step(name, self._lecture, outline, module, submodule, activity))
+                material_tasks.append(task)
+            else:
+                task = None
+            tasks.append(task)
+
+        # Quizzes depend only on the reading/lecture material of their own submodule.
+        for i, activity in enumerate(activity_set.activities):
+            if content_kind(activity.activity_type) == "quiz":
+                name = f"quiz:{submodule.submodule_id}:{activity.activity_name}"
+                tasks[i] = asyncio.create_task(self._quiz(name, module, submodule, activity, material_tasks))
+
+        contents = await asyncio.gather(*(t if t is not None else asyncio.sleep(0) for t in tasks))
+        return SubmoduleResult(
+            submodule=submodule,
+            activities=[
+                ActivityResult(activity=a, content_type=content_kind(a.activity_type), content=c)
+                for a, c in zip(activity_set.activities, contents)
+            ]
+        )
+
+    # ----------------------------- Steps -----------------------------
+
+    async def _outline(self) -> CourseOutline:
+        return _expect(await generate_course_outline(self.request.course), CourseOutline)
+
+    # The expansion steps record what they found (nothing, if they failed)
+    # before _step reports progress.
+
+    async def _modules(self, outline: CourseOutline) -> ModuleSet:
+        module_set = None
+        try:
+            module_set = _expect(await generate_modules(outline), ModuleSet)
+            return module_set
+        finally:
+            self.modules_known = len(module_set.modules) if module_set is not None else 0
+
+    async def _submodules(self, module: Module) -> SubmoduleSet:
+        try:
+            submodule_set = _expect(await generate_submodules(module), SubmoduleSet)
+            self.submodules_found += len(submodule_set.submodules)
+            return submodule_set
+        finally:
+            self.modules_expanded += 1
+
+    async def _activities(self, submodule: Submodule) -> ActivitySet:
+        try:
+            data = await generate_activities(
+                submodule=submodule,
+                activity_types=",".join(self.request.activity_types),
+                user_instructions=self.request.activity_instructions
+            )
+            activity_set = _expect(data, ActivitySet)
+            self.content_found += sum(content_kind(a.activity_type) is not None for a in activity_set.activities)
+            return activity_set
+        finally:
+            self.submodules_expanded += 1
+
+    async def _reading(self, outline: CourseOutline, module: Module, submodule: Submodule, activity: Activity) -> ReadingMaterialOut:
+        result, _ = await generate_reading_material(
+            course_outline=outline.model_dump(),
+            module_name=module.module_title,
+            submodule_name=submodule.submodule_title,
+            activity_name=activity.activity_name,
+            activity_description=activity.activity_description,
+            activity_objective=activity.activity_objective,
+            user_prompt=self.request.content_prompt,
+            previous_material_summary=""
+        )
+        if result.reading_material == NOTHING_GENERATED:
+            raise ValueError(NOTHING_GENERATED)
+        return result
+
+    async def _lecture(self, outline: CourseOutline, module: Module, submodule: Submodule, activity: Activity) -> LectureScriptOut:
+        script, summaries, summary_text = await generate_lecture_script(
+            course_outline=outline.model_dump(),
+            module_name=module.module_title,
+            submodule_name=submodule.submodule_title,
+            activity_name=activity.activity_name,
+            activity_description=activity.activity_description,
+            activity_objective=activity.activity_objective,
+            user_prompt=self.request.content_prompt,
+            duration_minutes=self.request.lecture_minutes
+        )
+        if isinstance(script, dict):
+            raise ValueError(script.get("error", "Nothing was generated."))
+        return LectureScriptOut(lecture_script=script, lecture_script_summary=summary_text)
+
+    async def _quiz(self, name: str, module: Module, submodule: Submodule, activity: Activity, material_tasks: List[asyncio.Task]) -> Optional[QuizSet]:
+        materials = await asyncio.gather(*material_tasks)
+        summaries = [
+            m.reading_material_summary if isinstance(m, ReadingMaterialOut) else m.lecture_script_summary
+            for m in materials if m is not None
+        ]
+        material_summary = "\n\n".join(s for s in summaries if s) or submodule.submodule_description
+
+        async def quiz() -> QuizSet:
+            data = await generate_quiz(
+                module_name=module.module_title,
+                submodule_name=submodule.submodule_title,
+                activity_name=activity.activity_name,
+                activity_description=activity.activity_description,
+                activity_objective=activity.activity_objective,
+                material_summary=material_summary,
+                number_of_questions=self.request.quiz_questions,
+                quiz_type=self.request.quiz_type,
+                total_score=self.request.quiz_total_score,
+                user_prompt=self.request.content_prompt
+            )
+            return _expect(data, QuizSet)
+
+        return await self._step(name, quiz)
+
+async def run_course_pipeline(request: PipelineRequest, progress: Optional[Callable[[float, str], None]] = None) -> CoursePipelineOut:
+    return await CoursePipeline(request, progress).run()
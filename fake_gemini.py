@@ -0,0 +1,246 @@
+# fake_gemini.py
+# Local stand-in for the Gemini generateContent API, for benchmarks and
+# offline runs. Point the app at it with GEMINI_BASE_URL=http://127.0.0.1:<port>.
+#
+#   python fake_gemini.py --port 8089 --latency-ms 600 --error-rate 0.02
+
+import json
+import math
+import random
+import asyncio
+import argparse
+import threading
+from typing import Any, Dict, List, Optional
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from token_budget import count_tokens
+
+# ----------------------------- Constants -----------------------------
+# Strings in JSON responses are short sentences; free-text responses (bullet
+# summaries, streamed scripts) are TEXT_WORDS long.
+TEXT_WORDS = 300
+STRING_WORDS = 12
+ARRAY_ITEMS = 3
+STREAM_CHUNK_WORDS = 20
+# Thinking tokens a call spends when its budget allows; they add to the time
+# to first token like they do live. "-lite" models answer LITE_FACTOR faster.
+THINKING_TOKENS = 512
+LITE_FACTOR = 0.5
+
+# Fields the app branches on get values it recognizes, cycled by array index.
+STRING_HINTS = {
+    "activity_type": ["Lecture", "Reading Material", "Quiz"],
+    "quiz_type": ["MCQ"],
+}
+
+_WORDS = (
+    "model data training gradient layer network feature loss example concept "
+    "students learn practice theory apply evaluate understand structure method result"
+).split()
+
+class FakeGeminiConfig:
+    def __init__(
+        self,
+        latency_ms: float = 400.0,
+        latency_sigma: float = 0.5,
+        token_ms: float = 2.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        text_words: int = TEXT_WORDS,
+        thinking_tokens: int = THINKING_TOKENS,
+        seed: Optional[int] = None,
+    ):
+        # Time to first token is lognormal around latency_ms; each output
+        # token then adds token_ms, so long answers take longer like they do live.
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.token_ms = token_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.text_words = text_words
+        self.thinking_tokens = thinking_tokens
+        self.random = random.Random(seed)
+
+    def speed(self, model: str) -> float:
+        return LITE_FACTOR if "lite" in model else 1.0
+
+    def first_token_seconds(self, model: str, thinking_tokens: int = 0) -> float:
+        thinking = thinking_tokens * self.token_ms / 1000
+        if self.latency_ms <= 0:
+            return thinking * self.speed(model)
+        latency = self.random.lognormvariate(math.log(self.latency_ms), self.latency_sigma) / 1000
+        return (latency + thinking) * self.speed(model)
+
+    def thinking_for(self, body: Dict[str, Any]) -> int:
+        # No thinkingConfig (or -1) means the model decides; we spend the default.
+        thinking = (body.get("generationConfig") or {}).get("thinkingConfig") or {}
+        budget = thinking.get("thinkingBudget", thinking.get("thinking_budget"))  # the SDK sends either spelling
+        if budget is None or budget < 0:
+            return self.thinking_tokens
+        return min(budget, self.thinking_tokens)
+
+    def injected_error(self) -> Optional[int]:
+        roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            return 429
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 503
+        return None
+
+# ----------------------------- Synthetic Responses -----------------------------
+
+def _sentence(rng: random.Random, words: int) -> str:
+    text = " ".join(rng.choice(_WORDS) for _ in range(max(words, 1)))
+    return text[0].upper() + text[1:] + "."
+
+def _paragraphs(rng: random.Random, words: int) -> str:
+    lines = ["# Overview"]
+    while words > 0:
+        n = min(words, 15)
+        lines.append(f"- {_sentence(rng, n)}")
+        words -= n
+    return "\n".join(lines)
+
+def synthesize(schema: Dict[str, Any], rng: random.Random, name: str = "", index: int = 0) -> Any:
+    # Walks the OpenAPI-style schema the SDK sends (types in upper case).
+    if schema.get("enum"):
+        return schema["enum"][index % len(schema["enum"])]
+    kind = str(schema.get("type", "STRING")).upper()
+    if kind == "OBJECT":
+        return {
+            key: synthesize(prop, rng, key, index)
+            for key, prop in schema.get("properties", {}).items()
+        }
+    if kind == "ARRAY":
+        return [synthesize(schema.get("items", {}), rng, name, i) for i in range(ARRAY_ITEMS)]
+    if kind == "INTEGER":
+        return index + 1
+    if kind == "NUMBER":
+        return round(rng.uniform(0.5, 1.0), 2)
+    if kind == "BOOLEAN":
+        return True
+    if name in STRING_HINTS:
+        return STRING_HINTS[name][index % len(STRING_HINTS[name])]
+    if name.endswith("_id"):
+        return f"{name[:-3]}_{index + 1}"
+    return _sentence(rng, STRING_WORDS)
+
+def _prompt_text(body: Dict[str, Any]) -> str:
+    parts = []
+    for content in body.get("contents", []) + [body.get("systemInstruction") or {}]:
+        parts.extend(p.get("text", "") for p in content.get("parts", []))
+    return "\n".join(parts)
+
+def response_text(body: Dict[str, Any], config: FakeGeminiConfig) -> str:
+    generation = body.get("generationConfig") or {}
+    schema = generation.get("responseSchema")
+    if schema:
+        return json.dumps(synthesize(schema, config.random))
+    if generation.get("responseJsonSchema"):
+        return json.dumps({})
+    return _paragraphs(config.random, config.text_words)
+
+def _chunk(text: str, prompt_tokens: int, output_tokens: Optional[int], finished: bool, thinking_tokens: int = 0) -> Dict[str, Any]:
+    candidate: Dict[str, Any] = {"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}
+    if finished:
+        candidate["finishReason"] = "STOP"
+    usage: Dict[str, Any] = {"promptTokenCount": prompt_tokens}
+    if output_tokens is not None:
+        usage.update(candidatesTokenCount=output_tokens, totalTokenCount=prompt_tokens + output_tokens + thinking_tokens)
+        if thinking_tokens:
+            usage["thoughtsTokenCount"] = thinking_tokens
+    return {"candidates": [candidate], "usageMetadata": usage, "modelVersion": "fake"}
+
+def _error(code: int) -> JSONResponse:
+    status = "RESOURCE_EXHAUSTED" if code == 429 else "UNAVAILABLE"
+    body = {"error": {"code": code, "message": f"Injected {status} from fake Gemini server", "status": status}}
+    headers = {"Retry-After": "1"} if code == 429 else None
+    return JSONResponse(status_code=code, content=body, headers=headers)
+
+# ----------------------------- Server -----------------------------
+
+def create_app(config: FakeGeminiConfig) -> FastAPI:
+    app = FastAPI(title="Fake Gemini")
+    stats = {"requests": 0, "streams": 0, "errors": 0, "prompt_tokens": 0, "output_tokens": 0, "thinking_tokens": 0}
+    lock = threading.Lock()
+
+    def count(**deltas):
+        with lock:
+            for key, value in deltas.items():
+                stats[key] += value
+
+    @app.post("/{version}/models/{target}")
+    async def generate(version: str, target: str, request: Request):
+        model, _, method = target.partition(":")
+        body = await request.json()
+        count(requests=1, streams=int(method == "streamGenerateContent"))
+
+        thinking_tokens = config.thinking_for(body)
+        await asyncio.sleep(config.first_token_seconds(model, thinking_tokens))
+        code = config.injected_error()
+        if code is not None:
+            count(errors=1)
+            return _error(code)
+
+        prompt_tokens = count_tokens(_prompt_text(body))
+        text = response_text(body, config)
+        output_tokens = count_tokens(text)
+        count(prompt_tokens=prompt_tokens, output_tokens=output_tokens, thinking_tokens=thinking_tokens)
+        token_seconds = config.token_ms * config.speed(model) / 1000
+
+        if method != "streamGenerateContent":
+            await asyncio.sleep(output_tokens * token_seconds)
+            return _chunk(text, prompt_tokens, output_tokens, finished=True, thinking_tokens=thinking_tokens)
+
+        words = text.split(" ")
+        pieces: List[str] = [
+            " ".join(words[i:i + STREAM_CHUNK_WORDS]) + (" " if i + STREAM_CHUNK_WORDS < len(words) else "")
+            for i in range(0, len(words), STREAM_CHUNK_WORDS)
+        ]
+
+        async def events():
+            for i, piece in enumerate(pieces):
+                if i:
+                    await asyncio.sleep(count_tokens(piece) * token_seconds)
+                last = i == len(pieces) - 1
+                chunk = _chunk(piece, prompt_tokens, output_tokens if last else None, finished=last, thinking_tokens=thinking_tokens if last else 0)
+                yield f"data: {json.dumps(chunk)}\r\n\r\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    def get_stats():
+        with lock:
+            return dict(stats)
+
+    return app
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Fake Gemini API server for offline benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=400.0, help="median time to first token")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="lognormal spread of the first-token latency")
+    parser.add_argument("--token-ms", type=float, default=2.0, help="extra latency per output token")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with 503")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of calls answered with 429")
+    parser.add_argument("--text-words", type=int, default=TEXT_WORDS, help="length of free-text responses")
+    parser.add_argument("--thinking-tokens", type=int, default=THINKING_TOKENS, help="thinking tokens spent when the budget allows")
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    import uvicorn
+
+    args = parse_args()
+    config = FakeGeminiConfig(
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        token_ms=args.token_ms,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        text_words=args.text_words,
+        thinking_tokens=args.thinking_tokens,
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
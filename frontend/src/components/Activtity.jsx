@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import { FiArrowLeft } from 'react-icons/fi';
 import './css/Activity.css';
+import { storeSuggestions } from './suggestions';
 
 const activity_types = [
   { value: "lecture", label: 'Lecture' },
@@ -57,6 +58,8 @@ const ActivitiesPage = () => {
           method: "POST",
           headers: { "Content-Type": "application/json" },
           body: JSON.stringify({
+            course_id: parsed.outline?.course_id || null,
+            module_id: module.module_id || null,
             submodule_id: submodule_id,
             submodule_name: submodule_name,
             submodule_description: submoduleDescription,
@@ -78,10 +81,17 @@ const ActivitiesPage = () => {
           const submodules = parsed.modules[moduleId].submodules || [];
           submodules[submoduleId].activities = generatedActivities;
           submodules[submoduleId].suggestions_activities = data.suggestions;
+          submodules[submoduleId].suggestions_activities_id = data.suggestions_id;
           parsed.modules[moduleId].submodules = submodules;
           localStorage.setItem("generatedCourse", JSON.stringify(parsed));
         }
 
+        // Not awaited: the activities show now, and if the reload below cuts
+        // the poll short, SuggestionBox resumes it from the stored id.
+        storeSuggestions(data, (course, suggestions) => {
+          course.modules[moduleId].submodules[submoduleId].suggestions_activities = suggestions;
+        });
+
         setActivities(generatedActivities);
         setShowForm(false);
         window.location.reload();
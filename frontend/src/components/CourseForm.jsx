@@ -1,6 +1,7 @@
 import { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
 import './css/CourseForm.css';
+import { storeSuggestions } from './suggestions';
 
 
 const CourseForm = () => {
@@ -171,8 +172,9 @@ if (formData.audienceType === 'school' && !formData.grade) return setIsValid(fal
 
 
     // Store result (you can pick `data.result` or whole response)
-localStorage.setItem("generatedCourse", JSON.stringify({ outline: data.result , suggestions_outlines: data.suggestions}));
+localStorage.setItem("generatedCourse", JSON.stringify({ outline: data.result , suggestions_outlines: data.suggestions, suggestions_outlines_id: data.suggestions_id}));
 localStorage.setItem("course-init", JSON.stringify(payload));
+storeSuggestions(data, (course, suggestions) => { course.suggestions_outlines = suggestions; });
     navigate("/outline");
 
   } catch (error) {
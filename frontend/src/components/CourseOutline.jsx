@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
 import jsPDF from 'jspdf';
 import './css/CourseOutline.css';
+import { storeSuggestions } from './suggestions';
 
 const CourseOutline = () => {
   const navigate = useNavigate();
@@ -77,8 +78,10 @@ const CourseOutline = () => {
       updatedCourse = {
         ...courseData,
         modules: data.result.modules,
-        suggestions_modules: data.suggestions
+        suggestions_modules: data.suggestions,
+        suggestions_modules_id: data.suggestions_id
       };
+      storeSuggestions(data, (course, suggestions) => { course.suggestions_modules = suggestions; });
     }
 
     // ✅ Save updated course to localStorage
@@ -2,6 +2,7 @@ import React, { useEffect, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { FiArrowRight } from 'react-icons/fi';
 import './css/ModulesListPage.css';
+import { storeSuggestions } from './suggestions';
 
 const ModulesListPage = () => {
   const [modules, setModules] = useState([]);
@@ -34,7 +35,9 @@ const ModulesListPage = () => {
           module_description: ${typeof(module.module_description)},
           module_hours: ${typeof(module.module_hours)},
         }`)
-      const response = await fetch("http://localhost:8000/course/generate/submodules", {
+      // Scopes the stored submodules to this course (see /course/state/{course_id}).
+      const courseId = JSON.parse(localStorage.getItem("generatedCourse"))?.outline?.course_id || "";
+      const response = await fetch(`http://localhost:8000/course/generate/submodules?course_id=${encodeURIComponent(courseId)}`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({
@@ -56,7 +59,8 @@ const ModulesListPage = () => {
       updatedModules[index] = {
         ...updatedModules[index],
         submodules: generatedSubmodules,
-        suggestions_submodules: data.suggestions
+        suggestions_submodules: data.suggestions,
+        suggestions_submodules_id: data.suggestions_id
       };
 
       setModules(updatedModules);
@@ -64,6 +68,10 @@ const ModulesListPage = () => {
       const courseData = JSON.parse(localStorage.getItem("generatedCourse")) || {};
       courseData.modules = updatedModules;
       localStorage.setItem("generatedCourse", JSON.stringify(courseData));
+      storeSuggestions(data, (course, suggestions) => {
+        course.modules[index].suggestions_submodules = suggestions;
+        setModules(course.modules);
+      });
 
       navigate(`/submodules/${index}`);
     } catch (error) {
@@ -1,6 +1,7 @@
 import React, { useState, useRef, useEffect } from "react";
 import { useParams,useLocation } from "react-router-dom";
 import "./css/SuggestionBox.css";
+import { SUGGESTIONS_UPDATED, resumeSuggestions } from "./suggestions";
 
 const getStageFromPath = (path) => {
   if (path.includes("/outline")) return "outlines";
@@ -13,6 +14,7 @@ const getStageFromPath = (path) => {
 const SuggestionWidget = () => {
   const [isOpen, setIsOpen] = useState(false);
   const [suggestions, setSuggestions] = useState([]);
+  const [revision, setRevision] = useState(0);
   const panelRef = useRef(null);
   const location = useLocation();
   const stage = getStageFromPath(location.pathname);
@@ -28,6 +30,13 @@ const SuggestionWidget = () => {
     moduleId = parseInt(pathParts[2]);
     submoduleId = parseInt(pathParts[3]);
   }
+  // Suggestions arrive after the stage result; reload them when they land.
+  useEffect(() => {
+    const handleUpdate = () => setRevision((r) => r + 1);
+    window.addEventListener(SUGGESTIONS_UPDATED, handleUpdate);
+    return () => window.removeEventListener(SUGGESTIONS_UPDATED, handleUpdate);
+  }, []);
+
   // Load suggestions from localStorage when stage or pathname changes
  useEffect(() => {
     const raw = localStorage.getItem("generatedCourse");
@@ -35,21 +44,24 @@ const SuggestionWidget = () => {
 
     try {
       const parsed = JSON.parse(raw);
-      let suggestionsList = [];
-
-      if (stage === "outlines") {
-        suggestionsList = parsed.suggestions_outlines?.suggestions || [];
-
-      } else if (stage === "modules") {
-        suggestionsList = parsed.suggestions_modules?.suggestions || [];
 
-      } else if (stage === "submodules") {
-        const module = parsed.modules?.[parseInt(moduleId)];
-        suggestionsList = module?.suggestions_submodules?.suggestions || [];
-      } else if (stage === "activities") {
-        const module = parsed.modules?.[parseInt(moduleId)];
-        const submodule = module?.submodules?.[parseInt(submoduleId)];
-        suggestionsList = submodule?.suggestions_activities?.suggestions || [];
+      // Where this stage keeps its suggestions in the stored course.
+      const locate = (course) => {
+        if (stage === "outlines") return [course, "suggestions_outlines"];
+        if (stage === "modules") return [course, "suggestions_modules"];
+        const module = course.modules?.[parseInt(moduleId)];
+        if (stage === "submodules") return [module, "suggestions_submodules"];
+        return [module?.submodules?.[parseInt(submoduleId)], "suggestions_activities"];
+      };
+
+      const [holder, key] = locate(parsed);
+      const suggestionsList = holder?.[key]?.suggestions || [];
+      if (suggestionsList.length === 0 && holder?.[`${key}_id`]) {
+        // Still being generated when the page was left or reloaded; fetch them now.
+        resumeSuggestions(holder[`${key}_id`], (course, suggestions) => {
+          const [target, targetKey] = locate(course);
+          if (target) target[targetKey] = suggestions;
+        });
       }
 
       setSuggestions(suggestionsList);
@@ -57,7 +69,7 @@ const SuggestionWidget = () => {
       console.error("Failed to extract suggestions:", err);
       setSuggestions([]);
     }
-  }, [stage, location.pathname, moduleId, submoduleId]);
+  }, [stage, location.pathname, moduleId, submoduleId, revision]);
 
 
   // Handle outside click to close the panel
@@ -0,0 +1,52 @@
+// Stage endpoints return right away with a suggestions_id; the suggestions
+// themselves are computed in the background and fetched from
+// /course/suggestions/{id}. The long poll (?wait=) answers as soon as they are ready.
+const SUGGESTIONS_URL = "http://127.0.0.1:8000/course/suggestions";
+const POLL_WAIT_SECONDS = 20;
+const MAX_POLLS = 6;
+
+export const SUGGESTIONS_UPDATED = "suggestions-updated";
+
+const inFlight = new Set();
+
+export const fetchSuggestions = async (data) => {
+  if (data.suggestions) return data.suggestions;
+  if (!data.suggestions_id) return null;
+
+  for (let attempt = 0; attempt < MAX_POLLS; attempt++) {
+    const response = await fetch(`${SUGGESTIONS_URL}/${data.suggestions_id}?wait=${POLL_WAIT_SECONDS}`);
+    if (!response.ok) return null;
+    const body = await response.json();
+    if (body.status !== "pending") {
+      return body.status === "ready" ? body.suggestions : null;
+    }
+  }
+  return null;
+};
+
+// Fetches the suggestions for a stage response, writes them into the stored
+// course with `apply(course, suggestions)` and tells the SuggestionBox to reload.
+export const storeSuggestions = async (data, apply) => {
+  try {
+    const suggestions = await fetchSuggestions(data);
+    if (!suggestions) return;
+    const course = JSON.parse(localStorage.getItem("generatedCourse")) || {};
+    apply(course, suggestions);
+    localStorage.setItem("generatedCourse", JSON.stringify(course));
+    window.dispatchEvent(new Event(SUGGESTIONS_UPDATED));
+  } catch (err) {
+    console.error("Failed to load suggestions:", err);
+  }
+};
+
+// Picks up suggestions whose id was stored with the course but whose result
+// never arrived (e.g. the page reloaded mid-poll). One poll per id at a time.
+export const resumeSuggestions = async (suggestionsId, apply) => {
+  if (inFlight.has(suggestionsId)) return;
+  inFlight.add(suggestionsId);
+  try {
+    await storeSuggestions({ suggestions_id: suggestionsId }, apply);
+  } finally {
+    inFlight.delete(suggestionsId);
+  }
+};
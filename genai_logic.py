@@ -1,5 +1,5 @@
 import os
-from google import genai
+import logging
 from google.genai import types
 from google.genai.types import GenerateContentConfig, Content, Part
 from dotenv import load_dotenv
@@ -7,36 +7,47 @@ from pydantic import BaseModel
 from typing import List, Dict, Optional, Type
 import json
 from pydantic import BaseModel
-from course_content_generator import QuizOut, ReadingMaterialOut, LectureScriptOut
+from course_content_generator import QuizOut, ReadingMaterialOut, LectureScriptOut, _parse_json_response
+from llm_throttle import LLMRateLimitError
+from llm_gateway import generate_content, agenerate_content
+from registry import get_llm_client
+from tracing import span
 load_dotenv()
 
-llmclient = genai.Client(api_key=os.getenv("GEMINI_API_KEY")) 
+logger = logging.getLogger("genai_logic")
+
 
 ################## GENERIC LLM FUNCTIONS #######################################################
-def call_llm(prompt: Content, system_prompt: str, response_schema: Type[BaseModel], debug: bool = False) -> Optional[dict]:
-    try:
-        response = llmclient.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt,
-            config=GenerateContentConfig(
-                system_instruction=system_prompt,
-                response_mime_type="application/json",
-                response_schema=response_schema,
-                temperature=0.2
-            )
-        )
-        if debug or True:  # force debug always for now
-            print(f"\n=== LLM RAW RESPONSE ===\n{response.text}\n=== END ===\n")
+def _json_config(system_prompt: str, response_schema: Type[BaseModel]) -> GenerateContentConfig:
+    return GenerateContentConfig(
+        system_instruction=system_prompt,
+        response_mime_type="application/json",
+        response_schema=response_schema,
+        temperature=0.2
+    )
 
-        parsed_response = None
-        if response.text is not None:
-            parsed_response = json.loads(response.text)
-        return parsed_response
+def call_llm(prompt: Content, system_prompt: str, response_schema: Type[BaseModel], debug: bool = False, stage: Optional[str] = None) -> Optional[dict]:
+    try:
+        response = generate_content(get_llm_client(), contents=prompt, config=_json_config(system_prompt, response_schema), stage=stage)
+        return _parse_json_response(response)
 
+    except LLMRateLimitError:
+        raise
     except Exception as e:
-        print(f"LLM call failed: {e}")
+        logger.warning(f"LLM call failed: {e}")
         return None
 
+async def acall_llm(prompt: Content, system_prompt: str, response_schema: Type[BaseModel], debug: bool = False, stage: Optional[str] = None) -> Optional[dict]:
+    try:
+        response = await agenerate_content(get_llm_client(), contents=prompt, config=_json_config(system_prompt, response_schema), stage=stage)
+        with span("parse"):
+            return _parse_json_response(response)
+
+    except LLMRateLimitError:
+        raise
+    except Exception as e:
+        logger.warning(f"LLM call failed: {e}")
+        return None
     
 ################################# SCHEMAS DICT ######################################################
 SchemaDict = {}
@@ -74,7 +85,7 @@ class CourseOutline(BaseModel):
 
 SchemaDict["outline"]=CourseOutline
 
-def generate_course_outline(course: CourseInit) -> Optional[dict]:
+async def generate_course_outline(course: CourseInit) -> Optional[dict]:
     #- Learning Objectives: {', '.join(course.learning_objectives)} removed this for now 
     prompt = f"""
 You are a course design assistant helping Subject Matter Experts (SMEs) design high-quality academic courses. Based on the following inputs, generate a detailed course outline:
@@ -141,7 +152,7 @@ Only return the raw structured object.
             Part(text="Generate a course outline."),
         ]
     )
-    response = call_llm(prompt=user_content, system_prompt=prompt, response_schema=CourseOutline)
+    response = await acall_llm(prompt=user_content, system_prompt=prompt, response_schema=CourseOutline, stage="outline")
     return response if response is not None else {"error": "Nothing was generated. Please try again."}
 
 ############################### MODULE  GENERATION ######################################################
@@ -157,7 +168,7 @@ class ModuleSet(BaseModel):
 
 SchemaDict["module"] = ModuleSet
 
-def generate_modules(course_outline: CourseOutline) -> Optional[dict]:
+async def generate_modules(course_outline: CourseOutline) -> Optional[dict]:
     system_prompt = """
 You are a course design assistant helping Subject Matter Experts (SMEs) design high-quality academic courses.Based on the given course outline, generate a logical set of course modules that progressively build on each other.
 
@@ -194,7 +205,7 @@ Only return the raw structured object.
         ]
     )
 
-    response = call_llm(prompt=user_content, system_prompt=system_prompt, response_schema=ModuleSet)
+    response = await acall_llm(prompt=user_content, system_prompt=system_prompt, response_schema=ModuleSet, stage="module")
 
     return response if response is not None else {"error": "Nothing was generated. Please try again."}
 
@@ -210,7 +221,7 @@ class SubmoduleSet(BaseModel):
 
 SchemaDict["submodule"] = SubmoduleSet
 
-def generate_submodules(module: Module) -> Optional[dict]:
+async def generate_submodules(module: Module) -> Optional[dict]:
     system_prompt = """
     You are a course design assistant helping Subject Matter Experts (SMEs) design high-quality academic courses. Based on the provided module details, generate a set of submodules that break down the module into smaller, focused learning units.
     ### TASK:
@@ -246,10 +257,11 @@ Only return the raw structured object.
             ]
         )
     
-    response = call_llm(
+    response = await acall_llm(
         prompt=user_content,
         system_prompt=system_prompt,
-        response_schema=SubmoduleSet
+        response_schema=SubmoduleSet,
+        stage="submodule"
     )
 
     return response if response is not None else {"error": "Nothing was generated. Please try again."}
@@ -266,7 +278,7 @@ class ActivitySet(BaseModel):
 
 SchemaDict["activity"] = ActivitySet
 
-def generate_activities(submodule: Submodule, activity_types: str, user_instructions: Optional[str] = None) -> Optional[dict]:
+async def generate_activities(submodule: Submodule, activity_types: str, user_instructions: Optional[str] = None) -> Optional[dict]:
     system_prompt = f"""
 You are a course design assistant helping Subject Matter Experts (SMEs) design high-quality academic courses.
 
@@ -307,10 +319,11 @@ Only return the raw structured object.
         ]
     )
 
-    response = call_llm(
+    response = await acall_llm(
         prompt=user_content,
         system_prompt=system_prompt,
-        response_schema=ActivitySet
+        response_schema=ActivitySet,
+        stage="activity"
     )
 
     return response if response is not None else {"error": "Nothing was generated. Please try again."}
@@ -331,7 +344,7 @@ class Stage(str, Enum):
     quiz = "quiz"
 
 
-def get_stage_suggestions(stage: Stage, context: str, feedback_mode: str = "light") -> Optional[dict]:
+async def get_stage_suggestions(stage: Stage, context: str, feedback_mode: str = "light") -> Optional[dict]:
     prompt = f"""
 You are a course design assistant supporting Subject Matter Experts (SMEs) in developing high-quality academic courses.
 
@@ -361,14 +374,15 @@ Carefully follow the stage instructions and provide actionable, stage-appropriat
 """
 
     try:
-        response = llmclient.models.generate_content(
-            model="gemini-2.5-flash",
+        response = await agenerate_content(
+            get_llm_client(),
             contents=[Content(role="user", parts=[Part(text=context)])],
             config=GenerateContentConfig(
                 system_instruction=prompt,
                 response_mime_type='application/json',
                 response_schema=SuggestionOutput
-            )
+            ),
+            stage="suggest"
         )
         return json.loads(response.text) if response.text else {}
     except Exception as e:
@@ -377,7 +391,7 @@ Carefully follow the stage instructions and provide actionable, stage-appropriat
 
 ############################ REDO UNIFIED ########################################################
 
-def redo_stage(stage: Stage, prev_content: dict, user_message: str) -> Optional[dict]:
+async def redo_stage(stage: Stage, prev_content: dict, user_message: str) -> Optional[dict]:
 
     if stage not in SchemaDict:
         return {"error": f"No schema found for stage '{stage}'."}
@@ -420,10 +434,11 @@ Output Requirements:
         ]
     )
 
-    response = call_llm(
+    response = await acall_llm(
         prompt=user_content,
         system_prompt=prompt,
-        response_schema=SchemaDict[stage]
+        response_schema=SchemaDict[stage],
+        stage="redo"
     )
 
     return response if response is not None else {"error": "Nothing was generated. Please try again."}
\ No newline at end of file
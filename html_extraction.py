@@ -0,0 +1,235 @@
+# html_extraction.py
+
+import re
+from html import unescape
+from typing import List, Optional, Tuple
+
+# ----------------------------- Constants -----------------------------
+# Subtrees that never carry article text. <form> is not one of them: ASP.NET
+# pages wrap the whole body in one.
+SKIP_TAGS = {
+    "script", "style", "noscript", "template", "svg", "canvas", "iframe", "head",
+    "nav", "footer", "aside", "button", "select", "textarea",
+}
+# Page-level headers (logo, menu, search) are dropped. A <header> inside
+# <article>/<main> holds the title and byline and is kept; headers elsewhere
+# still go if their class/id/role looks like site chrome.
+SITE_LEVEL_TAGS = {"header"}
+# Elements whose content is raw text; the tokenizer jumps to their end tag.
+RAW_TEXT_TAGS = {"script", "style", "textarea", "title"}
+VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta",
+    "param", "source", "track", "wbr",
+}
+BLOCK_TAGS = {
+    "p", "div", "section", "article", "main", "li", "ul", "ol", "dl", "dt", "dd",
+    "h1", "h2", "h3", "h4", "h5", "h6", "pre", "blockquote", "table", "tr", "td",
+    "th", "figcaption", "br", "hr", "body",
+}
+HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+MAIN_TAGS = {"article", "main"}
+# The document wrappers are never boilerplate, whatever their classes say
+# (WordPress puts "has-sidebar" and friends on <body>).
+WRAPPER_TAGS = {"html", "body"}
+BOILERPLATE_ROLES = {"navigation", "banner", "contentinfo", "complementary"}
+
+# Whole class tokens (or a whole id) naming cookie banners, share bars,
+# menus and the like. "sidebar" and "site-footer" match; "has-sidebar" and
+# "share-this-article-text" don't.
+BOILERPLATE_TOKEN = re.compile(
+    r'(?:(?:site|page|main|global|primary|top|bottom)[-_])?'
+    r'(?:cookies?|cookie[-_]?(?:banner|consent|notice|bar)|consent|gdpr|banner|'
+    r'adverts?|advertisement|ads?|ad[-_]?(?:slot|unit|container)|promo|sponsored|'
+    r'newsletter|subscribe|share|share[-_]?(?:bar|buttons|links|tools)|'
+    r'social|social[-_]?(?:links|share|icons)|breadcrumbs?|sidebar|menu|navbar|nav|'
+    r'navigation|footer|header|masthead|popup|modal|comments?|related|'
+    r'related[-_]?(?:posts|articles|stories)|signup|login|skip[-_]?link)',
+    re.IGNORECASE,
+)
+
+MIN_BLOCK_CHARS = 40
+MAX_LINK_DENSITY = 0.35
+MIN_MAIN_CHARS = 200
+
+_WHITESPACE = re.compile(r'\s+')
+# Inline JS/CSS/SVG and page chrome are usually most of a modern page's bytes;
+# cutting them with one regex before tokenizing is far cheaper than walking
+# them tag by tag. Anything this misses (e.g. the same tag nested in itself)
+# is still dropped by the tokenizer's SKIP_TAGS handling.
+_CUT_BLOCKS = re.compile(
+    r'<!--.*?-->|<(script|style|noscript|svg|template|head|nav|aside|footer|iframe)(?=[\s>/]).*?</\1\s*>',
+    re.IGNORECASE | re.DOTALL,
+)
+# One match per tag or run of text; attributes are only parsed for the few
+# tags that carry class/id/role.
+_TOKEN = re.compile(
+    r'<(/?)([a-zA-Z][a-zA-Z0-9:-]*)((?:[^>"\']|"[^"]*"|\'[^\']*\')*)>|<![^>]*>|<\?[^>]*>|([^<]+|<)',
+    re.DOTALL,
+)
+_RAW_TEXT_END = {tag: re.compile(rf'</{tag}\s*>', re.IGNORECASE) for tag in RAW_TEXT_TAGS}
+_ATTR = re.compile(r'\b(class|id|role)\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))', re.IGNORECASE)
+
+def _is_boilerplate(attr_text: str) -> Tuple[bool, bool]:
+    # Returns (boilerplate, role=main).
+    boilerplate = main = False
+    for match in _ATTR.finditer(attr_text):
+        name = match.group(1).lower()
+        value = match.group(2) or match.group(3) or match.group(4) or ""
+        if name == "role":
+            role = value.strip().lower()
+            main = main or role == "main"
+            boilerplate = boilerplate or role in BOILERPLATE_ROLES
+        elif name == "class":
+            boilerplate = boilerplate or any(BOILERPLATE_TOKEN.fullmatch(token) for token in value.split())
+        elif value.strip():
+            boilerplate = boilerplate or BOILERPLATE_TOKEN.fullmatch(value.strip()) is not None
+    return boilerplate, main
+
+# ----------------------------- Tokenizer -----------------------------
+# A streaming tokenizer rather than a tree: text is grouped into blocks as the
+# tags go by, and each block remembers how much of it was link text and
+# whether it sat inside <article>/<main>. It's a single regex scan instead of
+# html.parser's per-tag Python callbacks, which is where most of the time went.
+
+class _Block:
+    __slots__ = ("parts", "link_chars", "in_main", "heading")
+
+    def __init__(self, in_main: bool, heading: bool):
+        self.parts: List[str] = []
+        self.link_chars = 0
+        self.in_main = in_main
+        self.heading = heading
+
+class _BlockParser:
+    def __init__(self, filter_boilerplate: bool = True):
+        self.filter_boilerplate = filter_boilerplate
+        self.blocks: List[Tuple[str, float, bool, bool]] = []
+        self._stack: List[Tuple[str, bool, bool, bool]] = []  # tag, skip, main, link
+        self._skip = 0
+        self._main = 0
+        self._link = 0
+        self._heading = 0
+        self._block: Optional[_Block] = None
+
+    def feed(self, html: str):
+        pos = 0
+        end = len(html)
+        match_token = _TOKEN.match
+        while pos < end:
+            match = match_token(html, pos)
+            pos = match.end()
+            text = match.group(4)
+            if text is not None:
+                self.handle_data(text)
+                continue
+            tag = match.group(2)
+            if tag is None:
+                continue  # comment, doctype or processing instruction
+            tag = tag.lower()
+            if match.group(1):
+                self.handle_endtag(tag)
+                continue
+            attr_text = match.group(3)
+            if attr_text.endswith("/"):
+                if tag in BLOCK_TAGS:
+                    self._flush()
+                continue
+            self.handle_starttag(tag, attr_text)
+            if tag in RAW_TEXT_TAGS:
+                # Their content is never article text; skip it unread.
+                close = _RAW_TEXT_END[tag].search(html, pos)
+                pos = close.start() if close else end
+
+    def _flush(self):
+        block = self._block
+        self._block = None
+        if block is None:
+            return
+        text = _WHITESPACE.sub(" ", "".join(block.parts)).strip()
+        if text:
+            self.blocks.append((text, block.link_chars / len(text), block.in_main, block.heading))
+
+    def handle_starttag(self, tag: str, attr_text: str):
+        if tag in BLOCK_TAGS:
+            self._flush()
+        if tag in VOID_TAGS:
+            return
+        skip = tag in SKIP_TAGS or (tag in SITE_LEVEL_TAGS and not self._main)
+        main = tag in MAIN_TAGS
+        if attr_text and tag not in WRAPPER_TAGS:
+            boilerplate, role_main = _is_boilerplate(attr_text)
+            skip = skip or (boilerplate and self.filter_boilerplate)
+            main = main or role_main
+        link = tag == "a"
+        self._stack.append((tag, skip, main, link))
+        self._skip += skip
+        self._main += main
+        self._link += link
+        self._heading += tag in HEADING_TAGS
+
+    def handle_endtag(self, tag: str):
+        if tag in BLOCK_TAGS:
+            self._flush()
+        if not any(entry[0] == tag for entry in self._stack):
+            return  # stray end tag
+        # Pop implicitly closed elements (e.g. unclosed <li>) along the way.
+        while self._stack:
+            name, skip, main, link = self._stack.pop()
+            self._skip -= skip
+            self._main -= main
+            self._link -= link
+            self._heading -= name in HEADING_TAGS
+            if name == tag:
+                break
+
+    def handle_data(self, data: str):
+        if self._skip:
+            return
+        if "&" in data:
+            data = unescape(data)
+        if self._block is None:
+            self._block = _Block(self._main > 0, self._heading > 0)
+        self._block.parts.append(data)
+        if self._link:
+            self._block.link_chars += len(data.strip())
+
+    def close(self):
+        self._flush()
+
+# ----------------------------- Extraction -----------------------------
+
+def _is_content(text: str, link_density: float, heading: bool) -> bool:
+    if link_density > MAX_LINK_DENSITY:
+        return False
+    return heading or len(text) >= MIN_BLOCK_CHARS
+
+def _extract(html: str, filter_boilerplate: bool) -> str:
+    parser = _BlockParser(filter_boilerplate)
+    parser.feed(html)
+    parser.close()
+    blocks = parser.blocks
+
+    # Prefer <article>/<main> when the page marks one up with real text in it.
+    main_blocks = [b for b in blocks if b[2]]
+    if sum(len(b[0]) for b in main_blocks) >= MIN_MAIN_CHARS:
+        blocks = main_blocks
+
+    kept = [text for text, density, _, heading in blocks if _is_content(text, density, heading)]
+    if not kept:
+        # Very short pages: better some text than none.
+        kept = [text for text, density, _, _ in blocks if density <= MAX_LINK_DENSITY]
+    return "\n".join(kept)
+
+def html_to_text(html: str) -> str:
+    html = _CUT_BLOCKS.sub(" ", html)
+    text = _extract(html, filter_boilerplate=True)
+    if not text:
+        # The class/id/role heuristics took everything (e.g. the content sits
+        # in a wrapper whose class looks like chrome); keep the page instead.
+        text = _extract(html, filter_boilerplate=False)
+    return text
+
+def page_to_text(text: str, content_type: str = "") -> str:
+    if content_type and "html" not in content_type and "xml" not in content_type:
+        return text
+    return html_to_text(text)
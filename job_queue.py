@@ -0,0 +1,282 @@
+# job_queue.py
+
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import asyncio
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Type
+from pydantic import BaseModel
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger("job_queue")
+
+# ----------------------------- Constants -----------------------------
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", ".cache/jobs.sqlite3")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1.0"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+TERMINAL_STATUSES = ("succeeded", "failed")
+
+# ----------------------------- Pydantic Models -----------------------------
+
+class JobStatus(BaseModel):
+    job_id: str
+    kind: str
+    status: str  # queued | running | succeeded | failed
+    progress: float = 0.0
+    progress_message: Optional[str] = None
+    attempts: int = 0
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+# A handler receives the validated payload and a progress(fraction, message)
+# callback, and returns something JSON-serialisable.
+ProgressFn = Callable[[float, Optional[str]], None]
+JobHandler = Callable[[BaseModel, ProgressFn], Awaitable[Any]]
+
+# ----------------------------- Queue -----------------------------
+# Jobs live in SQLite so they survive restarts and can be drained by workers
+# in another process. A running job holds a lease that its worker renews;
+# if the worker dies the lease runs out and the job is picked up again.
+
+class JobQueue:
+    def __init__(self, db_path: str = JOB_DB_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    progress REAL NOT NULL DEFAULT 0,
+                    progress_message TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    worker TEXT,
+                    lease_expires_at REAL,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, created_at)")
+            self._conn = conn
+        return self._conn
+
+    def submit(self, kind: str, payload: dict) -> str:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._db().execute(
+                "INSERT INTO jobs (id, kind, payload, status, created_at) VALUES (?, ?, ?, 'queued', ?)",
+                (job_id, kind, json.dumps(payload), time.time())
+            )
+        return job_id
+
+    def claim(self, worker: str) -> Optional[Tuple[str, str, dict]]:
+        now = time.time()
+        with self._lock:
+            conn = self._db()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT id, kind, payload, attempts FROM jobs "
+                    "WHERE status = 'queued' OR (status = 'running' AND lease_expires_at < ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (now,)
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                if row["attempts"] >= JOB_MAX_ATTEMPTS:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                        ("Job abandoned after too many attempts", now, row["id"])
+                    )
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, "
+                    "lease_expires_at = ?, started_at = ? WHERE id = ?",
+                    (worker, now + JOB_LEASE_SECONDS, now, row["id"])
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return row["id"], row["kind"], json.loads(row["payload"])
+
+    # heartbeat/complete/fail only touch a job the given worker still holds:
+    # once its lease ran out and another worker reclaimed the job, they
+    # return False instead of overwriting the new owner's state.
+
+    def heartbeat(self, job_id: str, worker: str, progress: Optional[float] = None, message: Optional[str] = None) -> bool:
+        with self._lock:
+            cursor = self._db().execute(
+                "UPDATE jobs SET lease_expires_at = ?, progress = COALESCE(?, progress), "
+                "progress_message = COALESCE(?, progress_message) "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time() + JOB_LEASE_SECONDS, progress, message, job_id, worker)
+            )
+        return cursor.rowcount > 0
+
+    def complete(self, job_id: str, worker: str, result: Any) -> bool:
+        with self._lock:
+            cursor = self._db().execute(
+                "UPDATE jobs SET status = 'succeeded', progress = 1, result = ?, finished_at = ? "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (json.dumps(result), time.time(), job_id, worker)
+            )
+        return cursor.rowcount > 0
+
+    def fail(self, job_id: str, worker: str, error: str) -> bool:
+        with self._lock:
+            cursor = self._db().execute(
+                "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (error, time.time(), job_id, worker)
+            )
+        return cursor.rowcount > 0
+
+    def get(self, job_id: str) -> Optional[JobStatus]:
+        with self._lock:
+            row = self._db().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return JobStatus(
+            job_id=row["id"],
+            kind=row["kind"],
+            status=row["status"],
+            progress=row["progress"],
+            progress_message=row["progress_message"],
+            attempts=row["attempts"],
+            result=json.loads(row["result"]) if row["result"] is not None else None,
+            error=row["error"],
+            created_at=row["created_at"],
+            started_at=row["started_at"],
+            finished_at=row["finished_at"]
+        )
+
+    # Async callers use these: a locked database can keep a call waiting for
+    # up to the 30 s busy timeout, which must not happen on the event loop.
+
+    async def asubmit(self, kind: str, payload: dict) -> str:
+        return await asyncio.to_thread(self.submit, kind, payload)
+
+    async def aget(self, job_id: str) -> Optional[JobStatus]:
+        return await asyncio.to_thread(self.get, job_id)
+
+    async def aheartbeat(self, job_id: str, worker: str, progress: Optional[float] = None, message: Optional[str] = None) -> bool:
+        return await asyncio.to_thread(self.heartbeat, job_id, worker, progress, message)
+
+    async def acomplete(self, job_id: str, worker: str, result: Any) -> bool:
+        return await asyncio.to_thread(self.complete, job_id, worker, result)
+
+    async def afail(self, job_id: str, worker: str, error: str) -> bool:
+        return await asyncio.to_thread(self.fail, job_id, worker, error)
+
+# ----------------------------- Workers -----------------------------
+
+class JobWorkerPool:
+    def __init__(self, queue: JobQueue, handlers: Dict[str, Tuple[Type[BaseModel], JobHandler]], concurrency: int = JOB_WORKERS):
+        self.queue = queue
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks = []
+        self._wakeup = asyncio.Event()
+
+    def notify(self):
+        # Called after a local submit so an idle worker doesn't wait out the poll interval.
+        self._wakeup.set()
+
+    def start(self):
+        for i in range(self.concurrency):
+            self._tasks.append(asyncio.create_task(self._worker(f"{self.name}:{i}")))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self, worker: str):
+        while True:
+            claimed = await asyncio.to_thread(self.queue.claim, worker)
+            if claimed is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(worker, *claimed)
+
+    async def _run(self, worker: str, job_id: str, kind: str, payload: dict):
+        if kind not in self.handlers:
+            await self.queue.afail(job_id, worker, f"Unknown job kind '{kind}'")
+            return
+        model, handler = self.handlers[kind]
+
+        # Handlers report progress synchronously; the heartbeat is written in
+        # the background, and only the latest update is kept while one is in flight.
+        latest: Dict[str, Any] = {}
+        writer: Optional[asyncio.Task] = None
+
+        async def write_progress():
+            while latest:
+                update = dict(latest)
+                latest.clear()
+                await self.queue.aheartbeat(job_id, worker, **update)
+
+        def progress(fraction: float, message: Optional[str] = None):
+            nonlocal writer
+            latest.update(progress=fraction, message=message)
+            if writer is None or writer.done():
+                writer = asyncio.create_task(write_progress())
+
+        async def keep_lease():
+            while True:
+                await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+                if not await self.queue.aheartbeat(job_id, worker):
+                    logger.warning(f"Job {job_id} ({kind}): lease lost to another worker.")
+                    return
+
+        lease = asyncio.create_task(keep_lease())
+        try:
+            result = await handler(model.model_validate(payload), progress)
+            if writer is not None:
+                await writer
+            if not await self.queue.acomplete(job_id, worker, result):
+                logger.warning(f"Job {job_id} ({kind}) finished after losing its lease; result discarded.")
+        except Exception as e:
+            logger.exception(f"Job {job_id} ({kind}) failed.")
+            detail = getattr(e, "detail", None) or str(e)
+            await self.queue.afail(job_id, worker, str(detail))
+        finally:
+            lease.cancel()
+
+job_queue = JobQueue()
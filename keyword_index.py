@@ -0,0 +1,96 @@
+# keyword_index.py
+
+import re
+from collections import deque
+from typing import Dict, List
+from pydantic import BaseModel
+from search_backend import normalize_query
+
+_NON_WORD = re.compile(r'[^\w\s-]')
+_WHITESPACE = re.compile(r'\s+')
+
+class KeywordHit(BaseModel):
+    keyword: str  # original spelling
+    normalized: str
+    count: int
+    first_position: int
+
+def normalize_text(text: str) -> str:
+    # Same folding as normalize_query, minus determiner stripping, so keyword
+    # and text line up character for character.
+    return _WHITESPACE.sub(" ", _NON_WORD.sub(" ", text.casefold())).strip()
+
+# ----------------------------- Aho-Corasick -----------------------------
+# Built once over the keyword set; each text is then scanned in one pass no
+# matter how many keywords there are. Hits only count on word boundaries.
+
+class KeywordIndex:
+    def __init__(self, keywords: List[str]):
+        self.patterns: List[str] = []
+        self.originals: List[str] = []
+        seen: Dict[str, int] = {}
+        for keyword in keywords:
+            normalized = normalize_query(keyword)
+            if normalized and normalized not in seen:
+                seen[normalized] = len(self.patterns)
+                self.patterns.append(normalized)
+                self.originals.append(keyword.strip())
+
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        for pattern_id, pattern in enumerate(self.patterns):
+            state = 0
+            for char in pattern:
+                nxt = self._goto[state].get(char)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][char] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = nxt
+            self._out[state].append(pattern_id)
+        self._build_failure_links()
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(char, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find(self, text: str) -> List[KeywordHit]:
+        text = normalize_text(text)
+        counts: Dict[int, int] = {}
+        first: Dict[int, int] = {}
+        state = 0
+        for end, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for pattern_id in self._out[state]:
+                start = end - len(self.patterns[pattern_id]) + 1
+                if start > 0 and text[start - 1] != " ":
+                    continue
+                if end + 1 < len(text) and text[end + 1] != " ":
+                    continue
+                counts[pattern_id] = counts.get(pattern_id, 0) + 1
+                first.setdefault(pattern_id, start)
+
+        hits = [
+            KeywordHit(keyword=self.originals[i], normalized=self.patterns[i], count=counts[i], first_position=first[i])
+            for i in counts
+        ]
+        # Longest (most specific) first, then most frequent, then earliest.
+        hits.sort(key=lambda h: (-len(h.normalized), -h.count, h.first_position, h.normalized))
+        return hits
+
+    def rank(self, text: str, limit: int = 0) -> List[str]:
+        keywords = [hit.keyword for hit in self.find(text)]
+        return keywords[:limit] if limit else keywords
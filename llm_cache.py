@@ -0,0 +1,290 @@
+# llm_cache.py
+
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from pydantic import BaseModel
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ----------------------------- Constants -----------------------------
+CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") not in ("0", "false", "False")
+CACHE_PATH = os.getenv("LLM_CACHE_PATH", ".cache/llm_cache.sqlite3")
+CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+# Per namespace and process; a value larger than this skips the memory tier.
+CACHE_MEMORY_MAX_BYTES = int(os.getenv("LLM_CACHE_MEMORY_MAX_BYTES", str(64 * 1024 * 1024)))
+# How often expired rows are purged and the on-disk size recounted.
+CACHE_SWEEP_SECONDS = float(os.getenv("LLM_CACHE_SWEEP_SECONDS", "300"))
+
+# Stages whose LLM calls may be served from cache. Content stages (reading,
+# lecture, quiz) are left out by default so "regenerate" still gives a fresh take.
+DEFAULT_CACHED_STAGES = "outline,module,submodule,activity,redo,suggest,summarize"
+CACHED_STAGES = {
+    s.strip() for s in os.getenv("LLM_CACHE_STAGES", DEFAULT_CACHED_STAGES).split(",") if s.strip()
+}
+
+# ----------------------------- Tiered Cache -----------------------------
+
+# Bounded in-memory LRU in front of a SQLite table; both tiers honour the TTL.
+# The memory tier is capped by entries and bytes (source texts can be whole
+# PDFs); the disk tier is trimmed least-recently-used first once over
+# max_bytes. Async callers use aget/aset, which only leave the event loop
+# for the disk tier: SQLite may sit on a busy lock for up to 30 s.
+class TieredCache:
+    def __init__(
+        self,
+        namespace: str,
+        db_path: Optional[str] = CACHE_PATH,
+        max_entries: int = CACHE_MAX_ENTRIES,
+        max_bytes: int = CACHE_MAX_BYTES,
+        ttl_seconds: float = CACHE_TTL_SECONDS,
+        max_memory_bytes: int = CACHE_MEMORY_MAX_BYTES,
+    ):
+        self.namespace = namespace
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_bytes = max_memory_bytes
+        self._memory: "OrderedDict[str, Tuple[float, str, int]]" = OrderedDict()
+        self._memory_bytes = 0
+        # Separate locks so a memory hit never waits behind a slow disk write.
+        self._memory_lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        # Running size of this namespace on disk, resynced from SQLite on
+        # every sweep since other processes write to the same file.
+        self._disk_bytes = 0
+        self._swept_at = 0.0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _db(self) -> Optional[sqlite3.Connection]:
+        if not self.db_path:
+            return None
+        if self._conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_lru ON cache (namespace, accessed_at)")
+            conn.commit()
+            self._sweep(conn, time.time())
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    # ----------------------------- Memory Tier -----------------------------
+
+    def _remember(self, key: str, expires_at: float, value: str, size: int):
+        with self._memory_lock:
+            self._forget(key)
+            if size > self.max_memory_bytes:
+                return
+            self._memory[key] = (expires_at, value, size)
+            self._memory_bytes += size
+            while self._memory and (len(self._memory) > self.max_entries or self._memory_bytes > self.max_memory_bytes):
+                _, (_, _, evicted) = self._memory.popitem(last=False)
+                self._memory_bytes -= evicted
+
+    def _forget(self, key: str):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= entry[2]
+
+    def _memory_get(self, key: str, now: float) -> Optional[str]:
+        with self._memory_lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                self._forget(key)
+                return None
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    # ----------------------------- Disk Tier -----------------------------
+
+    def _disk_get(self, key: str, now: float) -> Optional[str]:
+        with self._db_lock:
+            conn = self._db()
+            if conn is None:
+                return None
+            row = conn.execute(
+                "SELECT value, expires_at, size FROM cache WHERE namespace = ? AND key = ?",
+                (self.namespace, key)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+                conn.commit()
+                self._disk_bytes -= row[2]
+                return None
+            conn.execute(
+                "UPDATE cache SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                (now, self.namespace, key)
+            )
+            conn.commit()
+        self._remember(key, row[1], row[0], row[2])
+        self.hits += 1
+        self.disk_hits += 1
+        return row[0]
+
+    def _disk_set(self, key: str, value: str, size: int, expires_at: float, now: float):
+        with self._db_lock:
+            conn = self._db()
+            if conn is None:
+                return
+            previous = conn.execute(
+                "SELECT size FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key)
+            ).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, size, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (self.namespace, key, value, size, expires_at, now)
+            )
+            self._disk_bytes += size - (previous[0] if previous else 0)
+            if now - self._swept_at > CACHE_SWEEP_SECONDS:
+                self._sweep(conn, now)
+            self._evict(conn)
+            conn.commit()
+
+    def _sweep(self, conn: sqlite3.Connection, now: float):
+        # Drops expired rows and recounts the namespace; the only full scans,
+        # run at most every CACHE_SWEEP_SECONDS.
+        conn.execute("DELETE FROM cache WHERE namespace = ? AND expires_at <= ?", (self.namespace, now))
+        self._disk_bytes = conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM cache WHERE namespace = ?", (self.namespace,)
+        ).fetchone()[0]
+        self._swept_at = now
+
+    def _evict(self, conn: sqlite3.Connection):
+        if self._disk_bytes <= self.max_bytes:
+            return
+        overflow = self._disk_bytes - self.max_bytes
+        freed = 0
+        stale = []
+        for key, size in conn.execute(
+            "SELECT key, size FROM cache WHERE namespace = ? ORDER BY accessed_at", (self.namespace,)
+        ):
+            stale.append((self.namespace, key))
+            freed += size
+            if freed >= overflow:
+                break
+        conn.executemany("DELETE FROM cache WHERE namespace = ? AND key = ?", stale)
+        self._disk_bytes -= freed
+
+    # ----------------------------- Public API -----------------------------
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        value = self._memory_get(key, now)
+        if value is None:
+            value = self._disk_get(key, now)
+            if value is None:
+                self.misses += 1
+        return value
+
+    def set(self, key: str, value: str, ttl_seconds: Optional[float] = None):
+        now = time.time()
+        expires_at = now + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        size = len(value.encode("utf-8"))
+        self._remember(key, expires_at, value, size)
+        self._disk_set(key, value, size, expires_at, now)
+
+    async def aget(self, key: str) -> Optional[str]:
+        now = time.time()
+        value = self._memory_get(key, now)
+        if value is None and self.db_path:
+            value = await asyncio.to_thread(self._disk_get, key, now)
+        if value is None:
+            self.misses += 1
+        return value
+
+    async def aset(self, key: str, value: str, ttl_seconds: Optional[float] = None):
+        now = time.time()
+        expires_at = now + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        size = len(value.encode("utf-8"))
+        self._remember(key, expires_at, value, size)
+        if self.db_path:
+            await asyncio.to_thread(self._disk_set, key, value, size, expires_at, now)
+
+    def clear(self):
+        with self._memory_lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+        with self._db_lock:
+            conn = self._db()
+            if conn is not None:
+                conn.execute("DELETE FROM cache WHERE namespace = ?", (self.namespace,))
+                conn.commit()
+                self._disk_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "namespace": self.namespace,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+        }
+
+# ----------------------------- LLM Response Cache -----------------------------
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, type) and issubclass(value, BaseModel):
+        return value.model_json_schema()
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json", exclude_none=True)
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    return value
+
+def llm_cache_key(model: str, system_prompt: Any, contents: Any, response_schema: Any, temperature: Any, options: Any = None) -> str:
+    # `options` holds any other generation settings that change the answer
+    # (thinking budget, output cap); left out of the payload when unset.
+    fields = {
+        "model": model,
+        "system_prompt": _jsonable(system_prompt),
+        "contents": _jsonable(contents),
+        "response_schema": _jsonable(response_schema),
+        "temperature": temperature,
+    }
+    if options:
+        fields["options"] = _jsonable(options)
+    payload = json.dumps(fields, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def is_cacheable(stage: Optional[str]) -> bool:
+    return CACHE_ENABLED and stage is not None and stage in CACHED_STAGES
+
+llm_response_cache = TieredCache("llm")
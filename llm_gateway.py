@@ -0,0 +1,248 @@
+# llm_gateway.py
+
+import time
+import asyncio
+from contextlib import contextmanager
+from typing import Optional
+from google import genai
+from google.genai.types import GenerateContentConfig, GenerateContentResponse, GenerateContentResponseUsageMetadata, Candidate, Content, Part
+from llm_cache import llm_response_cache, llm_cache_key, is_cacheable
+from llm_throttle import llm_throttle, estimate_tokens
+from metrics import llm_call_seconds, llm_calls, llm_in_flight, llm_errors, record_llm_usage
+from tracing import span
+from cassette import cassette
+from stage_profiles import apply_profile
+
+# ----------------------------- Cache Helpers -----------------------------
+
+def _cache_key(model: str, contents, config: Optional[GenerateContentConfig]) -> str:
+    return llm_cache_key(
+        model=model,
+        system_prompt=config.system_instruction if config else None,
+        contents=contents,
+        response_schema=config.response_schema if config else None,
+        temperature=config.temperature if config else None,
+        options=_generation_options(config),
+    )
+
+def _generation_options(config: Optional[GenerateContentConfig]) -> dict:
+    if config is None:
+        return {}
+    options = {}
+    if config.thinking_config is not None and config.thinking_config.thinking_budget is not None:
+        options["thinking_budget"] = config.thinking_config.thinking_budget
+    if config.max_output_tokens is not None:
+        options["max_output_tokens"] = config.max_output_tokens
+    return options
+
+def _cached_response(text: str) -> GenerateContentResponse:
+    return GenerateContentResponse(
+        candidates=[Candidate(content=Content(role="model", parts=[Part(text=text)]))]
+    )
+
+def _estimate(contents, config: Optional[GenerateContentConfig]) -> int:
+    return estimate_tokens(contents, config.system_instruction if config else None)
+
+def _store(key: Optional[str], response: GenerateContentResponse):
+    if key is not None and response.text:
+        llm_response_cache.set(key, response.text)
+
+async def _astore(key: Optional[str], response: GenerateContentResponse):
+    if key is not None and response.text:
+        await llm_response_cache.aset(key, response.text)
+
+# ----------------------------- Metrics -----------------------------
+
+@contextmanager
+def _instrumented(stage: Optional[str], model: str):
+    # Latency covers throttling and retries: it's what the caller waits for.
+    label = stage or "other"
+    llm_in_flight.inc(stage=label)
+    started = time.perf_counter()
+    try:
+        with span(f"llm.{label}"):
+            yield label
+    except Exception as e:
+        llm_errors.inc(stage=label, error=type(e).__name__)
+        llm_calls.inc(stage=label, model=model, outcome="error")
+        raise
+    else:
+        llm_calls.inc(stage=label, model=model, outcome="ok")
+    finally:
+        llm_in_flight.dec(stage=label)
+        llm_call_seconds.observe(time.perf_counter() - started, stage=label, model=model)
+
+def _cache_hit(stage: Optional[str], model: str):
+    llm_calls.inc(stage=stage or "other", model=model, outcome="cached")
+
+# ----------------------------- Cassette -----------------------------
+# Record/replay sits at the provider boundary, under the cache and the
+# throttle, so a replay still exercises caching, throttling and metrics.
+# The fingerprint is the cache key; only successful attempts are recorded.
+
+def _usage(response: Optional[GenerateContentResponse]) -> Optional[dict]:
+    usage = getattr(response, "usage_metadata", None)
+    return usage.model_dump(mode="json", exclude_none=True) if usage is not None else None
+
+def _replayed_response(text: str, usage: Optional[dict]) -> GenerateContentResponse:
+    return GenerateContentResponse(
+        candidates=[Candidate(content=Content(role="model", parts=[Part(text=text)]))],
+        usage_metadata=GenerateContentResponseUsageMetadata.model_validate(usage) if usage else None
+    )
+
+def _provider_call(client: genai.Client, model: str, contents, config: Optional[GenerateContentConfig], stage: Optional[str]):
+    key = _cache_key(model, contents, config) if cassette.mode != "off" else ""
+    if cassette.replaying:
+        entry = cassette.lookup("llm", key)
+        if entry is not None:
+            cassette.wait(entry)
+            return _replayed_response(entry["text"], entry.get("usage"))
+    started = time.perf_counter()
+    response = client.models.generate_content(model=model, contents=contents, config=config)
+    if cassette.recording:
+        cassette.record("llm", key, time.perf_counter() - started, stage=stage, model=model, text=response.text, usage=_usage(response))
+    return response
+
+async def _aprovider_call(client: genai.Client, model: str, contents, config: Optional[GenerateContentConfig], stage: Optional[str]):
+    key = _cache_key(model, contents, config) if cassette.mode != "off" else ""
+    if cassette.replaying:
+        entry = cassette.lookup("llm", key)
+        if entry is not None:
+            await cassette.await_entry(entry)
+            return _replayed_response(entry["text"], entry.get("usage"))
+    started = time.perf_counter()
+    response = await client.aio.models.generate_content(model=model, contents=contents, config=config)
+    if cassette.recording:
+        cassette.record("llm", key, time.perf_counter() - started, stage=stage, model=model, text=response.text, usage=_usage(response))
+    return response
+
+async def _replayed_stream(entry: dict):
+    # Chunk offsets are relative to the stream being opened, as recorded.
+    started = time.perf_counter()
+    chunks = entry["chunks"]
+    for i, (offset_ms, text) in enumerate(chunks):
+        remaining = cassette.delay(offset_ms) - (time.perf_counter() - started)
+        if remaining > 0:
+            await asyncio.sleep(remaining)
+        yield _replayed_response(text, entry.get("usage") if i == len(chunks) - 1 else None)
+
+async def _recorded_stream(stream, key: str, started: float, model: str, stage: Optional[str]):
+    chunks = []
+    last = None
+    async for response in stream:
+        last = response
+        chunks.append([round((time.perf_counter() - started) * 1000, 1), response.text or ""])
+        yield response
+    cassette.record("stream", key, time.perf_counter() - started, stage=stage, model=model, chunks=chunks, usage=_usage(last))
+
+async def _aprovider_stream(client: genai.Client, model: str, contents, config: Optional[GenerateContentConfig], stage: Optional[str]):
+    key = _cache_key(model, contents, config) if cassette.mode != "off" else ""
+    if cassette.replaying:
+        entry = cassette.lookup("stream", key)
+        if entry is not None:
+            return _replayed_stream(entry)
+    started = time.perf_counter()
+    stream = await client.aio.models.generate_content_stream(model=model, contents=contents, config=config)
+    if cassette.recording:
+        return _recorded_stream(stream, key, started, model, stage)
+    return stream
+
+# ----------------------------- Stage Profiles -----------------------------
+
+def _profiled(stage: Optional[str], model: Optional[str], config: Optional[GenerateContentConfig]):
+    # The stage's profile (stage_profiles.py) picks the model and fills in
+    # thinking budget, output cap and temperature; an explicit model wins.
+    profile_model, config = apply_profile(stage, config)
+    return model or profile_model, config
+
+# ----------------------------- Gateway -----------------------------
+# Every generate_content call in the app goes through these two functions so
+# the sync and async paths stay interchangeable. `stage` labels the call
+# ("outline", "summarize", "suggest", ...) for per-stage cache opt-in. Cache
+# misses go through the shared throttle (rate buckets, AIMD concurrency and
+# retries with backoff) before they reach the provider.
+
+def generate_content(
+    client: genai.Client,
+    contents,
+    config: Optional[GenerateContentConfig] = None,
+    model: Optional[str] = None,
+    stage: Optional[str] = None,
+) -> GenerateContentResponse:
+    model, config = _profiled(stage, model, config)
+    key = _cache_key(model, contents, config) if is_cacheable(stage) else None
+    if key is not None:
+        cached = llm_response_cache.get(key)
+        if cached is not None:
+            _cache_hit(stage, model)
+            return _cached_response(cached)
+
+    with _instrumented(stage, model) as label:
+        response = llm_throttle.run(
+            lambda: _provider_call(client, model, contents, config, stage),
+            _estimate(contents, config)
+        )
+    record_llm_usage(label, model, response)
+    _store(key, response)
+    return response
+
+async def agenerate_content(
+    client: genai.Client,
+    contents,
+    config: Optional[GenerateContentConfig] = None,
+    model: Optional[str] = None,
+    stage: Optional[str] = None,
+) -> GenerateContentResponse:
+    model, config = _profiled(stage, model, config)
+    key = _cache_key(model, contents, config) if is_cacheable(stage) else None
+    if key is not None:
+        cached = await llm_response_cache.aget(key)
+        if cached is not None:
+            _cache_hit(stage, model)
+            return _cached_response(cached)
+
+    with _instrumented(stage, model) as label:
+        response = await llm_throttle.arun(
+            lambda: _aprovider_call(client, model, contents, config, stage),
+            _estimate(contents, config)
+        )
+    record_llm_usage(label, model, response)
+    await _astore(key, response)
+    return response
+
+async def astream_content(
+    client: genai.Client,
+    contents,
+    config: Optional[GenerateContentConfig] = None,
+    model: Optional[str] = None,
+    stage: Optional[str] = None,
+):
+    # Yields text chunks as they arrive. A cache hit is replayed as one chunk.
+    model, config = _profiled(stage, model, config)
+    key = _cache_key(model, contents, config) if is_cacheable(stage) else None
+    if key is not None:
+        cached = await llm_response_cache.aget(key)
+        if cached is not None:
+            _cache_hit(stage, model)
+            yield cached
+            return
+
+    chunks = []
+    last = None
+    with _instrumented(stage, model) as label:
+        # Only opening the stream is throttled and retried; once tokens flow a
+        # failure surfaces to the caller rather than replaying half an answer.
+        stream = await llm_throttle.arun(
+            lambda: _aprovider_stream(client, model, contents, config, stage),
+            _estimate(contents, config)
+        )
+        async for response in stream:
+            last = response
+            if response.text:
+                chunks.append(response.text)
+                yield response.text
+    if last is not None:
+        # Usage totals arrive on the final chunk.
+        record_llm_usage(label, model, last)
+    if key is not None and chunks:
+        await llm_response_cache.aset(key, "".join(chunks))
@@ -0,0 +1,215 @@
+# llm_throttle.py
+
+import os
+import re
+import time
+import random
+import asyncio
+import logging
+import threading
+from typing import Any, Optional
+import httpx
+from google.genai import errors as genai_errors
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger("llm_throttle")
+
+# ----------------------------- Constants -----------------------------
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "1000"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "1000000"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "64"))
+LLM_MIN_CONCURRENCY = int(os.getenv("LLM_MIN_CONCURRENCY", "2"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "1.0"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "60.0"))
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+OVERLOAD_STATUS_CODES = {429, 503}
+
+class LLMRateLimitError(Exception):
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+# ----------------------------- Token Bucket -----------------------------
+# Buckets are allowed to go into debt: a request is admitted on an estimate
+# and the difference to the real token usage is settled afterwards.
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        # Takes `amount` and returns how long the caller must wait before using it.
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill()
+            self.level -= amount
+            return 0.0 if self.level >= 0 else -self.level / self.rate
+
+    def settle(self, delta: float):
+        with self._lock:
+            self._refill()
+            self.level = min(self.capacity, self.level - delta)
+
+# ----------------------------- AIMD Concurrency -----------------------------
+# Additive increase on success, multiplicative decrease on 429/503, at most
+# one decrease per cooldown so a burst of errors only halves the limit once.
+
+class AIMDLimiter:
+    def __init__(self, initial: int = LLM_MAX_CONCURRENCY, minimum: int = LLM_MIN_CONCURRENCY, maximum: int = LLM_MAX_CONCURRENCY):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self.cooldown_seconds = 2.0
+        self._last_decrease = 0.0
+        self._condition: Optional[asyncio.Condition] = None
+
+    def _cond(self) -> asyncio.Condition:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def acquire(self):
+        cond = self._cond()
+        async with cond:
+            await cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self):
+        cond = self._cond()
+        async with cond:
+            self.in_flight -= 1
+            cond.notify_all()
+
+    def on_success(self):
+        self.limit = min(self.maximum, self.limit + 1.0 / max(self.limit, 1.0))
+
+    def on_overload(self):
+        now = time.monotonic()
+        if now - self._last_decrease >= self.cooldown_seconds:
+            self.limit = max(self.minimum, self.limit / 2)
+            self._last_decrease = now
+            logger.warning(f"LLM overloaded; concurrency limit now {int(self.limit)}")
+
+# ----------------------------- Retry Policy -----------------------------
+
+def status_code(error: BaseException) -> Optional[int]:
+    if isinstance(error, genai_errors.APIError):
+        return error.code
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code
+    if isinstance(error, (httpx.TimeoutException, httpx.NetworkError)):
+        return 503
+    return None
+
+def is_retryable(error: BaseException) -> bool:
+    return status_code(error) in RETRYABLE_STATUS_CODES
+
+def retry_after(error: BaseException) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers is not None:
+        value = headers.get("retry-after")
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                pass
+    # Gemini puts a google.rpc.RetryInfo {"retryDelay": "13s"} into the error details.
+    match = re.search(r"retryDelay['\"]?\s*[:=]\s*['\"]?([\d.]+)s", str(getattr(error, "details", "")))
+    return float(match.group(1)) if match else None
+
+def backoff_delay(attempt: int, error: BaseException) -> float:
+    hinted = retry_after(error)
+    if hinted is not None:
+        return min(hinted, LLM_BACKOFF_MAX_SECONDS) + random.uniform(0, LLM_BACKOFF_BASE_SECONDS)
+    ceiling = min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * (2 ** attempt))
+    return random.uniform(0, ceiling)  # full jitter
+
+# ----------------------------- Throttle -----------------------------
+
+def estimate_tokens(*parts: Any) -> int:
+    return sum(len(str(p)) for p in parts if p is not None) // 4 + 1
+
+def usage_tokens(response: Any) -> Optional[int]:
+    usage = getattr(response, "usage_metadata", None)
+    return getattr(usage, "total_token_count", None) if usage is not None else None
+
+class LLMThrottle:
+    def __init__(self):
+        self.requests = TokenBucket(LLM_REQUESTS_PER_MINUTE)
+        self.tokens = TokenBucket(LLM_TOKENS_PER_MINUTE)
+        self.concurrency = AIMDLimiter()
+        self.retries = 0
+        self.overloads = 0
+
+    def _admission_delay(self, estimated_tokens: int) -> float:
+        return max(self.requests.reserve(1), self.tokens.reserve(estimated_tokens))
+
+    def _record(self, estimated_tokens: int, response: Any):
+        actual = usage_tokens(response)
+        if actual is not None:
+            self.tokens.settle(actual - estimated_tokens)
+
+    def _on_error(self, error: BaseException, attempt: int) -> float:
+        code = status_code(error)
+        if code in OVERLOAD_STATUS_CODES:
+            self.overloads += 1
+            self.concurrency.on_overload()
+        if not is_retryable(error) or attempt >= LLM_MAX_RETRIES:
+            if code == 429:
+                raise LLMRateLimitError(f"LLM rate limit exceeded after {attempt + 1} attempts", retry_after(error)) from error
+            raise error
+        self.retries += 1
+        delay = backoff_delay(attempt, error)
+        logger.warning(f"LLM call failed with {code}; retry {attempt + 1}/{LLM_MAX_RETRIES} in {delay:.1f}s")
+        return delay
+
+    async def arun(self, call, estimated_tokens: int):
+        attempt = 0
+        while True:
+            await asyncio.sleep(self._admission_delay(estimated_tokens))
+            await self.concurrency.acquire()
+            try:
+                response = await call()
+            except Exception as e:
+                delay = self._on_error(e, attempt)
+            else:
+                self.concurrency.on_success()
+                self._record(estimated_tokens, response)
+                return response
+            finally:
+                await self.concurrency.release()
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def run(self, call, estimated_tokens: int):
+        # Sync callers share the rate buckets and retry policy; the AIMD
+        # limiter is async-only since it parks waiters on the event loop.
+        attempt = 0
+        while True:
+            time.sleep(self._admission_delay(estimated_tokens))
+            try:
+                response = call()
+            except Exception as e:
+                delay = self._on_error(e, attempt)
+            else:
+                self._record(estimated_tokens, response)
+                return response
+            attempt += 1
+            time.sleep(delay)
+
+llm_throttle = LLMThrottle()
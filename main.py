@@ -1,9 +1,49 @@
 # main.py
-from fastapi import FastAPI
-from api import router as course_router
+import math
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, Response
+from api import router as course_router, JOB_HANDLERS
+from job_queue import job_queue, JobWorkerPool, JOB_WORKERS
+from llm_throttle import LLMRateLimitError
+from pdf_extraction import shutdown_pdf_pool
+from url_fetcher import url_fetcher
+from registry import warmup, RESOURCES
+from metrics import metrics_registry, MetricsMiddleware, cache_collector, CONTENT_TYPE
+from tracing import TracingMiddleware, get_trace
+from cassette import cassette
+from llm_throttle import llm_throttle
+from llm_cache import llm_response_cache
+from source_cache import source_text_cache, source_summary_cache
+from summarizer import chunk_summary_cache
+from suggestion_store import suggestion_cache
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI(title="AI Course Generator")
+logger = logging.getLogger("main")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Shared clients/models load lazily; WARMUP_RESOURCES picks the ones worth
+    # paying for before the first request.
+    timings = await asyncio.to_thread(warmup)
+    if timings:
+        logger.info("Warmed up " + ", ".join(f"{name} in {seconds:.2f}s" for name, seconds in timings.items()))
+    if cassette.mode != "off":
+        logger.warning(f"Cassette {cassette.mode} mode: LLM and search calls use {cassette.path}")
+    # Set JOB_WORKERS=0 on API-only nodes and run worker.py elsewhere.
+    pool = JobWorkerPool(job_queue, JOB_HANDLERS, JOB_WORKERS) if JOB_WORKERS > 0 else None
+    if pool is not None:
+        pool.start()
+    app.state.job_pool = pool
+    yield
+    if pool is not None:
+        await pool.stop()
+    shutdown_pdf_pool()
+    await url_fetcher.aclose()
+
+app = FastAPI(title="AI Course Generator", lifespan=lifespan)
 
 # Include API router (with optional prefix and tags)
 app.include_router(course_router, prefix="/course", tags=["Course Generation"])
@@ -15,6 +55,48 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
+
+# ----------------------------- Metrics -----------------------------
+
+def _caches():
+    caches = [llm_response_cache, source_text_cache, source_summary_cache, chunk_summary_cache, suggestion_cache, url_fetcher.cache]
+    if RESOURCES["search"].loaded:
+        caches.append(RESOURCES["search"].get().cache)
+    return caches
+
+def _throttle_metrics():
+    return [
+        ("corgen_llm_retries_total", "counter", "LLM attempts retried after a retryable error.", [({}, llm_throttle.retries)]),
+        ("corgen_llm_overloads_total", "counter", "LLM 429/503 responses.", [({}, llm_throttle.overloads)]),
+        ("corgen_llm_concurrency_limit", "gauge", "Current AIMD concurrency limit.", [({}, int(llm_throttle.concurrency.limit))]),
+        ("corgen_llm_requests_active", "gauge", "LLM requests currently holding a concurrency slot.", [({}, llm_throttle.concurrency.in_flight)]),
+    ]
+
+metrics_registry.register_collector(cache_collector(_caches))
+metrics_registry.register_collector(_throttle_metrics)
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return Response(metrics_registry.render(), media_type=CONTENT_TYPE)
+
+# ----------------------------- Debug Traces -----------------------------
+# Only requests sent with "X-Debug-Trace: 1" are kept, and only the most
+# recent TRACE_STORE_SIZE of them.
+
+@app.get("/debug/trace/{trace_id}", include_in_schema=False)
+def debug_trace(trace_id: str):
+    trace = get_trace(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found or expired")
+    return trace
+
+# Provider quota exhausted even after retries: tell the client when to come back
+@app.exception_handler(LLMRateLimitError)
+async def llm_rate_limited(request: Request, exc: LLMRateLimitError):
+    headers = {"Retry-After": str(max(1, math.ceil(exc.retry_after or 30)))}
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers=headers)
 
 # Health check or root endpoint
 @app.get("/", tags=["Health"])
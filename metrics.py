@@ -0,0 +1,264 @@
+# metrics.py
+
+import math
+import time
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Prometheus text exposition (format 0.0.4), implemented in-process so the
+# app doesn't need prometheus_client. Metrics are module-level singletons;
+# values that already live elsewhere (cache and throttle counters) are read
+# by collectors at scrape time instead of being mirrored.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+LabelValues = Tuple[str, ...]
+Sample = Tuple[str, Dict[str, str], float]  # name suffix, labels, value
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+# ----------------------------- Metric Types -----------------------------
+
+class _Metric(ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key: LabelValues) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    @abstractmethod
+    def samples(self) -> List[Sample]:
+        ...
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            return [("_total", self._labels(k), v) for k, v in self._values.items()]
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            return [("", self._labels(k), v) for k, v in self._values.items()]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def samples(self) -> List[Sample]:
+        samples = []
+        with self._lock:
+            for key, counts in self._counts.items():
+                labels = self._labels(key)
+                cumulative = 0
+                for bound, count in zip(self.buckets + (math.inf,), counts):
+                    cumulative += count
+                    samples.append(("_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+                samples.append(("_count", labels, cumulative))
+                samples.append(("_sum", labels, self._sums[key]))
+        return samples
+
+# ----------------------------- Registry -----------------------------
+# A collector returns (name, kind, documentation, [(labels, value), ...]).
+
+CollectedMetric = Tuple[str, str, str, Iterable[Tuple[Dict[str, str], float]]]
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[CollectedMetric]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], Iterable[CollectedMetric]]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, labels, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        for collector in self._collectors:
+            try:
+                collected = list(collector())
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+                continue
+            for name, kind, documentation, samples in collected:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+metrics_registry = MetricsRegistry()
+
+# ----------------------------- App Metrics -----------------------------
+
+http_requests = metrics_registry.register(Counter(
+    "corgen_http_requests", "HTTP requests by route and status.", ("method", "route", "status")))
+http_request_seconds = metrics_registry.register(Histogram(
+    "corgen_http_request_duration_seconds", "HTTP request latency by route.", ("method", "route")))
+http_in_flight = metrics_registry.register(Gauge(
+    "corgen_http_requests_in_flight", "HTTP requests currently being served."))
+
+llm_call_seconds = metrics_registry.register(Histogram(
+    "corgen_llm_call_duration_seconds", "LLM call latency by stage, including throttling and retries.", ("stage", "model")))
+llm_calls = metrics_registry.register(Counter(
+    "corgen_llm_calls", "LLM calls by stage and outcome (ok, cached, error).", ("stage", "model", "outcome")))
+llm_tokens = metrics_registry.register(Counter(
+    "corgen_llm_tokens", "LLM tokens by stage and kind (prompt, output, thinking, cached).", ("stage", "model", "kind")))
+llm_in_flight = metrics_registry.register(Gauge(
+    "corgen_llm_calls_in_flight", "LLM calls currently waiting or running, by stage.", ("stage",)))
+llm_errors = metrics_registry.register(Counter(
+    "corgen_llm_errors", "LLM calls that failed after retries, by stage and error type.", ("stage", "error")))
+
+def record_llm_usage(stage: str, model: str, response) -> None:
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    for kind, field in (
+        ("prompt", "prompt_token_count"),
+        ("output", "candidates_token_count"),
+        ("thinking", "thoughts_token_count"),
+        ("cached", "cached_content_token_count"),
+    ):
+        value = getattr(usage, field, None)
+        if value:
+            llm_tokens.inc(value, stage=stage, model=model, kind=kind)
+
+def cache_collector(caches: Callable[[], Iterable]) -> Callable[[], List[CollectedMetric]]:
+    # `caches` returns TieredCache instances; evaluated per scrape so lazily
+    # created caches show up once they exist.
+    def collect() -> List[CollectedMetric]:
+        stats = [cache.stats() for cache in caches()]
+        return [
+            ("corgen_cache_hits_total", "counter", "Cache hits by namespace.",
+             [({"namespace": s["namespace"]}, s["hits"]) for s in stats]),
+            ("corgen_cache_disk_hits_total", "counter", "Cache hits served from the SQLite tier.",
+             [({"namespace": s["namespace"]}, s["disk_hits"]) for s in stats]),
+            ("corgen_cache_misses_total", "counter", "Cache misses by namespace.",
+             [({"namespace": s["namespace"]}, s["misses"]) for s in stats]),
+            ("corgen_cache_hit_ratio", "gauge", "Cache hit ratio since process start.",
+             [({"namespace": s["namespace"]}, s["hit_ratio"]) for s in stats]),
+        ]
+    return collect
+
+def route_label(scope: Dict) -> str:
+    # The matched route's template ("/course/suggestions/{suggestions_id}"),
+    # so path parameters don't explode the label set.
+    route = scope.get("route")
+    template: Optional[str] = getattr(route, "path", None)
+    if template is None:
+        return "unmatched"
+    path = scope.get("path", "")
+    regex = getattr(route, "path_regex", None)
+    if regex is not None and not regex.match(path):
+        for i, char in enumerate(path):
+            if char == "/" and i and regex.match(path[i:]):
+                return path[:i] + template
+    return template
+
+# ----------------------------- HTTP Middleware -----------------------------
+# Plain ASGI rather than BaseHTTPMiddleware so streamed (SSE) responses are
+# timed to their last byte, not to the headers.
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        http_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_in_flight.dec()
+            route = route_label(scope)
+            method = scope.get("method", "")
+            http_request_seconds.observe(time.perf_counter() - started, method=method, route=route)
+            http_requests.inc(method=method, route=route, status=str(status["code"]))
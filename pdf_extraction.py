@@ -0,0 +1,92 @@
+# pdf_extraction.py
+
+import os
+import re
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, Optional, Tuple
+from dotenv import load_dotenv
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # pypdf is preferred; PyPDF2 is its older name
+    from PyPDF2 import PdfReader
+
+load_dotenv()
+
+# ----------------------------- Constants -----------------------------
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(max(1, min(4, (os.cpu_count() or 2) - 1)))))
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "500"))
+
+_WHITESPACE = re.compile(r'\s+')
+_LONG_URL = re.compile(r'https?://\S{80,}')
+_TAG = re.compile(r'<[^>]+>')
+
+# ----------------------------- Page Ranges -----------------------------
+
+def parse_page_range(pages: Optional[str]) -> Tuple[int, Optional[int]]:
+    # "3-10" -> (2, 10), "5" -> (4, 5), "7-" -> (6, None); 1-based and inclusive.
+    if not pages:
+        return 0, None
+    first, sep, last = pages.partition("-")
+    try:
+        start = max(int(first.strip() or "1") - 1, 0)
+        stop = int(last.strip()) if last.strip() else (None if sep else start + 1)
+    except ValueError:
+        raise ValueError(f"Invalid page range '{pages}' (expected e.g. '3-10')")
+    if stop is not None and stop <= start:
+        raise ValueError(f"Invalid page range '{pages}'")
+    return start, stop
+
+# ----------------------------- Extraction -----------------------------
+
+def clean_page_text(text: str) -> str:
+    text = _WHITESPACE.sub(' ', text)
+    text = _LONG_URL.sub('', text)
+    text = _TAG.sub('', text)
+    return text.strip()
+
+def iter_pdf_pages(pdf_path: str, start: int = 0, stop: Optional[int] = None, max_pages: int = PDF_MAX_PAGES) -> Iterator[str]:
+    # Pages are parsed lazily and cleaned one at a time, so only the current
+    # page's objects are held in memory.
+    with open(pdf_path, "rb") as f:
+        reader = PdfReader(f)
+        total = len(reader.pages)
+        stop = total if stop is None else min(stop, total)
+        stop = min(stop, start + max_pages)
+        for index in range(start, stop):
+            try:
+                text = reader.pages[index].extract_text() or ""
+            except Exception as e:
+                print(f"Skipping unreadable page {index + 1} of {pdf_path}: {e}")
+                continue
+            cleaned = clean_page_text(text)
+            if cleaned:
+                yield cleaned
+
+def extract_pdf_text(pdf_path: str, pages: Optional[str] = None, max_pages: int = PDF_MAX_PAGES) -> str:
+    start, stop = parse_page_range(pages)
+    return " ".join(iter_pdf_pages(pdf_path, start, stop, max_pages))
+
+# ----------------------------- Process Pool -----------------------------
+# Parsing is CPU-bound pure Python, so it runs in worker processes rather
+# than threads; the event loop keeps serving requests meanwhile.
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+async def aextract_pdf_text(pdf_path: str, pages: Optional[str] = None, max_pages: int = PDF_MAX_PAGES) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_pool(), extract_pdf_text, pdf_path, pages, max_pages)
+
+def shutdown_pdf_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
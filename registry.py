@@ -0,0 +1,100 @@
+# registry.py
+
+import os
+import time
+import threading
+from typing import Any, Callable, Dict, List, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ----------------------------- Constants -----------------------------
+SPACY_MODEL = os.getenv("SPACY_MODEL", "en_core_web_sm")
+# Alternate Gemini endpoint, e.g. the fake_gemini.py server used by benchmark.py.
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "")
+# Resources built during app startup; everything else loads on first use.
+# Add "nlp" on workers that serve validation.
+WARMUP_RESOURCES = [r.strip() for r in os.getenv("WARMUP_RESOURCES", "llm").split(",") if r.strip()]
+
+# ----------------------------- Lazy Resources -----------------------------
+# Each shared resource is built once, on first use or at warmup, and then
+# reused by every module in the process.
+
+class LazyResource:
+    def __init__(self, name: str, factory: Callable[[], Any]):
+        self.name = name
+        self.factory = factory
+        self.load_seconds: Optional[float] = None
+        self._value: Any = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._value is not None
+
+    def get(self) -> Any:
+        if self._value is None:
+            with self._lock:
+                if self._value is None:
+                    started = time.perf_counter()
+                    self._value = self.factory()
+                    self.load_seconds = time.perf_counter() - started
+        return self._value
+
+    def reset(self):
+        with self._lock:
+            self._value = None
+            self.load_seconds = None
+
+def _create_llm_client():
+    from google import genai
+    from google.genai import types
+
+    http_options = types.HttpOptions(base_url=GEMINI_BASE_URL) if GEMINI_BASE_URL else None
+    return genai.Client(api_key=os.getenv("GEMINI_API_KEY"), http_options=http_options)
+
+def _load_nlp():
+    import spacy
+
+    # Only tagging, parsing (sentences, noun chunks) and NER are used.
+    return spacy.load(SPACY_MODEL, exclude=["lemmatizer"])
+
+def _create_web_search():
+    from search_backend import WebSearch, create_search_backend
+
+    return WebSearch(create_search_backend())
+
+RESOURCES: Dict[str, LazyResource] = {
+    "llm": LazyResource("llm", _create_llm_client),
+    "nlp": LazyResource("nlp", _load_nlp),
+    "search": LazyResource("search", _create_web_search),
+}
+
+def get_llm_client():
+    return RESOURCES["llm"].get()
+
+def get_nlp():
+    return RESOURCES["nlp"].get()
+
+def get_web_search():
+    return RESOURCES["search"].get()
+
+def warmup(names: List[str] = WARMUP_RESOURCES) -> Dict[str, float]:
+    timings = {}
+    for name in names:
+        resource = RESOURCES.get(name)
+        if resource is None:
+            print(f"Unknown warmup resource '{name}' (expected one of {', '.join(RESOURCES)})")
+            continue
+        try:
+            resource.get()
+            timings[name] = resource.load_seconds or 0.0
+        except Exception as e:
+            print(f"Warmup of '{name}' failed: {e}")
+    return timings
+
+def resource_status() -> Dict[str, Dict]:
+    return {
+        name: {"loaded": r.loaded, "load_seconds": r.load_seconds}
+        for name, r in RESOURCES.items()
+    }
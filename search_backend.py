@@ -0,0 +1,159 @@
+# search_backend.py
+
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+from llm_cache import TieredCache
+from cassette import cassette
+
+load_dotenv()
+
+# ----------------------------- Constants -----------------------------
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "serpapi")  # serpapi | local
+SEARCH_CONCURRENCY = int(os.getenv("SEARCH_CONCURRENCY", "8"))
+SEARCH_NUM_RESULTS = int(os.getenv("SEARCH_NUM_RESULTS", "5"))
+SEARCH_CACHE_TTL_SECONDS = float(os.getenv("SEARCH_CACHE_TTL_SECONDS", str(3 * 24 * 3600)))
+# Local stand-in: a JSON file of {"query": ["snippet", ...]} and an optional
+# per-query delay so benchmarks can model a real search API.
+SEARCH_LOCAL_CORPUS = os.getenv("SEARCH_LOCAL_CORPUS", "")
+SEARCH_LOCAL_LATENCY_SECONDS = float(os.getenv("SEARCH_LOCAL_LATENCY_SECONDS", "0"))
+
+_PUNCTUATION = re.compile(r'[^\w\s-]')
+_WHITESPACE = re.compile(r'\s+')
+_LEADING_DETERMINERS = re.compile(r'^(the|a|an|this|that|these|those|its|their|our|your|his|her|some|any|each|every)\s+')
+
+# ----------------------------- Query Normalization -----------------------------
+
+def normalize_query(query: str) -> str:
+    # "The  Transformer's" and "transformers" aren't merged (no stemming), but
+    # case, punctuation, spacing and leading determiners are.
+    text = _PUNCTUATION.sub(" ", query.casefold())
+    text = _WHITESPACE.sub(" ", text).strip()
+    return _LEADING_DETERMINERS.sub("", text)
+
+def dedupe_queries(queries: List[str], min_length: int = 3) -> List[str]:
+    # Keeps the first spelling of each normalized query, in input order.
+    seen = set()
+    unique = []
+    for query in queries:
+        normalized = normalize_query(query)
+        if len(normalized) < min_length or normalized.isdigit() or normalized in seen:
+            continue
+        seen.add(normalized)
+        unique.append(query.strip())
+    return unique
+
+# ----------------------------- Backends -----------------------------
+
+class SearchBackend(ABC):
+    name = "base"
+
+    @abstractmethod
+    def search(self, query: str, num_results: int = SEARCH_NUM_RESULTS) -> List[str]:
+        ...
+
+class SerpApiBackend(SearchBackend):
+    name = "serpapi"
+
+    def __init__(self, api_key: Optional[str] = None):
+        self.api_key = api_key or os.getenv("SERPAPI_API_KEY")
+
+    def search(self, query: str, num_results: int = SEARCH_NUM_RESULTS) -> List[str]:
+        from serpapi import GoogleSearch
+
+        params = {
+            "engine": "google",
+            "q": query,
+            "api_key": self.api_key,
+            "num": num_results
+        }
+        results = GoogleSearch(params).get_dict()
+        return [r["snippet"] for r in results.get("organic_results", []) if "snippet" in r][:num_results]
+
+class LocalSearchBackend(SearchBackend):
+    # Deterministic stand-in for tests and benchmarks: answers from a corpus
+    # file when it has the query, otherwise synthesizes snippets.
+    name = "local"
+
+    def __init__(self, corpus_path: str = SEARCH_LOCAL_CORPUS, latency_seconds: float = SEARCH_LOCAL_LATENCY_SECONDS):
+        self.latency_seconds = latency_seconds
+        self.corpus: Dict[str, List[str]] = {}
+        if corpus_path:
+            with open(corpus_path, "r", encoding="utf-8") as f:
+                self.corpus = {normalize_query(k): v for k, v in json.load(f).items()}
+        self.calls = 0
+
+    def search(self, query: str, num_results: int = SEARCH_NUM_RESULTS) -> List[str]:
+        self.calls += 1
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        normalized = normalize_query(query)
+        if normalized in self.corpus:
+            return self.corpus[normalized][:num_results]
+        return [f"{query}: reference snippet {i + 1}." for i in range(num_results)]
+
+def create_search_backend(backend: str = SEARCH_BACKEND) -> SearchBackend:
+    if backend == "serpapi":
+        return SerpApiBackend()
+    if backend == "local":
+        return LocalSearchBackend()
+    raise ValueError(f"Unknown SEARCH_BACKEND '{backend}' (expected 'serpapi' or 'local')")
+
+# ----------------------------- Cached Search -----------------------------
+
+class WebSearch:
+    def __init__(self, backend: SearchBackend, cache: Optional[TieredCache] = None, concurrency: int = SEARCH_CONCURRENCY):
+        self.backend = backend
+        self.cache = cache if cache is not None else TieredCache("search", ttl_seconds=SEARCH_CACHE_TTL_SECONDS)
+        self.concurrency = concurrency
+
+    def _key(self, query: str, num_results: int) -> str:
+        normalized = normalize_query(query)
+        digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+        return f"{self.backend.name}:{num_results}:{digest}"
+
+    def search(self, query: str, num_results: int = SEARCH_NUM_RESULTS) -> List[str]:
+        key = self._key(query, num_results)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return json.loads(cached)
+        snippets = self._backend_search(query, num_results, key)
+        self.cache.set(key, json.dumps(snippets))
+        return snippets
+
+    def _backend_search(self, query: str, num_results: int, key: str) -> List[str]:
+        # Cache misses are what reach the backend, so that's what cassettes
+        # record and replay (see cassette.py).
+        if cassette.replaying:
+            entry = cassette.lookup("search", key)
+            if entry is not None:
+                cassette.wait(entry)
+                return entry["snippets"]
+        started = time.perf_counter()
+        snippets = self.backend.search(query, num_results)
+        if cassette.recording:
+            cassette.record("search", key, time.perf_counter() - started, query=query, snippets=snippets)
+        return snippets
+
+    async def search_many(self, queries: List[str], num_results: int = SEARCH_NUM_RESULTS) -> Dict[str, List[str]]:
+        # Backends are blocking clients, so each lookup runs in a thread; the
+        # semaphore keeps us from firing dozens of API calls at once.
+        semaphore = asyncio.Semaphore(self.concurrency)
+        queries = dedupe_queries(queries)
+
+        async def lookup(query: str) -> List[str]:
+            async with semaphore:
+                try:
+                    return await asyncio.to_thread(self.search, query, num_results)
+                except Exception as e:
+                    print(f"Search failed for '{query}': {e}")
+                    return []
+
+        results = await asyncio.gather(*(lookup(q) for q in queries))
+        return dict(zip(queries, results))
@@ -0,0 +1,100 @@
+# source_cache.py
+
+import os
+import asyncio
+import hashlib
+import threading
+from typing import Awaitable, Callable, Dict, Tuple
+from llm_cache import TieredCache
+from url_fetcher import afetch_url
+
+# ----------------------------- Constants -----------------------------
+source_text_cache = TieredCache("source_text")
+source_summary_cache = TieredCache("source_summary")
+
+_digest_memo: Dict[Tuple[str, int, int], str] = {}
+_digest_lock = threading.Lock()
+_inflight: Dict[str, "asyncio.Task[str]"] = {}
+
+# ----------------------------- Keys -----------------------------
+
+def file_digest(path: str) -> str:
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    with _digest_lock:
+        digest = _digest_memo.get(memo_key)
+    if digest is not None:
+        return digest
+
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(block)
+    digest = sha.hexdigest()
+    with _digest_lock:
+        _digest_memo[memo_key] = digest
+    return digest
+
+def text_digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+# ----------------------------- Cached Loaders -----------------------------
+
+def cached_file_text(path: str, kind: str, extract: Callable[[str], str]) -> str:
+    key = f"{kind}:{file_digest(path)}"
+    cached = source_text_cache.get(key)
+    if cached is not None:
+        return cached
+    text = extract(path)
+    source_text_cache.set(key, text)
+    return text
+
+async def acached_file_text(path: str, kind: str, extract: Callable[[str], Awaitable[str]]) -> str:
+    key = f"{kind}:{await asyncio.to_thread(file_digest, path)}"
+    cached = await source_text_cache.aget(key)
+    if cached is not None:
+        return cached
+    text = await extract(path)
+    await source_text_cache.aset(key, text)
+    return text
+
+async def acached_url_text(url: str, extract: Callable[[str, str], str]) -> str:
+    # Freshness and revalidation live in the HTTP cache; here the extracted
+    # text is keyed by the body so an unchanged page isn't parsed twice.
+    page = await afetch_url(url)
+    # v2: extraction changed; entries cached by the old extractor (some of
+    # them empty) are not reused.
+    key = f"page:v2:{text_digest(page.text)}"
+    cached = await source_text_cache.aget(key)
+    if cached is not None:
+        return cached
+    text = await asyncio.to_thread(extract, page.text, page.content_type)
+    await source_text_cache.aset(key, text)
+    return text
+
+async def cached_summary(text: str, label: str, summarize: Callable[[str, str], Awaitable[str]]) -> str:
+    key = f"{label}:{text_digest(text)}"
+    cached = await source_summary_cache.aget(key)
+    if cached is not None:
+        return cached
+
+    # Activities generated side by side often share a source; the first
+    # caller starts the summary as its own task and everyone (the first caller
+    # included) awaits it shielded, so a cancelled caller doesn't cancel the
+    # summary for the rest.
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(_summarize_and_store(key, text, label, summarize))
+        # Retrieve the exception even when every caller has gone away.
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        _inflight[key] = task
+    return await asyncio.shield(task)
+
+async def _summarize_and_store(key: str, text: str, label: str, summarize: Callable[[str, str], Awaitable[str]]) -> str:
+    try:
+        summary = await summarize(text, label)
+        if summary:
+            await source_summary_cache.aset(key, summary)
+        return summary
+    finally:
+        _inflight.pop(key, None)
@@ -0,0 +1,158 @@
+# stage_profiles.py
+
+import os
+import json
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+from fastapi import Header, HTTPException
+from google.genai.types import GenerateContentConfig, ThinkingConfig
+from pydantic import BaseModel, ValidationError
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ----------------------------- Constants -----------------------------
+DEFAULT_MODEL = os.getenv("LLM_DEFAULT_MODEL", "gemini-2.5-flash")
+FAST_MODEL = os.getenv("LLM_FAST_MODEL", "gemini-2.5-flash-lite")
+# Clients may send X-LLM-Profile to override profiles for one request. Off by
+# default: the API is unauthenticated, and an override picks what the server pays for.
+STAGE_PROFILE_OVERRIDES_ENABLED = os.getenv("STAGE_PROFILE_OVERRIDES_ENABLED", "0") in ("1", "true", "True")
+# Limits on what an override may ask for. Models default to the ones the
+# stage profiles already use (see ALLOWED_OVERRIDE_MODELS below).
+STAGE_PROFILE_ALLOWED_MODELS = os.getenv("STAGE_PROFILE_ALLOWED_MODELS", "")
+STAGE_PROFILE_MAX_THINKING_BUDGET = int(os.getenv("STAGE_PROFILE_MAX_THINKING_BUDGET", "4096"))
+STAGE_PROFILE_MAX_OUTPUT_TOKENS = int(os.getenv("STAGE_PROFILE_MAX_OUTPUT_TOKENS", "16384"))
+
+# ----------------------------- Profiles -----------------------------
+# How each LLM stage is called. Unset fields leave the SDK/model default (or
+# the call site's own value, for temperature) alone; thinking_budget=0 turns
+# thinking off, -1 lets the model decide.
+
+class StageProfile(BaseModel):
+    model: str = DEFAULT_MODEL
+    thinking_budget: Optional[int] = None
+    max_output_tokens: Optional[int] = None
+    temperature: Optional[float] = None
+
+class StageProfileOverride(BaseModel):
+    model: Optional[str] = None
+    thinking_budget: Optional[int] = None
+    max_output_tokens: Optional[int] = None
+    temperature: Optional[float] = None
+
+# Long-form content keeps the full model and its default thinking. Course
+# structure stages get a bounded thinking budget. Auxiliary calls (bullet
+# summaries, suggestions, chunk validation) run on the fast model with
+# thinking off; their output caps stay well above what they normally return.
+# Override one stage with STAGE_PROFILE_<STAGE>='{"model": "...", "thinking_budget": 0}'.
+DEFAULT_STAGE_PROFILES = {
+    "reading": StageProfile(),
+    "lecture": StageProfile(),
+    "quiz": StageProfile(thinking_budget=1024),
+    "assignment": StageProfile(thinking_budget=1024),
+    "mindmap": StageProfile(thinking_budget=512),
+    "outline": StageProfile(thinking_budget=1024),
+    "module": StageProfile(thinking_budget=1024),
+    "submodule": StageProfile(thinking_budget=512),
+    "activity": StageProfile(thinking_budget=512),
+    "redo": StageProfile(thinking_budget=1024),
+    "summarize": StageProfile(model=FAST_MODEL, thinking_budget=0, max_output_tokens=2048),
+    "suggest": StageProfile(model=FAST_MODEL, thinking_budget=0, max_output_tokens=2048),
+    "validate": StageProfile(model=FAST_MODEL, thinking_budget=0, max_output_tokens=8192),
+    "other": StageProfile(),
+}
+
+def _merge(profile: StageProfile, override: StageProfileOverride) -> StageProfile:
+    return profile.model_copy(update=override.model_dump(exclude_none=True))
+
+def _env_override(stage: str) -> Optional[StageProfileOverride]:
+    raw = os.getenv(f"STAGE_PROFILE_{stage.upper()}")
+    if not raw:
+        return None
+    try:
+        return StageProfileOverride.model_validate_json(raw)
+    except ValidationError as e:
+        print(f"Ignoring invalid STAGE_PROFILE_{stage.upper()}: {e}")
+        return None
+
+def _configured_profiles() -> Dict[str, StageProfile]:
+    profiles = {}
+    for stage, profile in DEFAULT_STAGE_PROFILES.items():
+        override = _env_override(stage)
+        profiles[stage] = _merge(profile, override) if override else profile
+    return profiles
+
+STAGE_PROFILES = _configured_profiles()
+ALLOWED_OVERRIDE_MODELS = {
+    m.strip() for m in STAGE_PROFILE_ALLOWED_MODELS.split(",") if m.strip()
+} or {profile.model for profile in STAGE_PROFILES.values()}
+
+# ----------------------------- Per-Request Overrides -----------------------------
+# X-LLM-Profile: {"summarize": {"model": "gemini-2.5-flash"}, "*": {"thinking_budget": 0}}
+# "*" applies to every stage; a named stage wins over "*". The overrides ride
+# in a contextvar for the rest of the request, like the trace in tracing.py.
+# Only allowlisted models are accepted, and thinking budgets and output caps
+# are bounded; a header asking for more is rejected with a 400.
+
+_request_overrides: ContextVar[Dict[str, StageProfileOverride]] = ContextVar("stage_profile_overrides", default={})
+
+def parse_overrides(raw: str) -> Dict[str, StageProfileOverride]:
+    data = json.loads(raw)
+    if not isinstance(data, dict):
+        raise ValueError("expected a JSON object of stage -> profile fields")
+    unknown = [stage for stage in data if stage != "*" and stage not in STAGE_PROFILES]
+    if unknown:
+        raise ValueError(f"unknown stages {unknown} (expected '*' or one of {', '.join(STAGE_PROFILES)})")
+    overrides = {stage: StageProfileOverride.model_validate(fields) for stage, fields in data.items()}
+    for stage, override in overrides.items():
+        _check_limits(stage, override)
+    return overrides
+
+def _check_limits(stage: str, override: StageProfileOverride):
+    if override.model is not None and override.model not in ALLOWED_OVERRIDE_MODELS:
+        raise ValueError(f"{stage}: model '{override.model}' is not allowed (expected one of {', '.join(sorted(ALLOWED_OVERRIDE_MODELS))})")
+    budget = override.thinking_budget
+    if budget is not None and not 0 <= budget <= STAGE_PROFILE_MAX_THINKING_BUDGET:
+        raise ValueError(f"{stage}: thinking_budget must be between 0 and {STAGE_PROFILE_MAX_THINKING_BUDGET}")
+    tokens = override.max_output_tokens
+    if tokens is not None and not 1 <= tokens <= STAGE_PROFILE_MAX_OUTPUT_TOKENS:
+        raise ValueError(f"{stage}: max_output_tokens must be between 1 and {STAGE_PROFILE_MAX_OUTPUT_TOKENS}")
+
+async def stage_profile_overrides(x_llm_profile: Optional[str] = Header(default=None)):
+    # Router dependency: validates the header and installs it for this request.
+    if not x_llm_profile or not STAGE_PROFILE_OVERRIDES_ENABLED:
+        return
+    try:
+        overrides = parse_overrides(x_llm_profile)
+    except (ValueError, ValidationError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid X-LLM-Profile header: {e}")
+    _request_overrides.set(overrides)
+
+def resolve_profile(stage: Optional[str]) -> StageProfile:
+    name = stage if stage in STAGE_PROFILES else "other"
+    profile = STAGE_PROFILES[name]
+    overrides = _request_overrides.get()
+    for key in ("*", name):
+        if key in overrides:
+            profile = _merge(profile, overrides[key])
+    return profile
+
+def apply_profile(stage: Optional[str], config: Optional[GenerateContentConfig]) -> Tuple[str, Optional[GenerateContentConfig]]:
+    # Returns the model to call and the call site's config with the profile's
+    # fields merged in; fields the profile sets take precedence.
+    profile = resolve_profile(stage)
+    updates = {}
+    if profile.thinking_budget is not None:
+        updates["thinking_config"] = ThinkingConfig(thinking_budget=profile.thinking_budget)
+    if profile.max_output_tokens is not None:
+        updates["max_output_tokens"] = profile.max_output_tokens
+    if profile.temperature is not None:
+        updates["temperature"] = profile.temperature
+    if not updates:
+        return profile.model, config
+    if config is None:
+        return profile.model, GenerateContentConfig(**updates)
+    return profile.model, config.model_copy(update=updates)
+
+def profile_table() -> Dict[str, Dict]:
+    return {stage: resolve_profile(stage).model_dump() for stage in STAGE_PROFILES}
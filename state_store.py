@@ -0,0 +1,191 @@
+# state_store.py
+
+import os
+import time
+import sqlite3
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Type
+from pydantic import BaseModel
+from dotenv import load_dotenv
+from genai_logic import ModuleSet, SubmoduleSet, ActivitySet
+
+load_dotenv()
+
+# ----------------------------- Constants -----------------------------
+COURSE_STATE_BACKEND = os.getenv("COURSE_STATE_BACKEND", "memory")  # memory | sqlite
+COURSE_STATE_DB_PATH = os.getenv("COURSE_STATE_DB_PATH", ".cache/course_state.sqlite3")
+COURSE_STATE_MAX_ENTRIES = int(os.getenv("COURSE_STATE_MAX_ENTRIES", "10000"))
+COURSE_STATE_TTL_SECONDS = float(os.getenv("COURSE_STATE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+# Generated module/submodule ids ("module_1", ...) repeat across courses, so
+# every entry is scoped by its parents: (kind, course_id, module_id, submodule_id).
+StateKey = Tuple[str, str, str, str]
+
+# ----------------------------- Store Interface -----------------------------
+
+class CourseStateStore(ABC):
+    @abstractmethod
+    def _put(self, key: StateKey, payload: str):
+        ...
+
+    @abstractmethod
+    def _get(self, key: StateKey) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def _course_entries(self, course_id: str) -> List[Tuple[StateKey, str]]:
+        ...
+
+    def _load(self, key: StateKey, model: Type[BaseModel]) -> Optional[BaseModel]:
+        payload = self._get(key)
+        return model.model_validate_json(payload) if payload is not None else None
+
+    def put_modules(self, course_id: str, modules: ModuleSet):
+        self._put(("modules", course_id, "", ""), modules.model_dump_json())
+
+    def get_modules(self, course_id: str) -> Optional[ModuleSet]:
+        return self._load(("modules", course_id, "", ""), ModuleSet)
+
+    def put_submodules(self, module_id: str, submodules: SubmoduleSet, course_id: str = ""):
+        self._put(("submodules", course_id, module_id, ""), submodules.model_dump_json())
+
+    def get_submodules(self, module_id: str, course_id: str = "") -> Optional[SubmoduleSet]:
+        return self._load(("submodules", course_id, module_id, ""), SubmoduleSet)
+
+    def put_activities(self, submodule_id: str, activities: ActivitySet, course_id: str = "", module_id: str = ""):
+        self._put(("activities", course_id, module_id, submodule_id), activities.model_dump_json())
+
+    def get_activities(self, submodule_id: str, course_id: str = "", module_id: str = "") -> Optional[ActivitySet]:
+        return self._load(("activities", course_id, module_id, submodule_id), ActivitySet)
+
+    def get_course(self, course_id: str) -> Dict:
+        course: Dict = {"course_id": course_id, "modules": None, "submodules": {}, "activities": {}}
+        for (kind, _, module_id, submodule_id), payload in self._course_entries(course_id):
+            if kind == "modules":
+                course["modules"] = ModuleSet.model_validate_json(payload)
+            elif kind == "submodules":
+                course["submodules"][module_id] = SubmoduleSet.model_validate_json(payload)
+            elif kind == "activities":
+                course["activities"][submodule_id] = ActivitySet.model_validate_json(payload)
+        return course
+
+    # Async routes use these: the SQLite backend can wait up to its 30 s busy
+    # timeout on a locked file, which must not happen on the event loop.
+
+    async def aput_modules(self, course_id: str, modules: ModuleSet):
+        await asyncio.to_thread(self.put_modules, course_id, modules)
+
+    async def aput_submodules(self, module_id: str, submodules: SubmoduleSet, course_id: str = ""):
+        await asyncio.to_thread(self.put_submodules, module_id, submodules, course_id)
+
+    async def aput_activities(self, submodule_id: str, activities: ActivitySet, course_id: str = "", module_id: str = ""):
+        await asyncio.to_thread(self.put_activities, submodule_id, activities, course_id, module_id)
+
+    async def aget_course(self, course_id: str) -> Dict:
+        return await asyncio.to_thread(self.get_course, course_id)
+
+# ----------------------------- In-Memory Backend -----------------------------
+
+class MemoryStateStore(CourseStateStore):
+    def __init__(self, max_entries: int = COURSE_STATE_MAX_ENTRIES, ttl_seconds: float = COURSE_STATE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[StateKey, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _put(self, key: StateKey, payload: str):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl_seconds, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _get(self, key: StateKey) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def _course_entries(self, course_id: str) -> List[Tuple[StateKey, str]]:
+        now = time.time()
+        with self._lock:
+            return [(k, v[1]) for k, v in self._entries.items() if k[1] == course_id and v[0] > now]
+
+# ----------------------------- SQLite Backend -----------------------------
+# WAL mode lets several uvicorn workers read and write the same file safely.
+
+class SQLiteStateStore(CourseStateStore):
+    def __init__(self, db_path: str = COURSE_STATE_DB_PATH, ttl_seconds: float = COURSE_STATE_TTL_SECONDS):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS course_state (
+                    kind TEXT NOT NULL,
+                    course_id TEXT NOT NULL,
+                    module_id TEXT NOT NULL,
+                    submodule_id TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (kind, course_id, module_id, submodule_id)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS course_state_course ON course_state (course_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS course_state_expiry ON course_state (expires_at)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _put(self, key: StateKey, payload: str):
+        now = time.time()
+        with self._lock:
+            conn = self._db()
+            conn.execute(
+                "INSERT OR REPLACE INTO course_state (kind, course_id, module_id, submodule_id, payload, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (*key, payload, now + self.ttl_seconds)
+            )
+            conn.execute("DELETE FROM course_state WHERE expires_at <= ?", (now,))
+            conn.commit()
+
+    def _get(self, key: StateKey) -> Optional[str]:
+        with self._lock:
+            row = self._db().execute(
+                "SELECT payload FROM course_state WHERE kind = ? AND course_id = ? AND module_id = ? "
+                "AND submodule_id = ? AND expires_at > ?",
+                (*key, time.time())
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def _course_entries(self, course_id: str) -> List[Tuple[StateKey, str]]:
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT kind, course_id, module_id, submodule_id, payload FROM course_state "
+                "WHERE course_id = ? AND expires_at > ?",
+                (course_id, time.time())
+            ).fetchall()
+        return [((r[0], r[1], r[2], r[3]), r[4]) for r in rows]
+
+def create_state_store(backend: str = COURSE_STATE_BACKEND) -> CourseStateStore:
+    if backend == "sqlite":
+        return SQLiteStateStore()
+    if backend == "memory":
+        return MemoryStateStore()
+    raise ValueError(f"Unknown COURSE_STATE_BACKEND '{backend}' (expected 'memory' or 'sqlite')")
@@ -0,0 +1,123 @@
+# suggestion_store.py
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+from typing import Dict, Optional, Tuple
+from llm_cache import TieredCache, CACHE_PATH, CACHE_MAX_ENTRIES
+from genai_logic import Stage, get_stage_suggestions
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Suggestions are computed after the stage result has been returned. They are
+# keyed by a hash of stage + content, so identical content is only reviewed once.
+
+# ----------------------------- Constants -----------------------------
+# A "pending" marker outlives a worker that died mid-computation by at most
+# this long; after that the suggestions are scheduled again.
+SUGGESTION_PENDING_TTL_SECONDS = float(os.getenv("SUGGESTION_PENDING_TTL_SECONDS", "300"))
+SUGGESTION_FAILED_TTL_SECONDS = float(os.getenv("SUGGESTION_FAILED_TTL_SECONDS", "3600"))
+# How often a waiter polls the shared store for work running in another worker.
+SUGGESTION_POLL_SECONDS = 0.5
+
+suggestion_cache = TieredCache("suggestions")
+# pending/error markers, shared by every worker through the disk tier. With a
+# disk tier they skip the memory tier (max_entries=0), so a worker never
+# serves its own stale "pending" after another worker has finished.
+suggestion_state = TieredCache("suggestion_state", max_entries=0 if CACHE_PATH else CACHE_MAX_ENTRIES)
+
+# This worker's own computations, so waiters here can await them directly.
+_pending: Dict[str, "asyncio.Task[Optional[dict]]"] = {}
+
+def suggestion_id(stage: Stage, context: str) -> str:
+    return hashlib.sha256(f"{Stage(stage).value}\n{context}".encode("utf-8")).hexdigest()[:32]
+
+async def cached_suggestions(result_id: str) -> Optional[dict]:
+    cached = await suggestion_cache.aget(result_id)
+    return json.loads(cached) if cached is not None else None
+
+async def _state(result_id: str) -> Optional[dict]:
+    cached = await suggestion_state.aget(result_id)
+    return json.loads(cached) if cached is not None else None
+
+async def _set_state(result_id: str, ttl_seconds: float, **state):
+    await suggestion_state.aset(result_id, json.dumps(state), ttl_seconds=ttl_seconds)
+
+async def _fail(result_id: str, error: str):
+    await _set_state(result_id, SUGGESTION_FAILED_TTL_SECONDS, status="error", error=error)
+
+async def _compute(result_id: str, stage: Stage, context: str) -> Optional[dict]:
+    try:
+        suggestions = await get_stage_suggestions(stage, context)
+        if not suggestions or "error" in suggestions:
+            await _fail(result_id, (suggestions or {}).get("error", "No suggestions were generated."))
+            return None
+        await suggestion_cache.aset(result_id, json.dumps(suggestions))
+        # Short-lived so a worker still polling sees the result first.
+        await _set_state(result_id, 1.0, status="ready")
+        return suggestions
+    except Exception as e:
+        await _fail(result_id, str(e))
+        return None
+    finally:
+        _pending.pop(result_id, None)
+
+async def schedule_suggestions(stage: Stage, context: str) -> str:
+    result_id = suggestion_id(stage, context)
+    if result_id in _pending or await suggestion_cache.aget(result_id) is not None:
+        return result_id
+    state = await _state(result_id)
+    if state is not None and state["status"] == "pending":
+        return result_id  # another worker is on it
+    # Written before the id is handed out, so any worker can answer for it.
+    await _set_state(result_id, SUGGESTION_PENDING_TTL_SECONDS, status="pending", started_at=time.time())
+    # Checked again: another request may have scheduled it while we looked.
+    if result_id not in _pending:
+        _pending[result_id] = asyncio.create_task(_compute(result_id, stage, context))
+    return result_id
+
+async def _wait(result_id: str, wait: Optional[float]):
+    task = _pending.get(result_id)
+    if task is not None:
+        try:
+            await asyncio.wait_for(asyncio.shield(task), timeout=wait)
+        except asyncio.TimeoutError:
+            pass
+        return
+    # Running in another worker: poll the shared store until it settles.
+    deadline = None if wait is None else time.monotonic() + wait
+    while deadline is None or time.monotonic() < deadline:
+        state = await _state(result_id)
+        if state is None or state["status"] != "pending":
+            return
+        delay = SUGGESTION_POLL_SECONDS if deadline is None else min(SUGGESTION_POLL_SECONDS, deadline - time.monotonic())
+        await asyncio.sleep(max(delay, 0.0))
+
+async def fetch_suggestions(result_id: str, wait: Optional[float] = 0.0) -> Tuple[str, Optional[dict]]:
+    # wait=None blocks until the suggestions are done; wait=0 never blocks.
+    cached = await cached_suggestions(result_id)
+    if cached is not None:
+        return "ready", cached
+
+    if wait is None or wait > 0:
+        await _wait(result_id, wait)
+        cached = await cached_suggestions(result_id)
+        if cached is not None:
+            return "ready", cached
+
+    if result_id in _pending:
+        return "pending", None
+    state = await _state(result_id)
+    if state is None or state["status"] == "ready":
+        return "unknown", None
+    if state["status"] == "error":
+        return "error", {"error": state["error"]}
+    return "pending", None
+
+async def stage_suggestions(stage: Stage, context: str, inline: bool = False) -> dict:
+    result_id = await schedule_suggestions(stage, context)
+    status, suggestions = await fetch_suggestions(result_id, wait=None if inline else 0.0)
+    return {"suggestions": suggestions, "suggestions_id": result_id, "suggestions_status": status}
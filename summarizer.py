@@ -0,0 +1,117 @@
+# summarizer.py
+
+import os
+import re
+import asyncio
+import hashlib
+from typing import Awaitable, Callable, List
+from llm_cache import TieredCache
+from token_budget import count_tokens, split_to_tokens, stage_budget, truncate_to_tokens
+
+# ----------------------------- Constants -----------------------------
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", str(stage_budget("summarize"))))
+SUMMARY_MAP_CONCURRENCY = int(os.getenv("SUMMARY_MAP_CONCURRENCY", "4"))
+SUMMARY_MAX_CHUNKS = int(os.getenv("SUMMARY_MAX_CHUNKS", "64"))
+
+chunk_summary_cache = TieredCache("chunk_summary")
+
+SummarizeFn = Callable[[str, str], Awaitable[str]]
+
+# ----------------------------- Chunking -----------------------------
+
+def chunk_by_tokens(text: str, max_tokens: int = SUMMARY_CHUNK_TOKENS) -> List[str]:
+    # Greedy packing of sentences from the start of the text, so the chunk
+    # boundaries of a prefix don't move when pages are appended: only the
+    # last chunk and the new ones change (and miss the cache).
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    for sentence in re.split(r'(?<=[.!?])\s+', text):
+        if not sentence:
+            continue
+        tokens = count_tokens(sentence) + 1
+        if tokens > max_tokens:
+            pieces = split_to_tokens(sentence, max_tokens)
+        else:
+            pieces = [sentence]
+        for piece in pieces:
+            piece_tokens = tokens if len(pieces) == 1 else count_tokens(piece) + 1
+            if current and current_tokens + piece_tokens > max_tokens:
+                chunks.append(" ".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+def _group_by_tokens(parts: List[str], max_tokens: int) -> List[List[str]]:
+    groups: List[List[str]] = []
+    current: List[str] = []
+    current_tokens = 0
+    for part in parts:
+        tokens = count_tokens(part) + 2
+        if current and current_tokens + tokens > max_tokens:
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(part)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+# ----------------------------- Map-Reduce -----------------------------
+
+async def _cached_summarize(text: str, label: str, summarize: SummarizeFn, limiter: asyncio.Semaphore) -> str:
+    key = hashlib.sha256(f"{label}\n{text}".encode("utf-8")).hexdigest()
+    cached = await chunk_summary_cache.aget(key)
+    if cached is not None:
+        return cached
+    async with limiter:
+        summary = await summarize(text, label)
+    if summary:
+        await chunk_summary_cache.aset(key, summary)
+    return summary
+
+async def map_reduce_summarize(
+    text: str,
+    label: str,
+    summarize: SummarizeFn,
+    chunk_tokens: int = SUMMARY_CHUNK_TOKENS,
+    concurrency: int = SUMMARY_MAP_CONCURRENCY,
+) -> str:
+    if count_tokens(text) <= chunk_tokens:
+        return await summarize(text, label)
+
+    chunks = chunk_by_tokens(text, chunk_tokens)
+    if len(chunks) > SUMMARY_MAX_CHUNKS:
+        print(f"{label}: {len(chunks)} chunks, summarizing the first {SUMMARY_MAX_CHUNKS}.")
+        chunks = chunks[:SUMMARY_MAX_CHUNKS]
+
+    limiter = asyncio.Semaphore(concurrency)
+    summaries = await asyncio.gather(
+        *(_cached_summarize(chunk, f"{label} (part {i + 1})", summarize, limiter) for i, chunk in enumerate(chunks))
+    )
+    summaries = [s for s in summaries if s]
+
+    # Reduce level by level until the partial summaries fit one call.
+    level = 1
+    while len(summaries) > 1 and sum(count_tokens(s) for s in summaries) > chunk_tokens:
+        groups = _group_by_tokens(summaries, chunk_tokens)
+        if len(groups) == len(summaries):
+            # No two summaries fit together: trim each to half a chunk and
+            # merge in pairs, so every level still halves the count.
+            half = chunk_tokens // 2 - 2
+            trimmed = [truncate_to_tokens(s, half) for s in summaries]
+            groups = [trimmed[i:i + 2] for i in range(0, len(trimmed), 2)]
+        summaries = await asyncio.gather(
+            *(_cached_summarize("\n\n".join(g), f"partial summaries of a {label} (level {level})", summarize, limiter) for g in groups)
+        )
+        summaries = [s for s in summaries if s]
+        level += 1
+
+    if not summaries:
+        return ""  # every call came back empty; don't spend one more on nothing
+    if len(summaries) == 1:
+        return summaries[0]
+    return await summarize("\n\n".join(summaries), f"partial summaries of a {label}")
@@ -0,0 +1,103 @@
+# token_budget.py
+
+import os
+import threading
+from typing import Dict, List
+from pydantic import BaseModel
+import tiktoken
+
+# ----------------------------- Constants -----------------------------
+# Gemini doesn't ship a local tokenizer; cl100k_base tracks it closely enough
+# for budgeting. If the encoding can't be loaded we fall back to ~4 chars/token.
+TOKEN_ENCODING = os.getenv("TOKEN_ENCODING", "cl100k_base")
+CHARS_PER_TOKEN = 4
+
+# Per-stage budgets for the variable parts of a prompt (context sections),
+# overridable with TOKEN_BUDGET_<STAGE>=n.
+DEFAULT_STAGE_BUDGETS = {
+    "reading": 6000,
+    "lecture": 6000,
+    "quiz": 4000,
+    "summarize": 6000,
+    "assignment": 4000,
+    "mindmap": 4000,
+    "validate": 8000,
+}
+
+def stage_budget(stage: str) -> int:
+    return int(os.getenv(f"TOKEN_BUDGET_{stage.upper()}", DEFAULT_STAGE_BUDGETS[stage]))
+
+# ----------------------------- Counting -----------------------------
+
+_encoding = None
+_encoding_failed = False
+_encoding_lock = threading.Lock()
+
+def _encoder():
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        with _encoding_lock:
+            if _encoding is None and not _encoding_failed:
+                try:
+                    _encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+                except Exception as e:
+                    print(f"tiktoken unavailable ({e}); estimating tokens from characters.")
+                    _encoding_failed = True
+    return _encoding
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encoding = _encoder()
+    if encoding is None:
+        return len(text) // CHARS_PER_TOKEN + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    if max_tokens <= 0 or not text:
+        return ""
+    encoding = _encoder()
+    if encoding is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+# ----------------------------- Packing -----------------------------
+
+class Section(BaseModel):
+    name: str
+    text: str = ""
+    priority: int = 1  # lower is more important
+
+def pack_sections(sections: List[Section], budget: int) -> Dict[str, str]:
+    # Fill the budget in priority order. Within one priority level the space
+    # is water-filled: short sections are kept whole and whatever they leave
+    # is shared evenly among the longer ones.
+    counts = {s.name: count_tokens(s.text) for s in sections}
+    allotted: Dict[str, int] = {}
+    remaining = budget
+    for priority in sorted({s.priority for s in sections}):
+        group = sorted((s for s in sections if s.priority == priority), key=lambda s: counts[s.name])
+        for i, section in enumerate(group):
+            share = max(remaining, 0) // (len(group) - i)
+            allotted[section.name] = min(counts[section.name], share)
+            remaining -= allotted[section.name]
+
+    return {
+        s.name: s.text if allotted[s.name] >= counts[s.name] else truncate_to_tokens(s.text, allotted[s.name])
+        for s in sections
+    }
+
+def fit_to_budget(text: str, stage: str) -> str:
+    return truncate_to_tokens(text, stage_budget(stage))
+
+def split_to_tokens(text: str, max_tokens: int) -> List[str]:
+    # Hard split into consecutive windows of at most max_tokens.
+    encoding = _encoder()
+    if encoding is None:
+        step = max_tokens * CHARS_PER_TOKEN
+        return [text[i:i + step] for i in range(0, len(text), step)]
+    tokens = encoding.encode(text, disallowed_special=())
+    return [encoding.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
@@ -0,0 +1,173 @@
+# tracing.py
+
+import os
+import re
+import time
+import uuid
+import random
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+from pydantic import BaseModel
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger("tracing")
+
+# ----------------------------- Constants -----------------------------
+# Clients send "X-Debug-Trace: 1" to get an X-Trace-Id back and can then
+# fetch the span list from /debug/trace/{id}.
+TRACE_DEBUG_ENABLED = os.getenv("TRACE_DEBUG_ENABLED", "1") not in ("0", "false", "False")
+TRACE_STORE_SIZE = int(os.getenv("TRACE_STORE_SIZE", "200"))
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "20"))
+SLOW_REQUEST_SAMPLE_RATE = float(os.getenv("SLOW_REQUEST_SAMPLE_RATE", "0.25"))
+
+_METRIC_NAME = re.compile(r'[^A-Za-z0-9_.-]')
+
+class Span(BaseModel):
+    name: str
+    start_ms: float  # offset from the start of the request
+    duration_ms: float
+    error: Optional[str] = None
+
+class Trace(BaseModel):
+    trace_id: str
+    method: str = ""
+    path: str = ""
+    status: Optional[int] = None
+    total_ms: float = 0.0
+    spans: List[Span] = []
+
+# ----------------------------- Spans -----------------------------
+# The active trace rides in a contextvar, so spans opened in gathered tasks
+# and asyncio.to_thread workers land in the same request's trace. Outside a
+# request span() is a no-op.
+
+_current: ContextVar[Optional["TraceRecorder"]] = ContextVar("current_trace", default=None)
+
+class TraceRecorder:
+    def __init__(self, method: str = "", path: str = ""):
+        self.trace_id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, name: str, started: float, ended: float, error: Optional[str] = None):
+        span = Span(
+            name=name,
+            start_ms=round((started - self.started) * 1000, 2),
+            duration_ms=round((ended - started) * 1000, 2),
+            error=error
+        )
+        with self._lock:
+            self.spans.append(span)
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def server_timing(self) -> str:
+        # Concurrent spans with the same name (e.g. three summaries) are summed
+        # and counted; "total" is wall time.
+        totals: "OrderedDict[str, List[float]]" = OrderedDict()
+        with self._lock:
+            for span in self.spans:
+                entry = totals.setdefault(_METRIC_NAME.sub("_", span.name), [0.0, 0])
+                entry[0] += span.duration_ms
+                entry[1] += 1
+        parts = [
+            f'{name};dur={duration:.1f}' + (f';desc="x{count}"' if count > 1 else "")
+            for name, (duration, count) in totals.items()
+        ]
+        parts.append(f"total;dur={self.elapsed_ms():.1f}")
+        return ", ".join(parts)
+
+    def to_trace(self, status: Optional[int] = None) -> Trace:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start_ms)
+        return Trace(
+            trace_id=self.trace_id,
+            method=self.method,
+            path=self.path,
+            status=status,
+            total_ms=round(self.elapsed_ms(), 2),
+            spans=spans
+        )
+
+@contextmanager
+def span(name: str):
+    recorder = _current.get()
+    if recorder is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        recorder.add(name, started, time.perf_counter(), error=type(e).__name__)
+        raise
+    else:
+        recorder.add(name, started, time.perf_counter())
+
+# ----------------------------- Trace Store -----------------------------
+
+_traces: "OrderedDict[str, Trace]" = OrderedDict()
+_traces_lock = threading.Lock()
+
+def store_trace(trace: Trace):
+    with _traces_lock:
+        _traces[trace.trace_id] = trace
+        while len(_traces) > TRACE_STORE_SIZE:
+            _traces.popitem(last=False)
+
+def get_trace(trace_id: str) -> Optional[Trace]:
+    with _traces_lock:
+        return _traces.get(trace_id)
+
+# ----------------------------- Middleware -----------------------------
+# Server-Timing is added when the response headers go out. For ordinary JSON
+# routes that's after all the work; SSE streams send headers first, so their
+# phases only show up in the debug trace and the slow-request log.
+
+class TracingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        recorder = TraceRecorder(scope.get("method", ""), scope.get("path", ""))
+        headers = dict(scope.get("headers") or [])
+        debug = TRACE_DEBUG_ENABLED and headers.get(b"x-debug-trace", b"").lower() in (b"1", b"true")
+        status: Dict[str, int] = {}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                extra = [(b"server-timing", recorder.server_timing().encode("latin-1"))]
+                if debug:
+                    extra.append((b"x-trace-id", recorder.trace_id.encode("latin-1")))
+                message = {**message, "headers": list(message.get("headers", [])) + extra}
+            await send(message)
+
+        token = _current.set(recorder)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            trace = recorder.to_trace(status.get("code"))
+            if debug:
+                store_trace(trace)
+            if trace.total_ms >= SLOW_REQUEST_SECONDS * 1000 and random.random() < SLOW_REQUEST_SAMPLE_RATE:
+                slowest = sorted(trace.spans, key=lambda s: s.duration_ms, reverse=True)[:5]
+                breakdown = ", ".join(f"{s.name}={s.duration_ms / 1000:.2f}s" for s in slowest) or "no spans"
+                logger.warning(
+                    f"Slow request {trace.method} {trace.path} ({trace.status}) took {trace.total_ms / 1000:.1f}s; {breakdown}"
+                )
@@ -0,0 +1,192 @@
+# url_fetcher.py
+
+import os
+import re
+import time
+import asyncio
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+import httpx
+from pydantic import BaseModel
+from dotenv import load_dotenv
+from llm_cache import TieredCache
+
+load_dotenv()
+
+# ----------------------------- Constants -----------------------------
+URL_MAX_BYTES = int(os.getenv("URL_MAX_BYTES", str(5 * 1024 * 1024)))
+URL_TIMEOUT_SECONDS = float(os.getenv("URL_TIMEOUT_SECONDS", "10"))
+URL_MAX_CONNECTIONS = int(os.getenv("URL_MAX_CONNECTIONS", "32"))
+# How long a page is reused without asking the server again. Pages carrying
+# ETag/Last-Modified are revalidated with a conditional GET after that;
+# pages without validators are simply fetched again.
+HTTP_CACHE_FRESH_SECONDS = float(os.getenv("HTTP_CACHE_FRESH_SECONDS", "300"))
+HTTP_CACHE_TTL_SECONDS = float(os.getenv("HTTP_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+USER_AGENT = os.getenv("URL_USER_AGENT", "corgen-fetcher/1.0")
+
+_MAX_AGE = re.compile(r'max-age\s*=\s*(\d+)')
+
+class FetchedPage(BaseModel):
+    url: str
+    status: int
+    content_type: str = ""
+    text: str = ""
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    fresh_until: float = 0.0
+    truncated: bool = False
+
+# ----------------------------- Freshness -----------------------------
+
+def _fresh_until(headers: httpx.Headers, now: float) -> Optional[float]:
+    # None means the response must not be stored at all.
+    cache_control = headers.get("cache-control", "").lower()
+    if "no-store" in cache_control:
+        return None
+    if "no-cache" in cache_control:
+        return now
+    match = _MAX_AGE.search(cache_control)
+    if match:
+        return now + int(match.group(1))
+    expires = headers.get("expires")
+    if expires:
+        try:
+            return parsedate_to_datetime(expires).timestamp()
+        except (TypeError, ValueError):
+            return now
+    return now + HTTP_CACHE_FRESH_SECONDS
+
+def _conditional_headers(page: FetchedPage) -> Dict[str, str]:
+    headers = {}
+    if page.etag:
+        headers["If-None-Match"] = page.etag
+    if page.last_modified:
+        headers["If-Modified-Since"] = page.last_modified
+    return headers
+
+# ----------------------------- Fetcher -----------------------------
+# One keep-alive connection pool per event loop, a streamed body capped at
+# max_bytes, and an on-disk HTTP cache in front of it. Concurrent requests for
+# the same URL share a single download.
+
+class URLFetcher:
+    def __init__(self, cache: Optional[TieredCache] = None, max_bytes: int = URL_MAX_BYTES, timeout: float = URL_TIMEOUT_SECONDS):
+        self.cache = cache if cache is not None else TieredCache("http", ttl_seconds=HTTP_CACHE_TTL_SECONDS)
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._inflight: Dict[str, "asyncio.Task[FetchedPage]"] = {}
+        self.network_fetches = 0
+        self.revalidations = 0
+        self.not_modified = 0
+
+    def _http(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            # Connections belong to the loop that opened them.
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                follow_redirects=True,
+                headers={"User-Agent": USER_AGENT},
+                limits=httpx.Limits(max_connections=URL_MAX_CONNECTIONS, max_keepalive_connections=URL_MAX_CONNECTIONS),
+            )
+            self._client_loop = loop
+            self._inflight = {}
+        return self._client
+
+    async def _cached(self, url: str) -> Optional[FetchedPage]:
+        payload = await self.cache.aget(url)
+        return FetchedPage.model_validate_json(payload) if payload is not None else None
+
+    async def _store(self, page: FetchedPage):
+        await self.cache.aset(page.url, page.model_dump_json())
+
+    async def _download(self, url: str, cached: Optional[FetchedPage]) -> FetchedPage:
+        headers = _conditional_headers(cached) if cached is not None else {}
+        if headers:
+            self.revalidations += 1
+        self.network_fetches += 1
+        async with self._http().stream("GET", url, headers=headers) as response:
+            now = time.time()
+            fresh_until = _fresh_until(response.headers, now)
+            if response.status_code == 304 and cached is not None:
+                self.not_modified += 1
+                page = cached.model_copy(update={"fresh_until": fresh_until or now})
+                await self._store(page)
+                return page
+            response.raise_for_status()
+
+            body = bytearray()
+            truncated = False
+            async for block in response.aiter_bytes():
+                body.extend(block)
+                if len(body) >= self.max_bytes:
+                    truncated = True
+                    del body[self.max_bytes:]
+                    break
+
+            page = FetchedPage(
+                url=url,
+                status=response.status_code,
+                content_type=response.headers.get("content-type", ""),
+                text=bytes(body).decode(response.encoding or "utf-8", errors="replace"),
+                etag=response.headers.get("etag"),
+                last_modified=response.headers.get("last-modified"),
+                fresh_until=fresh_until or now,
+                truncated=truncated,
+            )
+        if truncated:
+            print(f"Truncated '{url}' at {self.max_bytes} bytes")
+        if fresh_until is not None:
+            await self._store(page)
+        return page
+
+    async def _fetch(self, url: str) -> FetchedPage:
+        cached = await self._cached(url)
+        if cached is not None and cached.fresh_until > time.time():
+            return cached
+        try:
+            return await self._download(url, cached)
+        except (httpx.TransportError, httpx.HTTPStatusError) as e:
+            if cached is None:
+                raise
+            # A stale copy beats failing the whole activity.
+            print(f"Serving stale copy of '{url}' after fetch error: {e}")
+            return cached
+
+    async def fetch(self, url: str) -> FetchedPage:
+        # The download runs as its own task that every caller awaits shielded,
+        # so one cancelled caller doesn't cancel the fetch for the others.
+        self._http()
+        task = self._inflight.get(url)
+        if task is None:
+            task = asyncio.create_task(self._fetch(url))
+            task.add_done_callback(lambda t: self._settle(url, t))
+            self._inflight[url] = task
+        return await asyncio.shield(task)
+
+    def _settle(self, url: str, task: "asyncio.Task[FetchedPage]"):
+        if self._inflight.get(url) is task:
+            del self._inflight[url]
+        if not task.cancelled():
+            task.exception()  # retrieved even if every caller went away
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._client_loop = None
+
+    def stats(self) -> Dict:
+        return {
+            "network_fetches": self.network_fetches,
+            "revalidations": self.revalidations,
+            "not_modified": self.not_modified,
+            **self.cache.stats(),
+        }
+
+url_fetcher = URLFetcher()
+
+async def afetch_url(url: str) -> FetchedPage:
+    return await url_fetcher.fetch(url)
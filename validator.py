@@ -1,25 +1,34 @@
 # validator.py
 
 import re
-from typing import List, Dict, Optional
+import asyncio
+from bisect import bisect_left
+from typing import List, Dict, Optional, Tuple
 from pydantic import BaseModel
 from enum import Enum
-from serpapi import GoogleSearch 
 from dotenv import load_dotenv  
 import os
-import spacy
-from google import genai
 from google.genai.types import GenerateContentConfig, Content, Part
+from llm_gateway import agenerate_content
+from search_backend import dedupe_queries
+from registry import get_llm_client, get_nlp, get_web_search
+from keyword_index import KeywordIndex
+from token_budget import count_tokens, stage_budget
 import json
 
 # ------------------- Environment -------------------
 load_dotenv()
 
-SERPAPI_API_KEY = os.getenv("SERPAPI_API_KEY")
-nlp = spacy.load("en_core_web_sm")
+# The spaCy model itself is loaded lazily by the registry.
+SPACY_BATCH_SIZE = int(os.getenv("SPACY_BATCH_SIZE", "16"))
+SPACY_N_PROCESS = int(os.getenv("SPACY_N_PROCESS", "1"))
+
+VALIDATE_BATCHED = os.getenv("VALIDATE_BATCHED", "1") not in ("0", "false", "False")
+VALIDATE_MAX_BATCH = int(os.getenv("VALIDATE_MAX_BATCH", "12"))
+VALIDATE_MAX_RETRIES = int(os.getenv("VALIDATE_MAX_RETRIES", "2"))
+# How many matched keywords (best ranked first) contribute evidence to a chunk.
+VALIDATE_EVIDENCE_KEYWORDS = int(os.getenv("VALIDATE_EVIDENCE_KEYWORDS", "3"))
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-client = genai.Client(api_key=GEMINI_API_KEY)
 
 # ------------------- LLM Validity Schema -------------------
 class ValidityEnum(str, Enum):
@@ -33,10 +42,17 @@ class Validity(BaseModel):
     contradiction: Optional[bool] = None
     suggestion: Optional[str] = None
 
+class ChunkValidity(Validity):
+    chunk_index: int
+
+class ChunkValiditySet(BaseModel):
+    results: List[ChunkValidity]
+
 
 class ValidationResult(BaseModel):
     contentChunk: str
     matchedKeyword: Optional[str]
+    matchedKeywords: Optional[List[str]] = None
     validity: ValidityEnum
     confidence: Optional[float] = None
     suggestion: Optional[str] = None
@@ -64,7 +80,7 @@ class ValidateContentOut(BaseModel):
     summary: ValidationSummary
     detailedReport: List[ValidationResult]
 
-def compare_with_gemini(generated_content: str, activity_name: str, search_content: str) -> Optional[Dict]:
+async def compare_with_gemini(generated_content: str, activity_name: str, search_content: str) -> Optional[Dict]:
     system_prompt = f"""
 You are an expert content validator. Your task is to evaluate the generated content against the activity name and search content.
 - **Activity Name**: {activity_name}
@@ -88,14 +104,15 @@ You are an expert content validator. Your task is to evaluate the generated cont
         ]
     )
     try:
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
+        response = await agenerate_content(
+            get_llm_client(),
             contents=user_prompt,
             config=GenerateContentConfig(
                 system_instruction=system_prompt,
                 response_mime_type="application/json",
                 response_schema=Validity
-            )
+            ),
+            stage="validate"
         )
 
         parsed_response = None
@@ -107,46 +124,200 @@ You are an expert content validator. Your task is to evaluate the generated cont
         print(f"LLM call failed: {e}")
         return None
 
+# ------------------- Batched Validation -------------------
+# One call validates several chunks. Evidence is listed once per keyword and
+# chunks refer to it by id, so shared snippets aren't repeated per chunk.
+
+ChunkItem = Tuple[int, str, List[str]]  # chunk index, chunk text, matched keywords
+
+def _batched_system_prompt(activity_name: str, evidence: Dict[str, str]) -> str:
+    evidence_text = "\n\n".join(f"[{ref}]\n{snippets}" for ref, snippets in evidence.items()) or "(none)"
+    return f"""
+You are an expert content validator. Your task is to evaluate each numbered chunk of generated content against the activity name and the search evidence it references.
+- **Activity Name**: {activity_name}
+- **Search Evidence**:
+{evidence_text}
+
+- Use only the referenced search evidence for each chunk. A chunk with no evidence can be at most "partially valid".
+- Focus on factual correctness.
+- Identify any factual contradictions. Mark 'contradiction: true' if a chunk clearly conflicts with its evidence.
+- Return one result per chunk in "results", with its chunk_index copied exactly:
+  - chunk_index: the number of the chunk
+  - validity: "valid" | "partially valid" | "invalid"
+  - confidence: 0.0 to 1.0
+  - contradiction: true or false
+  - suggestion: correction if needed (optional)
+"""
+
+def _evidence_ref(keyword: str) -> str:
+    return f"E:{keyword}"
+
+def chunk_evidence(keywords: List[str], keyword_to_snippets: Dict[str, List[str]]) -> str:
+    snippets: Dict[str, None] = {}
+    for keyword in keywords:
+        for snippet in keyword_to_snippets.get(keyword, []):
+            snippets.setdefault(snippet, None)
+    return "\n".join(snippets)
+
+def plan_validation_batches(items: List[ChunkItem], keyword_to_snippets: Dict[str, List[str]], budget: int, max_batch: int = VALIDATE_MAX_BATCH) -> List[List[ChunkItem]]:
+    # Greedy packing: a batch closes when the next chunk plus any evidence it
+    # brings in would exceed the token budget, or at max_batch chunks.
+    evidence_cost = {k: count_tokens("\n".join(v)) + 8 for k, v in keyword_to_snippets.items()}
+    batches: List[List[ChunkItem]] = []
+    current: List[ChunkItem] = []
+    used = 0
+    seen_keywords = set()
+    for item in items:
+        _, chunk, keywords = item
+        chunk_cost = count_tokens(chunk) + 8
+        cost = chunk_cost + sum(evidence_cost.get(k, 0) for k in keywords if k not in seen_keywords)
+        if current and (used + cost > budget or len(current) >= max_batch):
+            batches.append(current)
+            current, used, seen_keywords = [], 0, set()
+            cost = chunk_cost + sum(evidence_cost.get(k, 0) for k in keywords)
+        current.append(item)
+        used += cost
+        seen_keywords.update(keywords)
+    if current:
+        batches.append(current)
+    return batches
+
+async def compare_batch_with_gemini(items: List[ChunkItem], activity_name: str, keyword_to_snippets: Dict[str, List[str]]) -> Dict[int, Dict]:
+    evidence = {}
+    chunk_sections = []
+    for index, chunk, keywords in items:
+        refs = []
+        for keyword in keywords:
+            if keyword_to_snippets.get(keyword):
+                ref = _evidence_ref(keyword)
+                evidence[ref] = "\n".join(keyword_to_snippets[keyword])
+                refs.append(ref)
+        chunk_sections.append(f"### Chunk {index} (evidence: {', '.join(refs) or 'none'})\n{chunk}")
+    chunks_text = "\n\n".join(chunk_sections)
+    user_prompt = Content(
+        role="user",
+        parts=[
+            Part(text=f"Validate each of the following chunks.\n\n{chunks_text}"),
+        ]
+    )
+    try:
+        response = await agenerate_content(
+            get_llm_client(),
+            contents=user_prompt,
+            config=GenerateContentConfig(
+                system_instruction=_batched_system_prompt(activity_name, evidence),
+                response_mime_type="application/json",
+                response_schema=ChunkValiditySet
+            ),
+            stage="validate"
+        )
+        if response.text is None:
+            return {}
+        parsed = ChunkValiditySet.model_validate_json(response.text)
+    except Exception as e:
+        print(f"Batched LLM call failed: {e}")
+        return {}
+
+    wanted = {index for index, _, _ in items}
+    return {
+        r.chunk_index: r.model_dump(mode="json", exclude={"chunk_index"})
+        for r in parsed.results if r.chunk_index in wanted
+    }
+
+async def validate_chunks_batched(items: List[ChunkItem], activity_name: str, keyword_to_snippets: Dict[str, List[str]]) -> Dict[int, Optional[Dict]]:
+    budget = stage_budget("validate")
+    results: Dict[int, Optional[Dict]] = {}
+    pending = items
+    for _ in range(VALIDATE_MAX_RETRIES + 1):
+        if not pending:
+            break
+        batches = plan_validation_batches(pending, keyword_to_snippets, budget)
+        for batch_result in await asyncio.gather(*(compare_batch_with_gemini(b, activity_name, keyword_to_snippets) for b in batches)):
+            results.update(batch_result)
+        # Only chunks the model skipped or that errored go round again, in
+        # smaller batches.
+        pending = [item for item in pending if item[0] not in results]
+        budget = max(budget // 2, 1)
+
+    # Whatever is still missing is validated one chunk per call, all at once;
+    # llm_throttle bounds how many actually reach the API together.
+    singles = await asyncio.gather(*(
+        compare_with_gemini(chunk, activity_name, chunk_evidence(keywords, keyword_to_snippets))
+        for _, chunk, keywords in pending
+    ))
+    results.update({index: result for (index, _, _), result in zip(pending, singles)})
+    return results
+
 # ------------------- Web Search -------------------
 def search_web_snippets(query: str, num_results: int = 5) -> List[str]:
-    params = {
-        "engine": "google",
-        "q": query,
-        "api_key": SERPAPI_API_KEY,
-        "num": num_results
-    }
-    search = GoogleSearch(params)
-    results = search.get_dict()
-    snippets = []
-    for result in results.get("organic_results", []):
-        if "snippet" in result:
-            snippets.append(result["snippet"])
-    return snippets
+    return get_web_search().search(query, num_results)
 
-def extract_keywords_spacy(generated_content: str) -> List[str]:
-    doc = nlp(generated_content)
-    keywords = set()
-    for ent in doc.ents:
-        if ent.label_ in ("ORG", "PERSON", "GPE", "PRODUCT", "EVENT", "WORK_OF_ART", "LAW", "LANGUAGE"):
-            keywords.add(ent.text.strip())
-    for np in doc.noun_chunks:
-        if 2 <= len(np.text.strip()) <= 80:
-            keywords.add(np.text.strip())
-    return list(keywords)
+# ------------------- Content Analysis -------------------
+KEYWORD_ENTITY_LABELS = {"ORG", "PERSON", "GPE", "PRODUCT", "EVENT", "WORK_OF_ART", "LAW", "LANGUAGE"}
 
-def estimate_factual_density(text: str) -> float:
-    doc = nlp(text)
-    num_entities = len(doc.ents)
-    num_numbers = len(re.findall(r'\d+(\.\d+)?', text))
-    citation_like = len(re.findall(r"(according to|et al\.|ref(erence)?|source:|study)", text, flags=re.I))
-    num_tokens = len(doc)
+class ContentChunk(BaseModel):
+    text: str
+    num_entities: int
+    num_tokens: int
+    factual_density: float
+
+class ContentAnalysis(BaseModel):
+    keywords: List[str]
+    chunks: List[ContentChunk]
 
+def factual_density(text: str, num_entities: int, num_tokens: int) -> float:
     if num_tokens == 0:
         return 0.0
-
+    num_numbers = len(re.findall(r'\d+(\.\d+)?', text))
+    citation_like = len(re.findall(r"(according to|et al\.|ref(erence)?|source:|study)", text, flags=re.I))
     density_score = (0.5 * num_entities + 0.3 * num_numbers + 0.2 * citation_like) / num_tokens
     return min(density_score, 1.0)
 
+def _analyze_doc(doc, max_sentences: int = 5) -> ContentAnalysis:
+    # Keywords, chunks and per-chunk counts all come from the one parse;
+    # chunks are runs of max_sentences sentences and entities are assigned
+    # to them by token offset.
+    keywords: Dict[str, None] = {}
+    for ent in doc.ents:
+        if ent.label_ in KEYWORD_ENTITY_LABELS:
+            keywords.setdefault(ent.text.strip(), None)
+    for np in doc.noun_chunks:
+        if 2 <= len(np.text.strip()) <= 80:
+            keywords.setdefault(np.text.strip(), None)
+
+    entity_starts = [ent.start for ent in doc.ents]
+    sentences = list(doc.sents)
+    chunks = []
+    for i in range(0, len(sentences), max_sentences):
+        span = doc[sentences[i].start:sentences[min(i + max_sentences, len(sentences)) - 1].end]
+        text = span.text.strip()
+        if not text:
+            continue
+        num_entities = bisect_left(entity_starts, span.end) - bisect_left(entity_starts, span.start)
+        chunks.append(ContentChunk(
+            text=text,
+            num_entities=num_entities,
+            num_tokens=len(span),
+            factual_density=factual_density(text, num_entities, len(span))
+        ))
+    return ContentAnalysis(keywords=list(keywords), chunks=chunks)
+
+def analyze_content(content: str, max_sentences: int = 5) -> ContentAnalysis:
+    return _analyze_doc(get_nlp()(content), max_sentences)
+
+def analyze_documents(contents: List[str], max_sentences: int = 5, n_process: int = SPACY_N_PROCESS) -> List[ContentAnalysis]:
+    # Batch parse for validating many activities at once; n_process > 1 fans
+    # the documents out over worker processes.
+    docs = get_nlp().pipe(contents, batch_size=SPACY_BATCH_SIZE, n_process=n_process)
+    return [_analyze_doc(doc, max_sentences) for doc in docs]
+
+def extract_keywords_spacy(generated_content: str) -> List[str]:
+    return analyze_content(generated_content).keywords
+
+def estimate_factual_density(text: str) -> float:
+    doc = get_nlp()(text)
+    return factual_density(text, len(doc.ents), len(doc))
+
 def chunk_markdown(text: str, max_sentences: int = 5) -> List[str]:
     sentences = re.split(r'(?<=[.!?]) +', text)
     chunks = []
@@ -156,24 +327,33 @@ def chunk_markdown(text: str, max_sentences: int = 5) -> List[str]:
             chunks.append(chunk)
     return chunks
 
-def validate_content_with_keywords(content: str, activity_name: str, activity_type: str) -> List[Dict]:
-    keyword_candidates = [activity_name] + extract_keywords_spacy(content)
-    keyword_candidates = list(set([k for k in keyword_candidates if len(k.strip()) > 2]))
+async def validate_content_with_keywords(content: str, activity_name: str, activity_type: str, batched: bool = VALIDATE_BATCHED) -> List[Dict]:
+    analysis = await asyncio.to_thread(analyze_content, content)
+    keyword_candidates = dedupe_queries([activity_name] + analysis.keywords)
+
+    keyword_to_snippets = await get_web_search().search_many(keyword_candidates)
+
+    keyword_index = KeywordIndex(keyword_candidates)
+    items: List[ChunkItem] = [
+        (index, content_chunk.text, keyword_index.rank(content_chunk.text, VALIDATE_EVIDENCE_KEYWORDS))
+        for index, content_chunk in enumerate(analysis.chunks)
+    ]
 
-    keyword_to_snippets = {k: search_web_snippets(k) for k in keyword_candidates}
-    chunks = chunk_markdown(content)
+    batch_results = await validate_chunks_batched(items, activity_name, keyword_to_snippets) if batched else {}
 
     report = []
-    for chunk in chunks:
-        matched_kw = next((k for k in keyword_candidates if k.lower() in chunk.lower()), None)
-        evidence = "\n".join(keyword_to_snippets.get(matched_kw, [])) if matched_kw else ""
-        validity_result = compare_with_gemini(chunk, activity_name, evidence)
-        factual_density = estimate_factual_density(chunk)
+    for (index, chunk, matched_kws), content_chunk in zip(items, analysis.chunks):
+        evidence = chunk_evidence(matched_kws, keyword_to_snippets)
+        if batched:
+            validity_result = batch_results.get(index)
+        else:
+            validity_result = await compare_with_gemini(chunk, activity_name, evidence)
 
         report.append({
             "contentChunk": chunk,
-            "matchedKeyword": matched_kw,
-            "factualDensity": factual_density,
+            "matchedKeyword": matched_kws[0] if matched_kws else None,
+            "matchedKeywords": matched_kws,
+            "factualDensity": content_chunk.factual_density,
             "validity": validity_result.get("validity", "unknown") if validity_result else "error",
             "confidence": validity_result.get("confidence", 0.0) if validity_result else 0.0,
             "contradiction": validity_result.get("contradiction", False) if validity_result else None,
@@ -0,0 +1,22 @@
+# worker.py
+# Standalone job worker: drains the job queue without serving HTTP, so
+# generation throughput can be scaled independently of the API nodes.
+
+import asyncio
+import logging
+from api import JOB_HANDLERS
+from job_queue import job_queue, JobWorkerPool, JOB_WORKERS
+from registry import warmup
+
+async def main():
+    await asyncio.to_thread(warmup)
+    pool = JobWorkerPool(job_queue, JOB_HANDLERS, max(JOB_WORKERS, 1))
+    pool.start()
+    logging.getLogger("job_queue").info(f"Worker {pool.name} running {pool.concurrency} job slots")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await pool.stop()
+
+if __name__ == "__main__":
+    asyncio.run(main())